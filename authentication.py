@@ -1,29 +1,57 @@
 # authentication.py
 import os
+import threading
 
 import pyodbc
 
+from db_pool import ConnectionPool
+
 # Ajuste o DRIVER se necessário. Ex.: 'ODBC Driver 18 for SQL Server'
 ODBC_DRIVER = os.getenv("MSSQL_ODBC_DRIVER", "ODBC Driver 17 for SQL Server")
 DB_SERVER = os.getenv("MSSQL_SERVER", "CEOSOFT-SERV2")
 DB_NAME = os.getenv("MSSQL_DATABASE", "BDCEOSOFTWARE")
 
 
-def get_db_connection():
-    """
-    Retorna uma conexão pyodbc usando Windows Authentication (Trusted Connection).
-    O processo Python precisa executar com um usuário Windows que tenha acesso ao BD.
-    """
-    # NOTE: Avoid forcing `charset` here — the ODBC driver handles wide strings
-    # (NVARCHAR) and forcing an encoding may break some queries (observed: exact
-    # equality on accented strings returned no rows). Use the default connection
-    # behavior and rely on pyodbc's decoding defaults.
-    conn_str = ("DRIVER={%s};" "SERVER=%s;" "DATABASE=%s;" "Trusted_Connection=yes;") % (
+# Pool de conexões (ver db_pool.py). Valores podem ser ajustados via variáveis de ambiente.
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+DB_POOL_SIZE = _env_int("MSSQL_POOL_SIZE", 10)
+DB_POOL_TIMEOUT = _env_float("MSSQL_POOL_TIMEOUT", 30.0)
+DB_POOL_IDLE_SECONDS = _env_float("MSSQL_POOL_IDLE_SECONDS", 300.0)
+DB_POOL_PRE_PING = os.getenv("MSSQL_POOL_PRE_PING", "1") != "0"
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _connection_string() -> str:
+    return ("DRIVER={%s};" "SERVER=%s;" "DATABASE=%s;" "Trusted_Connection=yes;") % (
         ODBC_DRIVER,
         DB_SERVER,
         DB_NAME,
     )
 
+
+def _open_raw_connection():
+    """Abre uma conexão pyodbc nova (handshake ODBC completo). Usada apenas pelo pool."""
+    # NOTE: Avoid forcing `charset` here — the ODBC driver handles wide strings
+    # (NVARCHAR) and forcing an encoding may break some queries (observed: exact
+    # equality on accented strings returned no rows). Use the default connection
+    # behavior and rely on pyodbc's decoding defaults.
+    conn_str = _connection_string()
+
     # Log de diagnóstico (não inclui credenciais)
     try:
         # split the debug message to avoid extremely long single line
@@ -32,14 +60,42 @@ def get_db_connection():
     except Exception:
         pass
 
-    # Configurações adicionais para garantir o encoding correto
-    conn = pyodbc.connect(conn_str, autocommit=False)
-
     # Do not override the driver's default decoding for wide (NVARCHAR) types
     # as that can interfere with equality comparisons on accentuated strings.
     # Keep defaults which are known to work with the SQL Server ODBC driver.
+    return pyodbc.connect(conn_str, autocommit=False)
+
+
+def get_pool() -> ConnectionPool:
+    """Retorna o pool de conexões do processo, criando-o na primeira chamada."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    _open_raw_connection,
+                    max_size=DB_POOL_SIZE,
+                    timeout=DB_POOL_TIMEOUT,
+                    idle_timeout=DB_POOL_IDLE_SECONDS,
+                    pre_ping=DB_POOL_PRE_PING,
+                )
+    return _pool
 
-    return conn
+
+def get_pool_stats() -> dict:
+    """Estatísticas do pool (tamanho, ociosas, em uso, reusos, timeouts...)."""
+    return get_pool().stats()
+
+
+def get_db_connection():
+    """
+    Retorna uma conexão pyodbc usando Windows Authentication (Trusted Connection).
+    O processo Python precisa executar com um usuário Windows que tenha acesso ao BD.
+
+    A conexão vem do pool do processo: `conn.close()` devolve a conexão ao pool
+    (com rollback de qualquer transação pendente) em vez de encerrá-la.
+    """
+    return get_pool().acquire()
 
 
 def verify_user(username: str, password: str) -> dict:
@@ -0,0 +1,131 @@
+# board_cache.py
+"""Cache compartilhado (por processo) para resultados caros de consultas.
+
+`CachedLoader` guarda o último resultado de uma função `loader` e o entrega a
+todos os chamadores enquanto estiver dentro do TTL. Depois do TTL, e dentro da
+janela `stale_ttl`, o valor antigo continua sendo entregue imediatamente
+enquanto uma única recarga roda em segundo plano (stale-while-revalidate).
+Quando não há valor utilizável, apenas um chamador executa o `loader` e os
+demais aguardam o mesmo resultado (single-flight): 20 logins simultâneos
+disparam uma consulta, não 20.
+"""
+
+import threading
+import time
+
+
+class _Flight:
+    """Uma carga em andamento; chamadores concorrentes aguardam o mesmo resultado."""
+
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class CachedLoader:
+    def __init__(self, loader, ttl: float = 60.0, stale_ttl: float = 300.0, clock=time.monotonic):
+        self._loader = loader
+        self.ttl = max(0.0, float(ttl))
+        self.stale_ttl = max(0.0, float(stale_ttl))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._value = None
+        self._loaded_at = None
+        self._flight = None
+        self._stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "loads": 0,
+            "errors": 0,
+        }
+
+    def get(self, force: bool = False):
+        """Retorna o valor em cache, carregando-o se necessário.
+
+        Com `force=True` o valor em cache é ignorado e uma nova carga é feita
+        (ou, se já houver uma em andamento, o chamador aguarda essa carga).
+        """
+        with self._lock:
+            if not force and self._loaded_at is not None:
+                age = self._clock() - self._loaded_at
+                if age < self.ttl:
+                    self._stats["hits"] += 1
+                    return self._value
+                if age < self.ttl + self.stale_ttl:
+                    self._stats["stale_hits"] += 1
+                    if self._flight is None:
+                        self._flight = _Flight()
+                        threading.Thread(
+                            target=self._run_flight, args=(self._flight,), name="cache-revalidate", daemon=True
+                        ).start()
+                    return self._value
+            flight = self._flight
+            if flight is not None:
+                self._stats["coalesced"] += 1
+                leader = False
+            else:
+                self._stats["misses"] += 1
+                flight = self._flight = _Flight()
+                leader = True
+
+        if leader:
+            self._run_flight(flight)
+        else:
+            flight.event.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def _run_flight(self, flight: _Flight):
+        try:
+            value = self._loader()
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self._stats["errors"] += 1
+                self._flight = None
+        else:
+            flight.value = value
+            with self._lock:
+                self._value = value
+                self._loaded_at = self._clock()
+                self._stats["loads"] += 1
+                self._flight = None
+        finally:
+            flight.event.set()
+
+    def peek(self):
+        """Retorna o valor em cache (mesmo expirado) sem carregar, ou None."""
+        with self._lock:
+            return self._value
+
+    def prime(self, value, keep_age: bool = False):
+        """Substitui o valor em cache (ex.: por dados já obtidos por outro caminho).
+
+        Com `keep_age=True` a idade do valor anterior é mantida: um ajuste
+        incremental não adia a próxima recarga completa.
+        """
+        with self._lock:
+            self._value = value
+            if not keep_age or self._loaded_at is None:
+                self._loaded_at = self._clock()
+
+    def invalidate(self):
+        """Descarta o valor em cache; a próxima chamada a get() recarrega."""
+        with self._lock:
+            self._value = None
+            self._loaded_at = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats)
+            age = None if self._loaded_at is None else self._clock() - self._loaded_at
+        served = out["hits"] + out["stale_hits"] + out["misses"] + out["coalesced"]
+        out["age_seconds"] = age
+        out["hit_ratio"] = (out["hits"] + out["stale_hits"]) / served if served else 0.0
+        return out
@@ -0,0 +1,158 @@
+# board_poller.py
+"""Detecção de mudanças no board compartilhada por todos os clientes do processo.
+
+Sem isso cada usuário precisa clicar em "Atualizar cards", e cada clique roda
+a consulta do board só para ele. `BoardPoller` roda uma única thread daemon
+que, a cada `interval` segundos, chama `fetch_delta(marca d'água)` (refresh
+incremental, ver main.fetch_board_delta) e registra o resultado num log de
+mudanças versionado. Cada cliente guarda a última versão que aplicou e, num
+timer local (sem acesso ao banco), pede `changes_since(versão)`.
+
+A carga no banco é uma consulta por intervalo, independente do número de
+clientes; sem clientes ativos há `idle_timeout` segundos, a thread não
+consulta. Linhas devolvidas de novo sem alteração (a consulta usa >= na marca
+d'água) não geram entradas.
+"""
+
+import threading
+import time
+from collections import deque
+
+from kanban_board import board_watermark, card_id, card_signature
+
+
+class BoardPoller:
+    def __init__(
+        self,
+        fetch_delta,
+        interval: float = 30.0,
+        max_entries: int = 200,
+        idle_timeout: float = None,
+        on_change=None,
+        clock=time.monotonic,
+    ):
+        """`fetch_delta(watermark) -> (linhas alteradas, ids abertos, extra)`.
+
+        `on_change(entry)` é chamado (na thread do poller) para cada nova entrada;
+        `extra` é repassado aos clientes sem interpretação.
+        """
+        self._fetch_delta = fetch_delta
+        self.interval = max(1.0, float(interval))
+        self.idle_timeout = self.interval * 4 if idle_timeout is None else max(0.0, float(idle_timeout))
+        self._on_change = on_change
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = deque(maxlen=max(1, int(max_entries)))
+        self._version = 0
+        self._watermark = None
+        self._open_ids = None
+        self._seen = {}
+        self._last_access = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._stats = {"polls": 0, "skipped_idle": 0, "entries": 0, "errors": 0}
+
+    @property
+    def version(self) -> int:
+        with self._lock:
+            return self._version
+
+    def seed(self, watermark):
+        """Informa a marca d'água dos dados já carregados (mantém a maior)."""
+        if watermark is None:
+            return
+        with self._lock:
+            if self._watermark is None or watermark > self._watermark:
+                self._watermark = watermark
+
+    def changes_since(self, version: int):
+        """Retorna (versão atual, entradas posteriores a `version`).
+
+        As entradas vêm em ordem; None no lugar da lista indica que o log já
+        descartou parte delas e o cliente precisa recarregar o board inteiro.
+        """
+        with self._lock:
+            self._last_access = self._clock()
+            current = self._version
+            if version >= current:
+                return current, []
+            if not self._entries or self._entries[0]["version"] > version + 1:
+                return current, None
+            return current, [e for e in self._entries if e["version"] > version]
+
+    def poll_once(self):
+        """Consulta o banco uma vez; retorna a nova entrada ou None se nada mudou."""
+        with self._lock:
+            watermark = self._watermark
+        if watermark is None:
+            return None
+        changed, open_ids, extra = self._fetch_delta(watermark)
+        with self._lock:
+            self._stats["polls"] += 1
+            fresh = []
+            for row in changed or []:
+                cid = card_id(row)
+                sig = card_signature(row)
+                if self._seen.get(cid) != sig:
+                    self._seen[cid] = sig
+                    fresh.append(row)
+            open_set = None if open_ids is None else {str(n) for n in open_ids}
+            closed = open_set is not None and self._open_ids is not None and open_set != self._open_ids
+            first = self._open_ids is None and open_set is not None
+            if open_set is not None:
+                self._open_ids = open_set
+                # só interessa a assinatura de cards ainda abertos
+                self._seen = {k: v for k, v in self._seen.items() if k in open_set}
+            mark = board_watermark(fresh)
+            if mark is not None and mark > self._watermark:
+                self._watermark = mark
+            if not (fresh or closed or first):
+                return None
+            self._version += 1
+            entry = {"version": self._version, "changed": fresh, "open_ids": open_ids, "extra": extra}
+            self._entries.append(entry)
+            self._stats["entries"] += 1
+        if self._on_change is not None:
+            try:
+                self._on_change(entry)
+            except Exception:
+                pass
+        return entry
+
+    def start(self):
+        """Inicia a thread do poller (uma vez por processo)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="board-poller", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["version"] = self._version
+            out["log_size"] = len(self._entries)
+            out["watermark"] = self._watermark
+        return out
+
+    # ---------- internos ----------
+    def _idle(self) -> bool:
+        with self._lock:
+            last = self._last_access
+        return last is None or self._clock() - last > self.idle_timeout
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self._idle():
+                with self._lock:
+                    self._stats["skipped_idle"] += 1
+                continue
+            try:
+                self.poll_once()
+            except Exception:
+                with self._lock:
+                    self._stats["errors"] += 1
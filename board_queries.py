@@ -0,0 +1,57 @@
+# board_queries.py
+"""Consultas em lote usadas pelo board, sem dependência da UI.
+
+Ficam fora de main.py (que importa NiceGUI) para que possam ser testadas com
+tests/fake_pyodbc.py.
+"""
+
+from authentication import get_db_connection
+
+# SQL Server aceita no máximo 2100 parâmetros por comando; usamos lotes menores
+LATEST_ITERATIONS_BATCH = 500
+
+SQL_ULTIMAS_ITERACOES = """
+SELECT X.NumAtendimento, X.NumIteracao, X.DataIteracao, X.HoraIteracao, X.NomeUsuario
+FROM (
+    SELECT AI.NumAtendimento, AI.NumIteracao, AI.DataIteracao, AI.HoraIteracao, U.NomeUsuario,
+           ROW_NUMBER() OVER (PARTITION BY AI.NumAtendimento ORDER BY AI.NumIteracao DESC) AS rn
+    FROM AtendimentoIteracao AI WITH (NOLOCK)
+    LEFT JOIN Usuarios U WITH (NOLOCK) ON AI.CodUsuario = U.CodUsuario
+    WHERE AI.Desdobramento = 0
+      AND AI.NumAtendimento IN ({placeholders})
+) X
+WHERE X.rn = 1
+"""
+
+
+def fetch_latest_iterations(nums):
+    """Versão em lote de `main.fetch_latest_iteration`.
+
+    Retorna dicionário NumAtendimento -> última iteração (NumIteracao, Data/Hora,
+    NomeUsuario) usando uma única consulta por lote de atendimentos, em vez de uma
+    conexão e uma consulta por card. O TextoIteracao não é trazido aqui (o board já
+    o recebe via SQL_ATENDIMENTOS_IMPLANTACAO). Atendimentos sem iteração não
+    aparecem no resultado.
+    """
+    unique = list(dict.fromkeys(n for n in (nums or []) if n is not None))
+    if not unique:
+        return {}
+    result = {}
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        for i in range(0, len(unique), LATEST_ITERATIONS_BATCH):
+            chunk = unique[i:i + LATEST_ITERATIONS_BATCH]
+            sql = SQL_ULTIMAS_ITERACOES.format(placeholders=", ".join("?" for _ in chunk))
+            cur.execute(sql, tuple(chunk))
+            cols = [c[0] for c in cur.description]
+            for row in cur.fetchall():
+                item = dict(zip(cols, row))
+                result[item.get("NumAtendimento")] = item
+        return result
+    finally:
+        try:
+            cur.close()
+            conn.close()
+        except Exception:
+            pass
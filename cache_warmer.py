@@ -0,0 +1,138 @@
+# cache_warmer.py
+"""Pré-aquecimento dos caches (textos limpos, flags e imagens) em segundo plano.
+
+Sem isso, cada cache só é preenchido no primeiro clique de algum usuário.
+`CacheWarmer.schedule(cards)` dispara uma rodada numa thread daemon:
+
+1. `prepare(card)` roda para cada card (trabalho barato: snippet, flag) e
+   devolve uma tarefa de imagem ou None;
+2. as tarefas são agrupadas em lotes de `batch_size`; para cada lote,
+   `fetch_texts(tasks)` completa os textos truncados numa única consulta;
+3. `warm(task)` (extração e gravação da imagem) roda com no máximo
+   `concurrency` tarefas simultâneas.
+
+Baixa prioridade: poucas threads, pausa entre tarefas e nenhuma espera do
+lado da UI. Uma nova chamada a schedule() durante uma rodada interrompe a
+rodada atual e recomeça com os cards mais recentes. Tarefas concluídas
+(pelo `id`) não são repetidas nas rodadas seguintes.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# limite do conjunto de tarefas concluídas (ids) lembradas entre rodadas
+_MAX_DONE_IDS = 50000
+
+
+class CacheWarmer:
+    def __init__(self, prepare, fetch_texts, warm, concurrency: int = 2, batch_size: int = 50, delay: float = 0.05):
+        self._prepare = prepare
+        self._fetch_texts = fetch_texts
+        self._warm = warm
+        self.concurrency = max(1, int(concurrency))
+        self.batch_size = max(1, int(batch_size))
+        self.delay = max(0.0, float(delay))
+        self._lock = threading.Lock()
+        self._pending = None
+        self._generation = 0
+        self._thread = None
+        self._done = set()
+        self._stats = {"runs": 0, "interrupted": 0, "cards": 0, "warmed": 0, "skipped": 0, "errors": 0}
+        self._last_duration = None
+
+    def schedule(self, cards):
+        """Agenda uma rodada para `cards` (lista de dicts); retorna imediatamente."""
+        with self._lock:
+            self._pending = list(cards or [])
+            self._generation += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="cache-warmer", daemon=True)
+                self._thread.start()
+
+    def wait_idle(self, timeout: float = None) -> bool:
+        """Aguarda o fim das rodadas agendadas (uso em testes/scripts)."""
+        t = self._thread
+        if t is not None:
+            t.join(timeout)
+            return not t.is_alive()
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["done_ids"] = len(self._done)
+            out["running"] = self._thread is not None and self._thread.is_alive()
+            out["last_duration"] = self._last_duration
+        return out
+
+    # ---------- internos ----------
+    def _stale(self, generation: int) -> bool:
+        return self._generation != generation
+
+    def _run(self):
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="cache-warm") as executor:
+            while True:
+                with self._lock:
+                    cards, self._pending = self._pending, None
+                    generation = self._generation
+                    if cards is None:
+                        # sair ainda sob o lock: um schedule() concorrente cria outra thread
+                        self._thread = None
+                        return
+                started = time.monotonic()
+                completed = self._run_once(executor, cards, generation)
+                with self._lock:
+                    self._stats["runs" if completed else "interrupted"] += 1
+                    if completed:
+                        self._last_duration = time.monotonic() - started
+
+    def _run_once(self, executor, cards, generation) -> bool:
+        tasks = []
+        for card in cards:
+            if self._stale(generation):
+                return False
+            try:
+                task = self._prepare(card)
+            except Exception:
+                self._count("errors")
+                continue
+            self._count("cards")
+            if task is None:
+                continue
+            if task.get("id") in self._done:
+                self._count("skipped")
+                continue
+            tasks.append(task)
+
+        for i in range(0, len(tasks), self.batch_size):
+            if self._stale(generation):
+                return False
+            batch = tasks[i:i + self.batch_size]
+            try:
+                self._fetch_texts(batch)
+            except Exception:
+                self._count("errors")
+                continue
+            futures = {executor.submit(self._warm_one, task): task for task in batch}
+            wait(futures)
+        return True
+
+    def _warm_one(self, task):
+        try:
+            self._warm(task)
+        except Exception:
+            self._count("errors")
+        else:
+            self._count("warmed")
+            with self._lock:
+                if len(self._done) >= _MAX_DONE_IDS:
+                    self._done.clear()
+                if task.get("id") is not None:
+                    self._done.add(task["id"])
+        if self.delay:
+            time.sleep(self.delay)
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self._stats[name] += n
@@ -0,0 +1,45 @@
+# db_async.py
+"""Execução de funções de banco fora do event loop do NiceGUI.
+
+As funções `fetch_*` usam pyodbc (bloqueante). Chamá-las direto num handler de
+clique congela o websocket de todos os usuários conectados enquanto a consulta
+roda. `run_db()` executa a função num pool de threads limitado e devolve um
+awaitable, de modo que o loop continua atendendo os demais clientes.
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# por padrão, tantas threads quanto conexões no pool (MSSQL_POOL_SIZE): mais
+# threads que conexões só fariam as threads extras esperarem pelo checkout
+try:
+    DB_EXECUTOR_THREADS = max(1, int(os.getenv("DB_EXECUTOR_THREADS", os.getenv("MSSQL_POOL_SIZE", "10"))))
+except Exception:
+    DB_EXECUTOR_THREADS = 10
+
+_executor = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Retorna o executor de DB do processo, criando-o sob demanda."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_THREADS, thread_name_prefix="db")
+    return _executor
+
+
+async def run_db(fn, *args, **kwargs):
+    """Executa `fn(*args, **kwargs)` no pool de threads de DB e aguarda o resultado."""
+    loop = asyncio.get_running_loop()
+    call = functools.partial(fn, *args, **kwargs)
+    return await loop.run_in_executor(get_executor(), call)
+
+
+def shutdown(wait: bool = False):
+    """Encerra o executor (usado no shutdown da aplicação)."""
+    global _executor
+    ex, _executor = _executor, None
+    if ex is not None:
+        ex.shutdown(wait=wait)
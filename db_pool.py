@@ -0,0 +1,241 @@
+# db_pool.py
+"""Pool de conexões genérico usado por authentication.get_db_connection.
+
+O pool não importa pyodbc: recebe uma função `creator` que abre uma conexão
+"crua" (ex.: ``lambda: pyodbc.connect(conn_str)``). Isso permite exercitar o
+pool offline com um dublê de pyodbc (ver tests/fake_pyodbc.py).
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """Nenhuma conexão ficou disponível dentro do tempo de checkout."""
+
+
+class PooledConnection:
+    """Proxy para uma conexão do pool.
+
+    Delegamos todos os atributos para a conexão real; `close()` devolve a
+    conexão ao pool em vez de encerrá-la, de forma que os chamadores existentes
+    (que fazem ``conn.close()`` no final) continuam funcionando sem alteração.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get("_raw")
+        if raw is None:
+            raise AttributeError(f"conexão já devolvida ao pool ({name})")
+        return getattr(raw, name)
+
+    @property
+    def closed(self) -> bool:
+        return self._raw is None
+
+    def invalidate(self):
+        """Descarta a conexão real (ex.: após erro de rede) em vez de reutilizá-la."""
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool._release(raw, discard=True)
+
+    def close(self):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool._release(raw)
+
+    def __del__(self):
+        # conexão esquecida sem close(): devolver ao pool para não "vazar" um slot
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Pool thread-safe com tamanho máximo, timeout de checkout, expiração de
+    conexões ociosas e pre-ping (health check) antes de entregar uma conexão.
+    """
+
+    def __init__(
+        self,
+        creator,
+        max_size: int = 10,
+        timeout: float = 30.0,
+        idle_timeout: float = 300.0,
+        pre_ping: bool = True,
+        ping_sql: str = "SELECT 1",
+    ):
+        self._creator = creator
+        self.max_size = max(1, int(max_size))
+        self.timeout = float(timeout)
+        self.idle_timeout = float(idle_timeout)
+        self.pre_ping = bool(pre_ping)
+        self.ping_sql = ping_sql
+
+        self._cond = threading.Condition()
+        # conexões ociosas: (raw, instante em que voltaram ao pool); LIFO para
+        # reaproveitar a conexão "mais quente" e deixar as antigas expirarem
+        self._idle = deque()
+        self._total = 0
+        self._disposed = False
+        self._stats = {
+            "created": 0,
+            "reused": 0,
+            "discarded": 0,
+            "evicted_idle": 0,
+            "ping_failures": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "checkouts": 0,
+        }
+
+    # ---------- checkout / checkin ----------
+    def acquire(self, timeout: float = None) -> PooledConnection:
+        """Retorna uma conexão do pool (reutilizada ou nova).
+
+        Bloqueia até `timeout` segundos quando o pool está cheio e levanta
+        PoolTimeout se nenhuma conexão for devolvida nesse intervalo.
+        """
+        wait = self.timeout if timeout is None else float(timeout)
+        deadline = time.monotonic() + wait
+        while True:
+            raw = None
+            create = False
+            expired = []
+            with self._cond:
+                if self._disposed:
+                    raise RuntimeError("pool de conexões encerrado")
+                expired = self._pop_expired_locked()
+                if self._idle:
+                    raw, _ = self._idle.pop()
+                elif self._total < self.max_size:
+                    self._total += 1
+                    create = True
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(
+                            f"nenhuma conexão disponível em {wait:.1f}s (max_size={self.max_size})"
+                        )
+                    self._stats["waits"] += 1
+                    self._cond.wait(remaining)
+                    continue
+            for old in expired:
+                self._close_quietly(old)
+
+            if create:
+                try:
+                    raw = self._creator()
+                except Exception:
+                    with self._cond:
+                        self._total -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._stats["created"] += 1
+                    self._stats["checkouts"] += 1
+                return PooledConnection(self, raw)
+
+            if self.pre_ping and not self._ping(raw):
+                with self._cond:
+                    self._stats["ping_failures"] += 1
+                self._release(raw, discard=True)
+                continue
+
+            with self._cond:
+                self._stats["reused"] += 1
+                self._stats["checkouts"] += 1
+            return PooledConnection(self, raw)
+
+    def _release(self, raw, discard: bool = False):
+        if not discard:
+            # conexões são abertas com autocommit=False: desfazer qualquer
+            # transação pendente para não vazar estado entre chamadores
+            try:
+                raw.rollback()
+            except Exception:
+                discard = True
+        with self._cond:
+            if discard or self._disposed:
+                self._total -= 1
+                self._stats["discarded"] += 1
+            else:
+                self._idle.append((raw, time.monotonic()))
+                raw = None
+            self._cond.notify()
+        if raw is not None:
+            self._close_quietly(raw)
+
+    # ---------- manutenção ----------
+    def _pop_expired_locked(self):
+        if self.idle_timeout <= 0 or not self._idle:
+            return []
+        limit = time.monotonic() - self.idle_timeout
+        expired = []
+        # as mais antigas ficam à esquerda da deque
+        while self._idle and self._idle[0][1] < limit:
+            raw, _ = self._idle.popleft()
+            expired.append(raw)
+        if expired:
+            self._total -= len(expired)
+            self._stats["evicted_idle"] += len(expired)
+            self._cond.notify(len(expired))
+        return expired
+
+    def evict_idle(self) -> int:
+        """Fecha conexões ociosas além de idle_timeout. Retorna quantas foram fechadas."""
+        with self._cond:
+            expired = self._pop_expired_locked()
+        for raw in expired:
+            self._close_quietly(raw)
+        return len(expired)
+
+    def _ping(self, raw) -> bool:
+        try:
+            cur = raw.cursor()
+            try:
+                cur.execute(self.ping_sql)
+                cur.fetchone()
+            finally:
+                cur.close()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def dispose(self):
+        """Fecha todas as conexões ociosas e impede novos checkouts."""
+        with self._cond:
+            self._disposed = True
+            idle = [raw for raw, _ in self._idle]
+            self._idle.clear()
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for raw in idle:
+            self._close_quietly(raw)
+
+    def stats(self) -> dict:
+        """Retorna um snapshot das estatísticas do pool."""
+        with self._cond:
+            out = dict(self._stats)
+            out.update(
+                {
+                    "max_size": self.max_size,
+                    "size": self._total,
+                    "idle": len(self._idle),
+                    "in_use": self._total - len(self._idle),
+                }
+            )
+        return out
@@ -6,7 +6,7 @@ Uso:
 Imprime:
 - existência de TextoIteracao
 - chave de cache (sha256)
-- presença do arquivo de flag em cache_images
+- flag gravado no índice do cache (cache_images/cache_index.sqlite3)
 - resultado de extract_first_image_from_rtf (has_image, mime, bytes_len)
 
 """
@@ -15,6 +15,7 @@ import os
 import sys
 
 from authentication import get_db_connection
+from image_cache import ImageCacheIndex
 from rtf_utils import extract_first_image_from_rtf
 
 CACHE_DIR = os.path.join(os.path.dirname(__file__), "cache_images")
@@ -33,8 +34,7 @@ def image_cache_key(content):
         return None
 
 
-def flag_path_for_key(key):
-    return os.path.join(CACHE_DIR, f"{key}.hasimg") if key else None
+INDEX_PATH = os.getenv("IMAGE_CACHE_INDEX", os.path.join(CACHE_DIR, "cache_index.sqlite3"))
 
 
 def fetch_latest_text_for_atendimento(num):
@@ -68,17 +68,15 @@ def main():
     print("TextoIteracao length:", len(str(texto)))
     key = image_cache_key(texto)
     print("Cache key:", key)
-    flag = flag_path_for_key(key)
-    print("Flag path:", flag)
-    if flag and os.path.exists(flag):
-        try:
-            with open(flag, "r", encoding="utf-8") as f:
-                val = f.read(1)
-            print("Flag file exists, value:", val)
-        except Exception as e:
-            print("Flag file exists but cannot be read:", e)
-    else:
-        print("No flag file present")
+    print("Index path:", INDEX_PATH)
+    try:
+        flag = ImageCacheIndex(INDEX_PATH).get_flag(key)
+        if flag is None:
+            print("No flag recorded for this key")
+        else:
+            print("Flag recorded, value:", "1" if flag else "0")
+    except Exception as e:
+        print("Cache index cannot be read:", e)
 
     try:
         img_bytes, mime = extract_first_image_from_rtf(texto)
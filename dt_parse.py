@@ -0,0 +1,146 @@
+# dt_parse.py
+"""Conversão de datas vindas do banco (datetime, date, str ou bytes) em datetime.
+
+Antes cada tela tinha sua cópia do laço de `strptime` com até cinco formatos,
+levantando e capturando uma exceção a cada formato errado. Aqui:
+
+- datetime é devolvido como veio (o caso normal com pyodbc) e date vira
+  datetime à meia-noite;
+- textos ISO ("2025-01-31", "2025-01-31 10:20:30[.fff]") usam
+  `datetime.fromisoformat`, bem mais rápido que `strptime`;
+- para os demais formatos, `DateParser` lembra o último formato que funcionou
+  e o tenta primeiro (uma coluna costuma vir toda no mesmo formato);
+- `parse_many` converte uma coluna inteira, reaproveitando o resultado de
+  valores repetidos.
+
+Valores vazios ou em formato desconhecido resultam em None.
+"""
+
+from datetime import date, datetime, time
+
+DATETIME_FORMATS = ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y")
+# HoraIteracao vem como "12:50:52" ou como datetime completo ("1900-01-01 12:50:52")
+TIME_FORMATS = ("%H:%M:%S", "%H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M")
+
+
+def _to_str(value) -> str:
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode(errors="ignore").strip()
+    return str(value).strip()
+
+
+def _looks_iso(s: str) -> bool:
+    return len(s) >= 10 and s[4] == "-" and s[7] == "-"
+
+
+class DateParser:
+    """Converte valores em datetime tentando primeiro o último formato que funcionou.
+
+    A dica do último formato é apenas uma otimização: acessos concorrentes no
+    máximo fazem uma thread tentar um formato a mais.
+    """
+
+    def __init__(self, formats=DATETIME_FORMATS, iso: bool = True):
+        self.formats = tuple(formats)
+        self.iso = iso
+        self._last = self.formats[0] if self.formats else None
+
+    def parse(self, value):
+        if value is None or isinstance(value, datetime):
+            return value
+        if isinstance(value, date):
+            return datetime.combine(value, time())
+        try:
+            s = _to_str(value)
+        except Exception:
+            return None
+        if not s:
+            return None
+        if self.iso and _looks_iso(s):
+            try:
+                return datetime.fromisoformat(s)
+            except ValueError:
+                pass
+        return self._parse_str(s)
+
+    def _parse_str(self, s: str):
+        last = self._last
+        if last is not None:
+            try:
+                return datetime.strptime(s, last)
+            except ValueError:
+                pass
+        for fmt in self.formats:
+            if fmt == last:
+                continue
+            try:
+                dt = datetime.strptime(s, fmt)
+            except ValueError:
+                continue
+            self._last = fmt
+            return dt
+        return None
+
+    def parse_many(self, values) -> list:
+        """Converte uma sequência de valores (ex.: uma coluna do board) de uma vez."""
+        out = []
+        memo = {}
+        for value in values:
+            if value is None or isinstance(value, datetime):
+                out.append(value)
+                continue
+            try:
+                dt = memo[value]
+            except KeyError:
+                dt = memo[value] = self.parse(value)
+            except TypeError:
+                # valor não hashable
+                dt = self.parse(value)
+            out.append(dt)
+        return out
+
+
+_datetimes = DateParser(DATETIME_FORMATS)
+_times = DateParser(TIME_FORMATS, iso=False)
+
+
+def parse_datetime(value):
+    """datetime/date/str/bytes -> datetime, ou None se vazio/inválido."""
+    return _datetimes.parse(value)
+
+
+def parse_datetimes(values) -> list:
+    """Versão em lote de parse_datetime (mesma ordem dos valores)."""
+    return _datetimes.parse_many(values)
+
+
+def parse_time(value):
+    """Hora de um valor time/datetime/str ("HH:MM[:SS]" ou data e hora), ou None."""
+    if value is None or isinstance(value, time):
+        return value
+    if isinstance(value, datetime):
+        return value.time()
+    dt = _times.parse(value)
+    return dt.time() if dt else None
+
+
+def combine_date_time(d, t):
+    """Junta a data de `d` (DataIteracao) com a hora de `t` (HoraIteracao).
+
+    Sem hora válida, devolve a data de `d`; sem data válida, None.
+    """
+    date_part = parse_datetime(d)
+    if date_part is None:
+        return None
+    time_part = parse_time(t) if t else None
+    if time_part:
+        return datetime.combine(date_part.date(), time_part)
+    return date_part
+
+
+def format_datetime(value, fmt: str = "%Y-%m-%d %H:%M:%S", default: str = "-"):
+    """Formata o valor como data; `default` para None e None para valores inválidos."""
+    if value is None:
+        return default
+    dt = parse_datetime(value)
+    return dt.strftime(fmt) if dt else None
@@ -0,0 +1,640 @@
+# image_cache.py
+"""Índice embutido (SQLite) do cache de imagens.
+
+Substitui os antigos arquivos `<sha256>.hasimg` (um arquivo por RTF distinto em
+cache_images/) e guarda também os metadados das imagens temporárias servidas
+em /_temp_img/<key> (extensão, tamanho, mtime e último acesso).
+
+O banco usa WAL e busy_timeout, então pode ser compartilhado por vários
+workers/processos; cada thread usa sua própria conexão.
+
+Imagens são endereçadas pelo sha256 dos bytes da imagem (`image_key`), não do
+RTF: a mesma captura colada em várias iterações é gravada uma única vez. A
+tabela rtf_images mapeia a chave do RTF (sha256 do TextoIteracao) para a chave
+da imagem e temp_images.refcount conta quantos RTFs apontam para cada imagem;
+quando o último vínculo é liberado a imagem é removida. `ImageStore` concentra
+a gravação (usado por main.py e pelos scripts em tools/).
+
+Para cada imagem gravada são gerados também variantes WebP reduzidas
+(`<image_key>.w<largura>.webp`, ver IMAGE_VARIANT_WIDTHS) quando o Pillow está
+disponível; o original continua disponível sob demanda. O tamanho registrado
+no índice inclui os variantes, e a remoção de uma imagem apaga todos eles.
+
+Os totais de uso (bytes/entradas) ficam na tabela cache_meta e são mantidos
+incrementalmente a cada gravação/remoção; `evict_lru()` remove as imagens menos
+recentemente acessadas (índice por last_access) até voltar aos limites, com
+custo proporcional ao que é removido, sem varrer o diretório.
+"""
+
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# SQLite limita a quantidade de parâmetros por comando; consultas em lote usam fatias
+_BATCH = 500
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS image_flags (
+        key TEXT PRIMARY KEY,
+        has_image INTEGER NOT NULL,
+        updated REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_image_flags_updated ON image_flags(updated)",
+    """
+    CREATE TABLE IF NOT EXISTS temp_images (
+        key TEXT PRIMARY KEY,
+        ext TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime REAL NOT NULL,
+        last_access REAL NOT NULL,
+        refcount INTEGER NOT NULL DEFAULT 0,
+        variants TEXT NOT NULL DEFAULT ''
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_temp_images_last_access ON temp_images(last_access)",
+    """
+    CREATE TABLE IF NOT EXISTS cache_meta (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )
+    """,
+    # totais iniciais calculados a partir das linhas existentes (bancos criados antes da cache_meta)
+    "INSERT OR IGNORE INTO cache_meta (name, value) SELECT 'total_bytes', COALESCE(SUM(size), 0) FROM temp_images",
+    "INSERT OR IGNORE INTO cache_meta (name, value) SELECT 'total_entries', COUNT(*) FROM temp_images",
+    "INSERT OR IGNORE INTO cache_meta (name, value) VALUES ('evictions', 0)",
+    "INSERT OR IGNORE INTO cache_meta (name, value) VALUES ('evicted_bytes', 0)",
+    """
+    CREATE TABLE IF NOT EXISTS rtf_images (
+        rtf_key TEXT PRIMARY KEY,
+        image_key TEXT NOT NULL,
+        linked REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_rtf_images_image_key ON rtf_images(image_key)",
+    "CREATE INDEX IF NOT EXISTS ix_rtf_images_linked ON rtf_images(linked)",
+)
+
+# colunas acrescentadas depois da criação da tabela (bancos antigos recebem ALTER TABLE)
+_TEMP_IMAGES_ADDED_COLUMNS = {
+    "refcount": "INTEGER NOT NULL DEFAULT 0",
+    "variants": "TEXT NOT NULL DEFAULT ''",
+}
+
+_MIME_EXT = (("png", ".png"), ("jpeg", ".jpg"), ("jpg", ".jpg"), ("gif", ".gif"), ("webp", ".webp"))
+
+# escada de tamanhos: miniatura e tamanho de exibição (diálogos limitam a 60vh)
+IMAGE_VARIANT_WIDTHS = (320, 1280)
+VARIANT_EXT = ".webp"
+VARIANT_MIME = "image/webp"
+VARIANT_QUALITY = 80
+
+
+def image_key(img_bytes) -> str:
+    """Chave de conteúdo de uma imagem: sha256 hex dos bytes extraídos do RTF."""
+    if not img_bytes:
+        return None
+    if isinstance(img_bytes, str):
+        img_bytes = img_bytes.encode("latin-1", errors="ignore")
+    return hashlib.sha256(bytes(img_bytes)).hexdigest()
+
+
+def ext_for_mime(mime: str) -> str:
+    m = (mime or "").lower()
+    for token, ext in _MIME_EXT:
+        if token in m:
+            return ext
+    return ".bin"
+
+
+def build_variants(img_bytes: bytes, widths=IMAGE_VARIANT_WIDTHS, quality: int = VARIANT_QUALITY) -> dict:
+    """Gera variantes WebP reduzidas: {largura: bytes}.
+
+    Só são gerados variantes menores que a imagem original (não há ampliação).
+    Sem Pillow, ou se a imagem não puder ser lida, retorna {}.
+    """
+    if not widths or not img_bytes:
+        return {}
+    try:
+        from io import BytesIO
+
+        from PIL import Image, ImageFile
+
+        ImageFile.LOAD_TRUNCATED_IMAGES = True
+        img = Image.open(BytesIO(img_bytes))
+        img.load()
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+        out = {}
+        for w in sorted(set(int(w) for w in widths)):
+            if w <= 0 or w >= img.width:
+                continue
+            h = max(1, round(img.height * w / img.width))
+            buf = BytesIO()
+            img.resize((w, h), Image.LANCZOS).save(buf, format="WEBP", quality=quality, method=4)
+            out[w] = buf.getvalue()
+        return out
+    except Exception:
+        return {}
+
+
+def _atomic_write(path: Path, data: bytes):
+    """Grava em arquivo temporário no mesmo diretório e renomeia (os.replace).
+
+    Leitores nunca veem um arquivo pela metade e gravações concorrentes do
+    mesmo conteúdo (outro worker/processo) apenas substituem uma à outra.
+    """
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def write_image_files(directory, key: str, ext: str, data: bytes, variant_widths=IMAGE_VARIANT_WIDTHS):
+    """Grava o original `<key><ext>` e os variantes reduzidos; retorna (bytes gravados, larguras).
+
+    Função de módulo (sem estado) para poder rodar em outro processo.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    variants = build_variants(data, variant_widths)
+    for w, vdata in variants.items():
+        _atomic_write(directory / f"{key}.w{int(w)}{VARIANT_EXT}", vdata)
+    # o original por último: sua presença indica que os variantes já estão no lugar
+    _atomic_write(directory / f"{key}{ext}", data)
+    return len(data) + sum(len(v) for v in variants.values()), tuple(sorted(variants))
+
+
+def select_variant(widths, requested) -> "int|None":
+    """Escolhe o menor variante com largura >= `requested`; None = servir o original.
+
+    `requested` vazio/ inválido/ <= 0 também seleciona o original.
+    """
+    try:
+        req = int(requested)
+    except (TypeError, ValueError):
+        return None
+    if req <= 0:
+        return None
+    fits = [w for w in widths or () if w >= req]
+    return min(fits) if fits else None
+
+
+class ImageCacheIndex:
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    # ---------- conexão ----------
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            # autocommit (isolation_level=None): cada comando é sua própria transação,
+            # exceto onde usamos BEGIN explicitamente para lotes
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+            self._ensure_schema(conn)
+        return conn
+
+    def _ensure_schema(self, conn):
+        if self._schema_ready:
+            return
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            for stmt in _SCHEMA:
+                conn.execute(stmt)
+            cols = {row[1] for row in conn.execute("PRAGMA table_info(temp_images)")}
+            for name, decl in _TEMP_IMAGES_ADDED_COLUMNS.items():
+                if name not in cols:
+                    try:
+                        conn.execute(f"ALTER TABLE temp_images ADD COLUMN {name} {decl}")
+                    except sqlite3.OperationalError:
+                        pass  # outro processo adicionou a coluna ao mesmo tempo
+            self._schema_ready = True
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _add_meta(conn, **deltas):
+        for name, delta in deltas.items():
+            if delta:
+                conn.execute("UPDATE cache_meta SET value = value + ? WHERE name = ?", (int(delta), name))
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.conn = None
+            conn.close()
+
+    # ---------- flags "tem imagem" ----------
+    def get_flag(self, key: str):
+        """Retorna True/False se houver flag gravada para `key`, ou None."""
+        if not key:
+            return None
+        row = self._conn().execute("SELECT has_image FROM image_flags WHERE key = ?", (key,)).fetchone()
+        return None if row is None else bool(row[0])
+
+    def get_flags(self, keys) -> dict:
+        """Consulta em lote: dicionário key -> bool apenas para as chaves conhecidas."""
+        unique = list(dict.fromkeys(k for k in keys if k))
+        out = {}
+        conn = self._conn()
+        for i in range(0, len(unique), _BATCH):
+            chunk = unique[i:i + _BATCH]
+            sql = "SELECT key, has_image FROM image_flags WHERE key IN (%s)" % ",".join("?" * len(chunk))
+            for key, has_image in conn.execute(sql, chunk):
+                out[key] = bool(has_image)
+        return out
+
+    def set_flag(self, key: str, has_image: bool):
+        if key:
+            self.set_flags({key: has_image})
+
+    def set_flags(self, mapping: dict):
+        rows = [(k, 1 if v else 0, time.time()) for k, v in mapping.items() if k]
+        if not rows:
+            return
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO image_flags (key, has_image, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET has_image = excluded.has_image, updated = excluded.updated",
+                rows,
+            )
+
+    def delete_flags_older_than(self, timestamp: float) -> int:
+        cur = self._conn().execute("DELETE FROM image_flags WHERE updated < ?", (timestamp,))
+        return cur.rowcount or 0
+
+    # ---------- imagens temporárias ----------
+    def put_temp_image(self, key: str, ext: str, size: int, mtime: float = None, variants=()):
+        """Registra a imagem `key`; `size` inclui os variantes (larguras em `variants`)."""
+        now = time.time()
+        variants_str = ",".join(str(int(w)) for w in sorted(variants or ()))
+        with self._transaction() as conn:
+            old = conn.execute("SELECT size FROM temp_images WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT INTO temp_images (key, ext, size, mtime, last_access, variants) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET ext = excluded.ext, size = excluded.size, "
+                "mtime = excluded.mtime, last_access = excluded.last_access, variants = excluded.variants",
+                (key, ext, int(size), float(mtime if mtime is not None else now), now, variants_str),
+            )
+            if old is None:
+                self._add_meta(conn, total_bytes=int(size), total_entries=1)
+            else:
+                self._add_meta(conn, total_bytes=int(size) - old[0])
+
+    def get_temp_image(self, key: str):
+        """Metadados da imagem temporária ou None.
+
+        Chaves: key, ext, size, mtime, last_access, refcount e variants (tupla de larguras).
+        """
+        row = self._conn().execute(
+            "SELECT key, ext, size, mtime, last_access, refcount, variants FROM temp_images WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        meta = dict(zip(("key", "ext", "size", "mtime", "last_access", "refcount"), row))
+        meta["variants"] = tuple(int(w) for w in row[6].split(",") if w)
+        return meta
+
+    def touch_temp_image(self, key: str, when: float = None):
+        self._conn().execute(
+            "UPDATE temp_images SET last_access = ? WHERE key = ?", (when if when is not None else time.time(), key)
+        )
+
+    def delete_temp_image(self, key: str):
+        with self._transaction() as conn:
+            old = conn.execute("SELECT size FROM temp_images WHERE key = ?", (key,)).fetchone()
+            if old is not None:
+                conn.execute("DELETE FROM temp_images WHERE key = ?", (key,))
+                conn.execute("DELETE FROM rtf_images WHERE image_key = ?", (key,))
+                self._add_meta(conn, total_bytes=-old[0], total_entries=-1)
+
+    def evict_lru(self, max_bytes: int = None, max_entries: int = None, batch: int = 64) -> list:
+        """Remove do índice as imagens menos recentemente acessadas até respeitar os limites.
+
+        Limites None/<= 0 são ignorados. Retorna a lista (key, ext, size) removida;
+        apagar os arquivos correspondentes fica a cargo do chamador.
+        """
+        max_bytes = max_bytes if max_bytes and max_bytes > 0 else None
+        max_entries = max_entries if max_entries and max_entries > 0 else None
+        if max_bytes is None and max_entries is None:
+            return []
+        # caminho rápido sem lock de escrita: dentro dos limites não há o que fazer
+        total_bytes, total_entries = self._totals(self._conn())
+        if (max_bytes is None or total_bytes <= max_bytes) and (max_entries is None or total_entries <= max_entries):
+            return []
+        evicted = []
+        with self._transaction() as conn:
+            total_bytes, total_entries = self._totals(conn)
+            while (max_bytes is not None and total_bytes > max_bytes) or (
+                max_entries is not None and total_entries > max_entries
+            ):
+                rows = conn.execute(
+                    "SELECT key, ext, size FROM temp_images ORDER BY last_access LIMIT ?", (batch,)
+                ).fetchall()
+                if not rows:
+                    break
+                for key, ext, size in rows:
+                    if not (
+                        (max_bytes is not None and total_bytes > max_bytes)
+                        or (max_entries is not None and total_entries > max_entries)
+                    ):
+                        break
+                    conn.execute("DELETE FROM temp_images WHERE key = ?", (key,))
+                    conn.execute("DELETE FROM rtf_images WHERE image_key = ?", (key,))
+                    total_bytes -= size
+                    total_entries -= 1
+                    evicted.append((key, ext, size))
+            if evicted:
+                freed = sum(e[2] for e in evicted)
+                self._add_meta(
+                    conn,
+                    total_bytes=-freed,
+                    total_entries=-len(evicted),
+                    evictions=len(evicted),
+                    evicted_bytes=freed,
+                )
+        return evicted
+
+    # ---------- vínculos RTF -> imagem ----------
+    def image_key_for_rtf(self, rtf_key: str):
+        if not rtf_key:
+            return None
+        row = self._conn().execute("SELECT image_key FROM rtf_images WHERE rtf_key = ?", (rtf_key,)).fetchone()
+        return row[0] if row else None
+
+    def link_rtf(self, rtf_key: str, image_key: str) -> list:
+        """Vincula o RTF à imagem (refcount +1). Revincular a outra imagem libera a anterior.
+
+        Retorna as imagens (key, ext, size) que ficaram sem referência e foram
+        retiradas do índice; o chamador apaga os arquivos.
+        """
+        now = time.time()
+        orphaned = []
+        with self._transaction() as conn:
+            row = conn.execute("SELECT image_key FROM rtf_images WHERE rtf_key = ?", (rtf_key,)).fetchone()
+            if row is not None and row[0] == image_key:
+                conn.execute("UPDATE rtf_images SET linked = ? WHERE rtf_key = ?", (now, rtf_key))
+                return orphaned
+            conn.execute(
+                "INSERT INTO rtf_images (rtf_key, image_key, linked) VALUES (?, ?, ?) "
+                "ON CONFLICT(rtf_key) DO UPDATE SET image_key = excluded.image_key, linked = excluded.linked",
+                (rtf_key, image_key, now),
+            )
+            conn.execute("UPDATE temp_images SET refcount = refcount + 1 WHERE key = ?", (image_key,))
+            if row is not None:
+                orphaned.extend(self._release(conn, [row[0]]))
+        return orphaned
+
+    def release_links_older_than(self, timestamp: float) -> list:
+        """Remove vínculos RTF -> imagem antigos cuja imagem também não é acessada desde `timestamp`.
+
+        `linked` só é gravado quando a imagem é armazenada; o uso diário
+        (lookup_rtf + download) atualiza apenas o last_access da imagem, então
+        um vínculo só expira quando os dois são anteriores a `timestamp`
+        (refcount -1 cada). Retorna as imagens (key, ext, size) que ficaram sem
+        referência.
+        """
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT r.rtf_key, r.image_key FROM rtf_images r "
+                "LEFT JOIN temp_images t ON t.key = r.image_key "
+                "WHERE r.linked < ? AND COALESCE(t.last_access, 0) < ?",
+                (timestamp, timestamp),
+            ).fetchall()
+            if not rows:
+                return []
+            conn.executemany("DELETE FROM rtf_images WHERE rtf_key = ?", [(r[0],) for r in rows])
+            return self._release(conn, [r[1] for r in rows])
+
+    def _release(self, conn, image_keys) -> list:
+        """Decrementa o refcount de cada ocorrência em `image_keys`; remove as imagens que chegam a zero."""
+        orphaned = []
+        for key in image_keys:
+            conn.execute("UPDATE temp_images SET refcount = refcount - 1 WHERE key = ? AND refcount > 0", (key,))
+            row = conn.execute("SELECT ext, size, refcount FROM temp_images WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[2] == 0:
+                conn.execute("DELETE FROM temp_images WHERE key = ?", (key,))
+                self._add_meta(conn, total_bytes=-row[1], total_entries=-1)
+                orphaned.append((key, row[0], row[1]))
+        return orphaned
+
+    @staticmethod
+    def _totals(conn):
+        meta = dict(conn.execute("SELECT name, value FROM cache_meta WHERE name IN ('total_bytes', 'total_entries')"))
+        return meta.get("total_bytes", 0), meta.get("total_entries", 0)
+
+    def usage(self) -> dict:
+        """Uso atual do cache de imagens: bytes, entradas e contadores de evicção."""
+        meta = dict(self._conn().execute("SELECT name, value FROM cache_meta"))
+        flags = self._conn().execute("SELECT COUNT(*) FROM image_flags").fetchone()[0]
+        links = self._conn().execute("SELECT COUNT(*) FROM rtf_images").fetchone()[0]
+        return {
+            "bytes": meta.get("total_bytes", 0),
+            "entries": meta.get("total_entries", 0),
+            "evictions": meta.get("evictions", 0),
+            "evicted_bytes": meta.get("evicted_bytes", 0),
+            "flags": flags,
+            # RTFs distintos que apontam para as imagens armazenadas (links > entries = deduplicação)
+            "rtf_links": links,
+        }
+
+    def temp_images_not_accessed_since(self, timestamp: float) -> list:
+        """Lista (key, ext) das imagens sem acesso desde `timestamp` (usa o índice por last_access)."""
+        return self._conn().execute(
+            "SELECT key, ext FROM temp_images WHERE last_access < ? ORDER BY last_access", (timestamp,)
+        ).fetchall()
+
+    # ---------- migração ----------
+    def import_flag_files(self, directory, remove: bool = True) -> int:
+        """Importa arquivos legados `<key>.hasimg` de `directory` para o índice.
+
+        Com `remove=True` os arquivos importados são apagados. Retorna quantos
+        flags foram importados.
+        """
+        mapping = {}
+        paths = []
+        try:
+            entries = os.scandir(directory)
+        except FileNotFoundError:
+            return 0
+        with entries:
+            for entry in entries:
+                if not entry.name.endswith(".hasimg") or not entry.is_file():
+                    continue
+                try:
+                    with open(entry.path, "r", encoding="utf-8") as f:
+                        mapping[entry.name[: -len(".hasimg")]] = f.read(1) == "1"
+                    paths.append(entry.path)
+                except Exception:
+                    continue
+        if mapping:
+            self.set_flags(mapping)
+        if remove:
+            for p in paths:
+                try:
+                    os.remove(p)
+                except Exception:
+                    pass
+        return len(mapping)
+
+    def import_temp_images(self, directory) -> int:
+        """Registra no índice os arquivos `<key>.<ext>` de `directory` ainda não indexados.
+
+        O mtime do arquivo é usado como último acesso. Retorna quantos foram registrados.
+        """
+        found = []
+        try:
+            entries = os.scandir(directory)
+        except FileNotFoundError:
+            return 0
+        with entries:
+            for entry in entries:
+                try:
+                    if not entry.is_file():
+                        continue
+                    key, ext = os.path.splitext(entry.name)
+                    if "." in key:
+                        # variante reduzido (<key>.w320.webp, contabilizado com o original)
+                        # ou gravação em andamento (.<nome>.part)
+                        continue
+                    st = entry.stat()
+                    found.append((key, ext, st.st_size, st.st_mtime))
+                except Exception:
+                    continue
+        if not found:
+            return 0
+        known = set()
+        conn = self._conn()
+        for i in range(0, len(found), _BATCH):
+            chunk = [f[0] for f in found[i:i + _BATCH]]
+            sql = "SELECT key FROM temp_images WHERE key IN (%s)" % ",".join("?" * len(chunk))
+            known.update(r[0] for r in conn.execute(sql, chunk))
+        rows = [f for f in found if f[0] not in known]
+        if not rows:
+            return 0
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO temp_images (key, ext, size, mtime, last_access) VALUES (?, ?, ?, ?, ?)",
+                [(k, e, size, mtime, mtime) for k, e, size, mtime in rows],
+            )
+            self._add_meta(conn, total_bytes=sum(r[2] for r in rows), total_entries=len(rows))
+        return len(rows)
+
+
+class ImageStore:
+    """Gravação de imagens extraídas em `<directory>/<image_key><ext>`, registrada no índice.
+
+    Usado tanto pela aplicação quanto pelos scripts em tools/, para que todos
+    sigam o mesmo esquema de chaves. Com `variant_widths` vazio nenhum variante
+    reduzido é gerado.
+    """
+
+    def __init__(self, directory, index: ImageCacheIndex, variant_widths=IMAGE_VARIANT_WIDTHS):
+        self.directory = Path(directory)
+        self.index = index
+        self.variant_widths = tuple(variant_widths or ())
+
+    def path_for(self, key: str, ext: str) -> Path:
+        return self.directory / f"{key}{ext}"
+
+    def variant_path(self, key: str, width: int) -> Path:
+        return self.directory / f"{key}.w{int(width)}{VARIANT_EXT}"
+
+    def lookup_rtf(self, rtf_key: str):
+        """Retorna (image_key, Path, larguras dos variantes) da imagem já armazenada para o RTF, ou None."""
+        key = self.index.image_key_for_rtf(rtf_key)
+        if key is None:
+            return None
+        meta = self.index.get_temp_image(key)
+        if meta is None:
+            return None
+        p = self.path_for(key, meta["ext"])
+        return (key, p, meta["variants"]) if p.is_file() else None
+
+    def prepare(self, img_bytes: bytes, mime: str, overwrite: bool = False):
+        """Calcula chave/extensão da imagem e verifica se ela já está armazenada.
+
+        Retorna (image_key, ext, Path, larguras) quando nada precisa ser gravado,
+        ou (image_key, ext, Path, None) quando os arquivos precisam ser escritos.
+        """
+        key = image_key(img_bytes)
+        if key is None:
+            return None
+        ext = ext_for_mime(mime)
+        p = self.path_for(key, ext)
+        meta = None if overwrite else self.index.get_temp_image(key)
+        if meta is not None and meta["ext"] == ext and p.is_file():
+            return key, ext, p, meta["variants"]
+        return key, ext, p, None
+
+    def register(self, key: str, ext: str, size: int, widths):
+        self.index.put_temp_image(key, ext, size, time.time(), widths)
+
+    def link(self, rtf_key: str, key: str):
+        """Vincula o RTF à imagem, apagando arquivos de imagens que ficaram sem referência."""
+        if rtf_key:
+            self.remove_files(self.index.link_rtf(rtf_key, key))
+
+    def store(self, rtf_key: str, img_bytes: bytes, mime: str, transform=None, overwrite: bool = False):
+        """Grava a imagem e seus variantes (uma vez por conteúdo) e vincula `rtf_key` a ela.
+
+        `transform(bytes) -> bytes` é aplicado apenas quando o arquivo precisa
+        ser escrito (ex.: achatar transparência). Retorna (image_key, Path, larguras).
+        Versão síncrona usada pelos scripts; a aplicação usa image_jobs.ImageJobQueue.
+        """
+        if isinstance(img_bytes, str):
+            img_bytes = img_bytes.encode("latin-1", errors="ignore")
+        prepared = self.prepare(img_bytes, mime, overwrite)
+        if prepared is None:
+            return None
+        key, ext, p, widths = prepared
+        if widths is None:
+            data = transform(img_bytes) if transform is not None else img_bytes
+            size, widths = write_image_files(self.directory, key, ext, data, self.variant_widths)
+            self.register(key, ext, size, widths)
+        self.link(rtf_key, key)
+        return key, p, widths
+
+    def remove_files(self, entries):
+        """Apaga os arquivos (original e variantes) das entradas (key, ext, ...) retiradas do índice."""
+        for entry in entries or []:
+            paths = [self.path_for(entry[0], entry[1])]
+            paths.extend(self.variant_path(entry[0], w) for w in self.variant_widths)
+            for p in paths:
+                try:
+                    p.unlink()
+                except FileNotFoundError:
+                    pass
+                except Exception:
+                    pass
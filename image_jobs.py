@@ -0,0 +1,225 @@
+# image_jobs.py
+"""Normalização de imagens (Pillow) fora do event loop, em um pool de processos.
+
+Achatar transparência e gerar os variantes reduzidos é trabalho de CPU que
+segura o GIL; feito no handler de clique, congela o websocket de todos os
+usuários. `ImageJobQueue` envia esse trabalho para um ProcessPoolExecutor e:
+
+- deduplica por chave da imagem: dois usuários abrindo a mesma iteração
+  aguardam o mesmo job em vez de processar (e gravar) a imagem duas vezes;
+- grava de forma atômica (arquivo temporário + os.replace, ver
+  image_cache.write_image_files);
+- registra a imagem no índice e vincula o RTF no processo principal.
+
+Os processos do pool usam o contexto "spawn" (mesmo comportamento no Windows
+e no Linux) e recebem a variável de ambiente WORKER_ENV, para que o módulo
+principal, reimportado como __mp_main__, não inicie a UI dentro deles.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from image_cache import ImageStore, write_image_files
+
+WORKER_ENV = "KANBAN_IMAGE_WORKER"
+
+# 0 = processar em uma thread (sem pool de processos)
+try:
+    IMAGE_JOB_WORKERS = max(0, int(os.getenv("IMAGE_JOB_WORKERS", "2")))
+except Exception:
+    IMAGE_JOB_WORKERS = 2
+
+_spawn_lock = threading.Lock()
+
+
+def flatten_alpha(img_bytes: bytes) -> bytes:
+    """Achata imagens com canal alfa sobre fundo branco (PNG transparente some na UI).
+
+    Best-effort: se o Pillow não estiver instalado ou o processamento falhar,
+    retorna os bytes originais.
+    """
+    try:
+        from io import BytesIO
+
+        # Pillow: enable tolerant loading for truncated images so the
+        # app can still attempt to render/flatten partially-corrupt
+        # PNGs instead of raising OSError. This may produce visual
+        # artifacts but avoids hard failures.
+        from PIL import Image, ImageFile
+
+        ImageFile.LOAD_TRUNCATED_IMAGES = True
+
+        img = Image.open(BytesIO(img_bytes))
+        img.load()
+        has_alpha = img.mode in ("LA", "RGBA") or ("transparency" in img.info)
+        if not has_alpha:
+            return img_bytes
+        # composite over white background
+        bg = Image.new("RGB", img.size, (255, 255, 255))
+        try:
+            if img.mode in ("LA", "RGBA"):
+                bg.paste(img, mask=img.split()[-1])
+            else:
+                # other cases where transparency is indicated in info
+                bg.paste(img)
+        except Exception:
+            # fallback: paste without mask
+            bg.paste(img)
+        out_buf = BytesIO()
+        bg.save(out_buf, format="PNG")
+        return out_buf.getvalue()
+    except Exception:
+        # PIL not available or processing failed -> use original bytes
+        return img_bytes
+
+
+def normalize_and_write(directory: str, key: str, ext: str, img_bytes: bytes, variant_widths) -> tuple:
+    """Job executado no pool: achata a imagem e grava original + variantes.
+
+    Retorna (bytes gravados, larguras dos variantes).
+    """
+    return write_image_files(directory, key, ext, flatten_alpha(img_bytes), variant_widths)
+
+
+class ImageJobQueue:
+    def __init__(self, store: ImageStore, max_workers: int = IMAGE_JOB_WORKERS):
+        self.store = store
+        self.max_workers = max(0, int(max_workers))
+        self._lock = threading.Lock()
+        self._executor = None
+        self._inflight = {}
+        self._stats = {"submitted": 0, "coalesced": 0, "already_stored": 0, "errors": 0}
+
+    # ---------- executor ----------
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.max_workers == 0:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-job")
+                else:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                    )
+            return self._executor
+
+    def _submit_job(self, *args):
+        executor = self._get_executor()
+        if isinstance(executor, ThreadPoolExecutor):
+            return executor.submit(normalize_and_write, *args)
+        # processos são criados sob demanda dentro de submit(): marcar o ambiente
+        # herdado por eles enquanto isso acontece
+        with _spawn_lock:
+            previous = os.environ.get(WORKER_ENV)
+            os.environ[WORKER_ENV] = "1"
+            try:
+                return executor.submit(normalize_and_write, *args)
+            finally:
+                if previous is None:
+                    os.environ.pop(WORKER_ENV, None)
+                else:
+                    os.environ[WORKER_ENV] = previous
+
+    def shutdown(self, wait: bool = False):
+        with self._lock:
+            ex, self._executor = self._executor, None
+        if ex is not None:
+            ex.shutdown(wait=wait, cancel_futures=True)
+
+    # ---------- API ----------
+    def submit(self, rtf_key: str, img_bytes: bytes, mime: str) -> Future:
+        """Agenda a gravação da imagem; o Future resolve para (image_key, Path, larguras).
+
+        Imagens já armazenadas resolvem imediatamente; jobs da mesma imagem em
+        andamento são compartilhados. O vínculo RTF -> imagem é feito para cada
+        chamador.
+        """
+        if isinstance(img_bytes, str):
+            img_bytes = img_bytes.encode("latin-1", errors="ignore")
+        caller = Future()
+        prepared = self.store.prepare(img_bytes, mime)
+        if prepared is None:
+            caller.set_result(None)
+            return caller
+        key, ext, path, widths = prepared
+        if widths is not None:
+            with self._lock:
+                self._stats["already_stored"] += 1
+            self._finish(caller, rtf_key, (key, path, widths))
+            return caller
+
+        with self._lock:
+            job = self._inflight.get(key)
+            leader = job is None
+            if leader:
+                job = self._inflight[key] = Future()
+                self._stats["submitted"] += 1
+            else:
+                self._stats["coalesced"] += 1
+        if leader:
+            self._start(job, key, ext, path, img_bytes)
+        job.add_done_callback(lambda f: self._on_job_done(f, caller, rtf_key))
+        return caller
+
+    async def save(self, rtf_key: str, img_bytes: bytes, mime: str):
+        """Versão awaitable de submit()."""
+        return await asyncio.wrap_future(self.submit(rtf_key, img_bytes, mime))
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["inflight"] = len(self._inflight)
+        return out
+
+    # ---------- internos ----------
+    def _start(self, job: Future, key: str, ext: str, path, img_bytes: bytes):
+        args = (str(self.store.directory), key, ext, img_bytes, self.store.variant_widths)
+        try:
+            work = self._submit_job(*args)
+        except (BrokenProcessPool, RuntimeError):
+            # pool quebrado (processo filho morreu): recriar uma vez
+            self.shutdown()
+            try:
+                work = self._submit_job(*args)
+            except Exception as e:
+                self._complete(job, key, error=e)
+                return
+
+        def _done(f):
+            try:
+                size, widths = f.result()
+                self.store.register(key, ext, size, widths)
+            except BaseException as e:
+                self._complete(job, key, error=e)
+            else:
+                self._complete(job, key, result=(key, path, widths))
+
+        work.add_done_callback(_done)
+
+    def _complete(self, job: Future, key: str, result=None, error=None):
+        with self._lock:
+            self._inflight.pop(key, None)
+            if error is not None:
+                self._stats["errors"] += 1
+        if error is not None:
+            job.set_exception(error)
+        else:
+            job.set_result(result)
+
+    def _on_job_done(self, job: Future, caller: Future, rtf_key: str):
+        try:
+            result = job.result()
+        except BaseException as e:
+            caller.set_exception(e)
+            return
+        self._finish(caller, rtf_key, result)
+
+    def _finish(self, caller: Future, rtf_key: str, result):
+        try:
+            self.store.link(rtf_key, result[0])
+        except Exception:
+            pass  # o vínculo só acelera a próxima abertura; a imagem já está gravada
+        caller.set_result(result)
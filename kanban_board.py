@@ -0,0 +1,279 @@
+# kanban_board.py
+"""Lógica do board Kanban independente da UI (sem NiceGUI/pyodbc).
+
+Mantida fora de main.py para poder ser testada isoladamente.
+"""
+
+import sys
+from datetime import datetime
+
+from dt_parse import parse_datetime, parse_datetimes
+
+# cards abertos há mais dias que isso ficam em vermelho
+DAYS_OPEN_LIMIT = 120
+
+# colunas do SQL_ATENDIMENTOS_IMPLANTACAO usadas como marca d'água do refresh incremental
+WATERMARK_FIELDS = ("UltimaIteracao", "Abertura")
+
+
+def card_id(card) -> str:
+    """Identificador estável do card (NumAtendimento normalizado como str)."""
+    return str((card or {}).get("NumAtendimento"))
+
+
+def board_watermark(cards):
+    """Retorna o maior UltimaIteracao/Abertura (datetime) entre os cards, ou None."""
+    mark = None
+    for card in cards or []:
+        for field in WATERMARK_FIELDS:
+            v = card.get(field)
+            if isinstance(v, datetime) and (mark is None or v > mark):
+                mark = v
+    return mark
+
+
+def _is_open(row) -> bool:
+    try:
+        return int(row.get("Situacao")) == 0
+    except Exception:
+        return False
+
+
+def _row_changed(old: dict, new: dict) -> bool:
+    # campos iniciados com "_" são anotações locais da sessão (ex.: _last_move)
+    return any(old.get(k) != v for k, v in new.items() if not k.startswith("_"))
+
+
+def apply_board_delta(column_cards: dict, changed_rows, open_ids, start_col: str) -> dict:
+    """Aplica um refresh incremental às listas de cards por coluna (in-place).
+
+    - `changed_rows`: linhas novas ou alteradas desde a marca d'água (qualquer Situacao);
+    - `open_ids`: NumAtendimento de todas as implantações abertas, usado para
+      detectar atendimentos encerrados sem nova iteração (None = não verificar).
+
+    Cards existentes são atualizados no lugar (preservando a coluna e anotações
+    locais); novos cards vão para `start_col`; encerrados são removidos.
+    Retorna dicionário com listas de ids `added`, `updated`, `removed` e o
+    conjunto `columns` com as colunas afetadas.
+    """
+    located = {}
+    for col, lst in column_cards.items():
+        for card in lst:
+            located[card_id(card)] = (col, card)
+
+    open_set = None if open_ids is None else {str(n) for n in open_ids}
+    added, updated, removed = [], [], []
+    columns = set()
+
+    def _remove(cid):
+        col, card = located.pop(cid)
+        try:
+            column_cards[col].remove(card)
+        except ValueError:
+            pass
+        removed.append(cid)
+        columns.add(col)
+
+    for row in changed_rows or []:
+        cid = card_id(row)
+        still_open = _is_open(row) and (open_set is None or cid in open_set)
+        if cid in located:
+            if not still_open:
+                _remove(cid)
+                continue
+            col, card = located[cid]
+            if _row_changed(card, row):
+                card.update(row)
+                updated.append(cid)
+                columns.add(col)
+        elif still_open:
+            card = dict(row)
+            column_cards.setdefault(start_col, []).append(card)
+            located[cid] = (start_col, card)
+            added.append(cid)
+            columns.add(start_col)
+
+    if open_set is not None:
+        for cid in [c for c in located if c not in open_set]:
+            _remove(cid)
+
+    return {"added": added, "updated": updated, "removed": removed, "columns": columns}
+
+
+def card_signature(card, *extra) -> tuple:
+    """Assinatura dos dados exibidos no card (campos + `extra`, ex.: analista).
+
+    Dois cards com a mesma assinatura renderizam igual; o board só recria o
+    elemento de um card quando a assinatura muda.
+    """
+    card = card or {}
+    return tuple((k, card[k]) for k in sorted(card)) + extra
+
+
+def plan_column(rendered, desired) -> dict:
+    """Compara os cards renderizados de uma coluna com o estado desejado.
+
+    - `rendered`: {id: assinatura} dos elementos existentes (de qualquer coluna);
+    - `desired`: lista ordenada de (id, assinatura) da coluna.
+
+    Retorna `create` (ids sem elemento), `update` (assinatura mudou, recriar)
+    e `order` (ids na ordem de exibição). Elementos fora de `desired` não são
+    tocados aqui: o chamador remove os que não estão em coluna nenhuma.
+    """
+    create, update = [], []
+    for cid, sig in desired:
+        if cid not in rendered:
+            create.append(cid)
+        elif rendered[cid] != sig:
+            update.append(cid)
+    return {"create": create, "update": update, "order": [cid for cid, _ in desired]}
+
+
+class CardView:
+    """Dados de exibição de um card, derivados uma vez da linha do board.
+
+    O board lê daqui datas já convertidas, rótulos e a chave de ordenação em
+    vez de recalculá-los a cada renderização. `sanitize` é aplicado aos textos
+    exibidos (main.sanitize_text). O que depende da data atual (dias em
+    aberto e classes de cor) não é guardado: days_open/days_class/prox_class
+    calculam na hora a partir de abertura/prox_contato, pois as views vivem
+    enquanto a sessão estiver aberta. `dates` recebe (Abertura,
+    DataProxContato, UltimaIteracao) já convertidas (build_card_views converte
+    as colunas em lote).
+    """
+
+    __slots__ = (
+        "cid",
+        "num",
+        "cliente",
+        "abertura",
+        "prox_contato",
+        "ultima",
+        "ultima_label",
+        "prox_label",
+        "sort_key",
+    )
+
+    def __init__(self, row, sanitize=str, dates=None):
+        row = row or {}
+        if dates is None:
+            dates = (
+                parse_datetime(row.get("Abertura")),
+                parse_datetime(row.get("DataProxContato")),
+                parse_datetime(row.get("UltimaIteracao")),
+            )
+        self.cid = card_id(row)
+        self.num = row.get("NumAtendimento")
+        self.cliente = sanitize(row.get("NomeCliente") or "-")
+
+        self.abertura, self.prox_contato, self.ultima = dates
+        # mais antigos primeiro; sem data de abertura no fim (ordenação crescente)
+        self.sort_key = (0, self.abertura) if self.abertura else (1, datetime.min)
+
+        self.prox_label = self.prox_contato.strftime("%d/%m/%Y") if self.prox_contato else "-"
+
+        ultima_raw = row.get("UltimaIteracao")
+        if self.ultima:
+            self.ultima_label = self.ultima.strftime("%Y-%m-%d %H:%M:%S")
+        else:
+            self.ultima_label = "-" if ultima_raw is None else sanitize(str(ultima_raw))
+
+    def days_open(self, now=None):
+        """Dias desde a abertura até `now` (padrão: agora), ou None sem data de abertura."""
+        if not self.abertura:
+            return None
+        return ((now or datetime.now()) - self.abertura).days
+
+    def days_class(self, now=None):
+        """Cor do "Aberto há N dias": vermelho acima de DAYS_OPEN_LIMIT."""
+        days = self.days_open(now)
+        if days is None:
+            return None
+        return "text-blue-600" if days <= DAYS_OPEN_LIMIT else "text-red-600"
+
+    def prox_class(self, now=None):
+        """Cor do próximo contato: atrasado, hoje ou futuro em relação a `now`."""
+        if not self.prox_contato:
+            return "text-gray-500"
+        pd, today = self.prox_contato.date(), (now or datetime.now()).date()
+        return "text-red-600" if pd < today else "text-black" if pd == today else "text-blue-600"
+
+    def footprint(self) -> int:
+        """Bytes aproximados em memória: o objeto e os valores que não são singletons."""
+        seen = {id(None)}
+        total = sys.getsizeof(self)
+        for name in self.__slots__:
+            value = getattr(self, name, None)
+            if id(value) in seen:
+                continue
+            seen.add(id(value))
+            total += sys.getsizeof(value)
+            if isinstance(value, tuple):
+                total += sum(sys.getsizeof(v) for v in value if id(v) not in seen)
+        return total
+
+
+def build_card_views(rows, sanitize=str) -> dict:
+    """Retorna {card_id: CardView} para as linhas do board."""
+    rows = list(rows or [])
+    columns = [parse_datetimes([r.get(f) for r in rows]) for f in ("Abertura", "DataProxContato", "UltimaIteracao")]
+    views = {}
+    for row, dates in zip(rows, zip(*columns)):
+        view = CardView(row, sanitize, dates)
+        views[view.cid] = view
+    return views
+
+
+def card_views_footprint(views) -> dict:
+    """Quantidade de views e bytes aproximados (total e por card)."""
+    views = list((views or {}).values())
+    total = sum(v.footprint() for v in views)
+    return {"cards": len(views), "bytes": total, "avg_bytes": (total / len(views)) if views else 0.0}
+
+
+def grow_window(limit: int, total: int, page_size: int) -> int:
+    """Novo limite de cards exibidos numa coluna após pedir mais uma página."""
+    if page_size <= 0:
+        return total
+    return min(max(limit, 0) + page_size, max(total, 0))
+
+
+def column_header(name: str, total: int, shown: int) -> str:
+    """Título da coluna com o total de cards (e quantos estão exibidos, se parcial)."""
+    if shown < total:
+        return f"{name} ({shown} de {total})"
+    return f"{name} ({total})"
+
+
+def fill_snippets(cards, snippet, fetch_texts, cache=None) -> int:
+    """Grava em card["Snippet"] o trecho da última iteração de cada card.
+
+    O board recebe só um prefixo do RTF (TextoTruncado=1 quando cortado). Se a
+    iteração começa com uma imagem, o hexadecimal do \\pict ocupa o prefixo todo
+    e o trecho sai vazio; para esses cards o texto é buscado em lote:
+    `fetch_texts([(NumAtendimento, NumIteracaoUltima), ...])` -> {par: RTF}
+    (em main, só uma janela limitada após a imagem). Uma iteração não muda
+    depois de gravada, então o trecho obtido fica em `cache` ({par: trecho})
+    e cargas e deltas seguintes não consultam o banco de novo, mesmo quando o
+    trecho sai vazio. Retorna quantos textos foram buscados.
+    """
+    cache = {} if cache is None else cache
+    missing = []
+    for card in cards or []:
+        card["Snippet"] = snippet(card.get("TextoIteracao") or "")
+        if not card["Snippet"] and card.get("TextoTruncado") and card.get("NumIteracaoUltima") is not None:
+            pair = (card.get("NumAtendimento"), card.get("NumIteracaoUltima"))
+            if pair in cache:
+                card["Snippet"] = cache[pair]
+            else:
+                missing.append((pair, card))
+    if not missing:
+        return 0
+    pairs = list(dict.fromkeys(pair for pair, _card in missing))
+    texts = fetch_texts(pairs) or {}
+    for pair in pairs:
+        text = texts.get(pair)
+        cache[pair] = snippet(text) if text else ""
+    for pair, card in missing:
+        card["Snippet"] = cache[pair]
+    return len(pairs)
@@ -4,8 +4,8 @@
 # inicializadas em start_app().
 # pyodbc is used by authentication.get_db_connection; import removed here to
 # avoid an unused import at module top-level.
+import asyncio
 import base64
-import hashlib
 import os
 import threading
 import time
@@ -14,10 +14,34 @@ from pathlib import Path
 
 from starlette.exceptions import HTTPException
 from starlette.requests import Request
-from starlette.responses import Response
+from starlette.responses import FileResponse, Response
 
 from authentication import get_db_connection, verify_user
-from rtf_utils import extract_first_image_from_rtf, limpar_rtf
+from board_cache import CachedLoader
+from board_poller import BoardPoller
+from board_queries import fetch_latest_iterations
+from cache_warmer import CacheWarmer
+from dt_parse import combine_date_time, format_datetime, parse_datetimes
+from kanban_board import (
+    CardView,
+    apply_board_delta,
+    board_watermark,
+    build_card_views,
+    card_id,
+    card_signature,
+    card_views_footprint,
+    column_header,
+    fill_snippets,
+    grow_window,
+    plan_column,
+)
+import db_async
+from db_async import run_db
+import image_jobs
+from image_cache import IMAGE_VARIANT_WIDTHS, ImageCacheIndex, ImageStore, ext_for_mime
+from rtf_utils import extract_first_image_from_rtf, has_embedded_image, limpar_rtf, rtf_fragment, rtf_snippet
+from temp_images import TempImageIndex, temp_image_response
+from text_cache import TextCache, content_key
 from nicegui import ui
 from version import APP_NAME, APP_VERSION
 
@@ -51,17 +75,91 @@ def sanitize_text(value: object) -> str:
     return cleaned
 
 
-# diretório de cache de imagens (já usado para flags .hasimg)
+# diretório de cache de imagens (imagens temporárias em tmp/ e o índice do cache)
 IMAGE_CACHE_DIR = Path(os.getenv("IMAGE_CACHE_DIR", "cache_images"))
 TEMP_IMAGE_SUBDIR = "tmp"
 IMAGE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
+# índice SQLite (WAL) com os flags "tem imagem" e os metadados das imagens
+# temporárias; substitui os antigos arquivos <sha256>.hasimg
+IMAGE_CACHE_INDEX_PATH = Path(os.getenv("IMAGE_CACHE_INDEX", str(IMAGE_CACHE_DIR / "cache_index.sqlite3")))
+_cache_index = ImageCacheIndex(IMAGE_CACHE_INDEX_PATH)
+_image_store = ImageStore(IMAGE_CACHE_DIR / TEMP_IMAGE_SUBDIR, _cache_index)
+# normalização (Pillow) e gravação das imagens em um pool de processos
+_image_jobs = image_jobs.ImageJobQueue(_image_store)
+# limites do cache de imagens temporárias (0 = sem limite); ao exceder, as
+# imagens menos recentemente acessadas são removidas
+try:
+    CACHE_MAX_BYTES = max(0, int(float(os.getenv("CACHE_MAX_MB", "512")) * 1024 * 1024))
+except Exception:
+    CACHE_MAX_BYTES = 512 * 1024 * 1024
+try:
+    CACHE_MAX_ENTRIES = max(0, int(os.getenv("CACHE_MAX_ENTRIES", "20000")))
+except Exception:
+    CACHE_MAX_ENTRIES = 20000
+
 # debug logging disabled: _append_image_debug is a no-op to avoid writing files
 def _append_image_debug(msg: str):
     """No-op placeholder kept for compatibility with previous debug calls."""
     return None
 
 
+# índice em memória das URLs /_temp_img/ (ver temp_images.py); arquivos gravados
+# por outros workers são encontrados no índice SQLite compartilhado. O registro
+# de acesso (last_access) de cada chave é gravado no máximo a cada
+# TEMP_IMAGE_TOUCH_INTERVAL segundos.
+TEMP_IMAGE_TOUCH_INTERVAL = 300
+_temp_images = TempImageIndex(_image_store, touch_interval=TEMP_IMAGE_TOUCH_INTERVAL)
+
+
+def _index_temp_image(key: str, path: Path, mime: str = None, widths=(), img_key: str = None):
+    _temp_images.add(key, path, mime, widths, img_key)
+
+
+def _resolve_temp_image(key: str):
+    """Retorna (Path, mime, larguras dos variantes, chave da imagem) de `key`, ou None."""
+    return _temp_images.resolve(key)
+
+
+def _touch_temp_image(key: str):
+    """Registra o acesso a `key` no índice (no máximo a cada TEMP_IMAGE_TOUCH_INTERVAL)."""
+    _temp_images.touch(key)
+
+
+def _forget_temp_image(key: str, ext: str):
+    """Apaga os arquivos de `key` (original e variantes) e o retira do índice em memória.
+
+    A remoção do índice SQLite é responsabilidade do chamador.
+    """
+    _temp_images.forget(key)
+    _image_store.remove_files([(key, ext)])
+
+
+def enforce_cache_limits() -> int:
+    """Remove imagens LRU até respeitar CACHE_MAX_BYTES/CACHE_MAX_ENTRIES; retorna quantas saíram."""
+    try:
+        evicted = _cache_index.evict_lru(CACHE_MAX_BYTES, CACHE_MAX_ENTRIES)
+    except Exception:
+        return 0
+    for key, ext, _size in evicted:
+        try:
+            _forget_temp_image(key, ext)
+        except Exception:
+            pass
+    return len(evicted)
+
+
+def get_image_cache_stats() -> dict:
+    """Uso do cache de imagens (bytes, entradas, evicções) e limites configurados."""
+    try:
+        out = _cache_index.usage()
+    except Exception:
+        out = {}
+    out["max_bytes"] = CACHE_MAX_BYTES
+    out["max_entries"] = CACHE_MAX_ENTRIES
+    return out
+
+
 def temp_image_exists_on_disk(key: str) -> bool:
     """Return True if a temp image file for `key` exists on disk.
 
@@ -69,16 +167,7 @@ def temp_image_exists_on_disk(key: str) -> bool:
     check works correctly when running multiple workers.
     """
     try:
-        tmp_dir = IMAGE_CACHE_DIR / TEMP_IMAGE_SUBDIR
-        if not tmp_dir.exists():
-            return False
-        for p in tmp_dir.glob(f"{key}.*"):
-            try:
-                if p.is_file():
-                    return True
-            except Exception:
-                continue
-        return False
+        return _resolve_temp_image(key) is not None
     except Exception:
         return False
 
@@ -88,42 +177,27 @@ def temp_image_endpoint(request: Request, key: str):
 
     Note: annotate `request` as `Request` so FastAPI/Starlette injects it and doesn't treat
     it as a query parameter.
+
+    O arquivo é resolvido pelo índice em memória e enviado em streaming
+    (FileResponse), com ETag forte derivado da chave, Last-Modified e
+    Cache-Control imutável; requisições condicionais recebem 304. Com `?w=N`
+    é servido o menor variante WebP com largura >= N (ou o original). A
+    decisão fica em temp_images.temp_image_response.
     """
     try:
-        # Primary: always serve from disk when present. This avoids relying on
-        # process-local in-memory cache which is not shared across multiple
-        # workers. If the disk file is not found, fall back to memory as a
-        # last-resort (backwards-compatible).
+        entry = _resolve_temp_image(key)
+        if entry is None:
+            raise HTTPException(status_code=404)
         try:
-            tmp_dir = IMAGE_CACHE_DIR / TEMP_IMAGE_SUBDIR
-            if tmp_dir.exists():
-                for p in tmp_dir.glob(f"{key}.*"):
-                    try:
-                        with open(p, "rb") as f:
-                            data = f.read()
-                        ext = p.suffix.lower()
-                        mime_guess = "application/octet-stream"
-                        if ext == ".png":
-                            mime_guess = "image/png"
-                        elif ext in (".jpg", ".jpeg"):
-                            mime_guess = "image/jpeg"
-                        elif ext == ".gif":
-                            mime_guess = "image/gif"
-                        elif ext == ".webp":
-                            mime_guess = "image/webp"
-                        # debug logging removed
-                        return Response(content=data, media_type=mime_guess)
-                    except Exception:
-                        continue
-        except Exception:
-            # disk lookup error: debug logging removed
-            pass
-
-        # If not found on disk, return 404. We intentionally removed the
-        # process-local in-memory fallback because the app no longer relies on
-        # per-process memory cache for temp images.
-        # no entry on disk for key — debug logging removed
-        raise HTTPException(status_code=404)
+            status, path, mime, headers, st = temp_image_response(
+                entry, request.headers, request.query_params.get("w"), _image_store
+            )
+        except FileNotFoundError:
+            raise HTTPException(status_code=404)
+        _touch_temp_image(entry[3])
+        if status == 304:
+            return Response(status_code=304, headers=headers)
+        return FileResponse(path, media_type=mime, headers=headers, stat_result=st)
     except HTTPException:
         raise
     except Exception:
@@ -134,93 +208,140 @@ def temp_image_endpoint(request: Request, key: str):
 def _temp_image_path_for_key(key: str, ext: str) -> Path:
     tmp = IMAGE_CACHE_DIR / TEMP_IMAGE_SUBDIR
     tmp.mkdir(parents=True, exist_ok=True)
-    return tmp / f"{key}{ext}"
+    return _image_store.path_for(key, ext)
 
 
 def _ext_for_mime(mime: str) -> str:
-    if not mime:
-        return ".bin"
-    m = mime.lower()
-    if "png" in m:
-        return ".png"
-    if "jpeg" in m or "jpg" in m:
-        return ".jpg"
-    if "gif" in m:
-        return ".gif"
-    if "webp" in m:
-        return ".webp"
-    return ".bin"
+    return ext_for_mime(mime)
 
 
 def save_temp_image_and_get_url(key: str, img_bytes: bytes, mime: str) -> str:
-    """Persistir bytes em disco e retornar a URL pública /_temp_img/<key>.
+    """Persistir a imagem em disco e retornar a URL pública /_temp_img/<image_key>.
+
+    `key` é a chave do RTF de origem (`_image_cache_key(rtf)`). A imagem é
+    armazenada uma única vez por conteúdo em `cache_images/tmp/<image_key>.<ext>`
+    (sha256 dos bytes da imagem) e o RTF é vinculado a ela no índice do cache,
+    que é a fonte de verdade compartilhada entre workers.
 
-    Não grava mais em cache em memória por processo — isso evita inconsistências
-    quando a aplicação roda com múltiplos workers. A entrada em disco é usada
-    como fonte de verdade. O arquivo em disco será criado em
-    `cache_images/tmp/<key>.<ext>` e o caminho retornado é a URL relativa.
+    Bloqueia até a gravação terminar; handlers da UI devem usar
+    `save_temp_image_async`.
     """
     if not img_bytes or not mime or not key:
         return None
     try:
-        # persist to disk so the image is available to all workers
+        return _temp_image_url(_image_jobs.submit(key, img_bytes, mime).result())
+    except Exception:
+        # failed to persist temp image to disk — debug logging removed
+        return None
+
+
+async def save_temp_image_async(key: str, img_bytes: bytes, mime: str) -> str:
+    """Como save_temp_image_and_get_url, mas aguarda o job no pool de processos sem bloquear o loop."""
+    if not img_bytes or not mime or not key:
+        return None
+    try:
+        return _temp_image_url(await _image_jobs.save(key, img_bytes, mime))
+    except Exception:
+        return None
+
+
+def _temp_image_url(stored) -> str:
+    if stored is None:
+        return None
+    img_key, p, widths = stored
+    _index_temp_image(img_key, p, widths=widths)
+    enforce_cache_limits()
+    return f"/_temp_img/{img_key}"
+
+
+def temp_image_img_html(url: str, style: str = None) -> str:
+    """<img> para uma URL /_temp_img/: variante de exibição + srcset com a escada de tamanhos.
+
+    O original continua acessível pela própria URL (sem ?w=).
+    """
+    style = IMG_STYLE if style is None else style
+    # o navegador busca e decodifica a imagem fora do caminho crítico da renderização
+    attrs = f'loading="lazy" decoding="async" style="{style}"'
+    if not IMAGE_VARIANT_WIDTHS:
+        return f'<img src="{url}" {attrs}>'
+    srcset = ", ".join(f"{url}?w={w} {w}w" for w in IMAGE_VARIANT_WIDTHS)
+    display_w = IMAGE_VARIANT_WIDTHS[-1]
+    return (
+        f'<img src="{url}?w={display_w}" srcset="{srcset}" '
+        f'sizes="(max-width: {display_w}px) 100vw, {display_w}px" {attrs}>'
+    )
+
+
+# último recurso quando a imagem não pôde ser gravada em disco: data URI pelo
+# websocket, apenas para imagens pequenas
+try:
+    IMAGE_DATA_URI_MAX_BYTES = max(0, int(os.getenv("IMAGE_DATA_URI_MAX_KB", "256")) * 1024)
+except Exception:
+    IMAGE_DATA_URI_MAX_BYTES = 256 * 1024
+
+
+async def open_rtf_image_dialog(rtf: str):
+    """Abre o diálogo "Imagem" para a primeira imagem embutida em `rtf`.
+
+    A imagem é servida por URL (/_temp_img/<image_key>, com cache HTTP e
+    carregamento lazy): se o RTF já tiver imagem armazenada, nada é extraído;
+    senão a extração roda fora do event loop e a gravação no pool de
+    image_jobs. O data URI só é usado se a gravação falhar e a imagem couber em
+    IMAGE_DATA_URI_MAX_BYTES.
+    """
+    key = _image_cache_key(rtf)
+    url = cached_temp_image_url(key)
+    img_b, mime = None, None
+    if url is None:
         try:
-            # Attempt to normalize/flatten images that contain alpha channel to
-            # avoid transparent PNGs rendering invisible in the UI. This is
-            # best-effort: if Pillow is not installed or processing fails, we
-            # fall back to writing the original bytes.
-            processed_bytes = img_bytes
-            try:
-                from io import BytesIO
-
-                # Pillow: enable tolerant loading for truncated images so the
-                # app can still attempt to render/flatten partially-corrupt
-                # PNGs instead of raising OSError. This may produce visual
-                # artifacts but avoids hard failures.
-                from PIL import Image, ImageFile
-
-                ImageFile.LOAD_TRUNCATED_IMAGES = True
-
-                buf = BytesIO(img_bytes)
-                img = Image.open(buf)
-                img.load()
-                has_alpha = img.mode in ("LA", "RGBA") or ("transparency" in img.info)
-                if has_alpha:
-                    # composite over white background
-                    bg = Image.new("RGB", img.size, (255, 255, 255))
-                    try:
-                        if img.mode in ("LA", "RGBA"):
-                            bg.paste(img, mask=img.split()[-1])
-                        else:
-                            # other cases where transparency is indicated in info
-                            bg.paste(img)
-                    except Exception:
-                        # fallback: paste without mask
-                        bg.paste(img)
-                    out_buf = BytesIO()
-                    bg.save(out_buf, format="PNG")
-                    processed_bytes = out_buf.getvalue()
-            except Exception:
-                # PIL not available or processing failed -> use original bytes
-                processed_bytes = img_bytes
-
-            ext = _ext_for_mime(mime)
-            p = _temp_image_path_for_key(key, ext)
-            with open(p, "wb") as f:
-                f.write(processed_bytes)
-            # update mtime to now
-            try:
-                os.utime(p, None)
-            except Exception:
-                pass
-            # saved temp image to disk — debug logging removed
+            img_b, mime = await asyncio.get_running_loop().run_in_executor(None, extract_first_image_from_rtf, rtf)
         except Exception:
-            # failed to persist temp image to disk — debug logging removed
-            return None
-        return f"/_temp_img/{key}"
+            img_b, mime = None, None
+        # só o resultado de uma extração real vai para o cache booleano
+        set_image_flag_for_content(rtf, bool(img_b and mime))
+        if img_b and mime:
+            url = await save_temp_image_async(key, img_b, mime)
+
+    dlg = ui.dialog()
+    dlg.classes("w-full max-w-6xl")
+    with dlg:
+        if url:
+            # URL relativa: o navegador requisita o mesmo host/porta
+            ui.html(temp_image_img_html(url), sanitize=False)
+            link_html = (
+                f'<div style="margin-top:8px;">'
+                f'<a href="{url}" target="_blank" rel="noopener" '
+                f'style="color:#ffd700; text-decoration:underline;">'
+                "Abrir imagem em nova aba</a></div>"
+            )
+            ui.html(link_html, sanitize=False)
+        elif img_b and mime and len(img_b) <= IMAGE_DATA_URI_MAX_BYTES:
+            # fallback para data-uri caso a gravação falhe
+            b64 = base64.b64encode(img_b).decode()
+            ui.html(f'<img src="data:{mime};base64,{b64}" style="{IMG_STYLE}">', sanitize=False)
+        elif img_b and mime:
+            ui.label("[Imagem] — não foi possível disponibilizar a imagem").classes("text-sm text-gray-600")
+        else:
+            ui.label("[Imagem] — não foi possível extrair a imagem").classes("text-sm text-gray-600")
+        with ui.row().classes("w-full justify-end gap-2"):
+            ui.button("Fechar [ESC]", on_click=lambda _=None: dlg.close()).classes("secondary")
+    dlg.open()
+
+
+def cached_temp_image_url(rtf_key: str) -> str:
+    """URL da imagem já armazenada para o RTF (sem reextrair), ou None."""
+    try:
+        found = _image_store.lookup_rtf(rtf_key)
     except Exception:
-        # unexpected error saving temp image — debug logging removed
         return None
+    if found is None:
+        return None
+    img_key, p, widths = found
+    _index_temp_image(img_key, p, widths=widths)
+    # o navegador pode servir a URL do próprio cache (imutável) sem chegar ao
+    # endpoint: registrar o uso aqui mantém o vínculo vivo em clean_cache()
+    _touch_temp_image(img_key)
+    return f"/_temp_img/{img_key}"
 
 
 def normalize_description(s: str) -> str:
@@ -248,6 +369,48 @@ def normalize_description(s: str) -> str:
     # colapsar espaços múltiplos e trim
     s = re.sub(r"\s+", " ", s).strip()
     return s
+
+
+# cache LRU (por processo) de textos limpos, chaveado pelo sha256 do RTF original
+try:
+    TEXT_CACHE_MAX_MB = float(os.getenv("TEXT_CACHE_MAX_MB", "32"))
+except Exception:
+    TEXT_CACHE_MAX_MB = 32.0
+_text_cache = TextCache(max_bytes=int(TEXT_CACHE_MAX_MB * 1024 * 1024))
+
+
+def limpar_rtf_cached(texto) -> str:
+    """`limpar_rtf` memoizado pelo hash do conteúdo (ver text_cache.py)."""
+    return _text_cache.get_or_compute("limpar_rtf", texto, limpar_rtf)
+
+
+# tamanho do trecho da última interação exibido no card
+CARD_SNIPPET_CHARS = 250
+
+
+def card_snippet_cached(texto) -> str:
+    """Trecho do card (até CARD_SNIPPET_CHARS + "..."), memoizado pelo hash do conteúdo.
+
+    Usa `rtf_snippet`, que para de ler o RTF assim que há texto suficiente.
+    """
+
+    def _snippet(t):
+        # pedir um caractere a mais para saber se o texto foi cortado
+        s = rtf_snippet(t, CARD_SNIPPET_CHARS + 1)
+        return (s[:CARD_SNIPPET_CHARS] + "...") if len(s) > CARD_SNIPPET_CHARS else s
+
+    return _text_cache.get_or_compute("card_snippet", texto, _snippet)
+
+
+def _clean_rdm_description(raw) -> str:
+    return normalize_description(sanitize_text(limpar_rtf(raw)))
+
+
+def get_text_cache_stats() -> dict:
+    """Estatísticas do cache de textos limpos (entradas, bytes, hit_ratio...)."""
+    return _text_cache.stats()
+
+
 COLUMNS = [
     ("A iniciar", "#b7d1f8", 100),
     ("Visita pré-implantação", "#a3a3a3", 101),
@@ -260,7 +423,20 @@ COLUMNS = [
 COLUMN_MAP = {name: {"color": color, "situacao": situ} for (name, color, situ) in COLUMNS}
 
 # ---------- SQL ----------
-SQL_ATENDIMENTOS_IMPLANTACAO = """
+# O board só exibe um trecho da última iteração e um botão "Imagem"; por isso a
+# consulta devolve apenas um prefixo do RTF (que pode ter megabytes de imagens
+# \pict em hexadecimal) e um indicador de imagem calculado no servidor (mesma
+# regra de has_embedded_image: \pict com \pngblip/\jpegblip). O texto completo é
+# buscado sob demanda via fetch_iteration_text(); para iterações que começam com
+# imagem (prefixo sem texto) o board busca só uma janela após a imagem
+# (fetch_iteration_snippet_texts, ver fill_snippets).
+try:
+    BOARD_TEXT_PREFIX_CHARS = max(512, int(os.getenv("BOARD_TEXT_PREFIX_CHARS", "16000")))
+except Exception:
+    BOARD_TEXT_PREFIX_CHARS = 16000
+
+# lista de colunas/joins do board, compartilhada pela consulta completa e pela incremental
+_SQL_KANBAN_SELECT = """
 SELECT
     A.NumAtendimento,
     A.AssuntoAtendimento,
@@ -275,17 +451,28 @@ SELECT
         WHERE I2.NumAtendimento = A.NumAtendimento
           AND I2.Desdobramento = A.Desdobramento   
     ) AS UltimaIteracao,
-    (
-        SELECT TOP 1 CONVERT(NVARCHAR(MAX), I3.TextoIteracao)
-        FROM AtendimentoIteracao I3 WITH (NOLOCK)
-        WHERE I3.NumAtendimento = A.NumAtendimento
-          AND I3.Desdobramento = A.Desdobramento   
-        ORDER BY I3.NumIteracao DESC
-    ) AS TextoIteracao
+    LI.NumIteracao AS NumIteracaoUltima,
+    LEFT(LI.Texto, %(prefix)d) AS TextoIteracao,
+    CASE WHEN LEN(LI.Texto) > %(prefix)d THEN 1 ELSE 0 END AS TextoTruncado,
+    CASE
+        WHEN CHARINDEX(N'\\pict', LI.Texto) > 0
+             AND (CHARINDEX(N'\\pngblip', LI.Texto) > 0 OR CHARINDEX(N'\\jpegblip', LI.Texto) > 0)
+        THEN 1 ELSE 0
+    END AS TemImagem
 FROM CNSAtendimento A  
 INNER JOIN CnsClientes C WITH (NOLOCK)
     ON A.CodCliente = C.CodCliente
     AND A.CodEmpresa = C.CodEmpresa
+OUTER APPLY (
+    SELECT TOP 1 I3.NumIteracao, CONVERT(NVARCHAR(MAX), I3.TextoIteracao) AS Texto
+    FROM AtendimentoIteracao I3 WITH (NOLOCK)
+    WHERE I3.NumAtendimento = A.NumAtendimento
+      AND I3.Desdobramento = A.Desdobramento   
+    ORDER BY I3.NumIteracao DESC
+) LI
+""" % {"prefix": BOARD_TEXT_PREFIX_CHARS}
+
+SQL_ATENDIMENTOS_IMPLANTACAO = _SQL_KANBAN_SELECT + """
 WHERE
     A.AssuntoAtendimento = N'Implantação'
     AND A.Situacao = 0
@@ -295,6 +482,35 @@ ORDER BY
 
 """
 
+# refresh incremental: atendimentos (abertos ou não) criados ou com iterações a
+# partir da marca d'água. Usa >= para não perder registros gravados no mesmo
+# instante da marca; as linhas repetidas são descartadas em apply_board_delta.
+SQL_ATENDIMENTOS_IMPLANTACAO_DELTA = _SQL_KANBAN_SELECT + """
+WHERE
+    A.AssuntoAtendimento = N'Implantação'
+    AND A.Desdobramento = 0
+    AND (
+        A.RegInclusao >= ?
+        OR EXISTS (
+            SELECT 1
+            FROM AtendimentoIteracao I4 WITH (NOLOCK)
+            WHERE I4.NumAtendimento = A.NumAtendimento
+              AND I4.Desdobramento = A.Desdobramento
+              AND I4.RegInclusao >= ?
+        )
+    );
+"""
+
+# ids das implantações abertas (detecta encerramentos sem nova iteração)
+SQL_IMPLANTACOES_ABERTAS_IDS = """
+SELECT A.NumAtendimento
+FROM CNSAtendimento A WITH (NOLOCK)
+WHERE
+    A.AssuntoAtendimento = N'Implantação'
+    AND A.Situacao = 0
+    AND A.Desdobramento = 0;
+"""
+
 # SQL para listagem de implantações finalizadas (usada pela página/diálogo de "Implantações finalizadas")
 SQL_ATENDIMENTOS_IMPLANTACAO_FINALIZADA = """
 SELECT
@@ -361,6 +577,30 @@ def fetch_kanban_cards():
     return [dict(zip(cols, row)) for row in rows]
 
 
+def fetch_kanban_delta(watermark):
+    """Busca apenas o que mudou no board desde `watermark` (datetime).
+
+    Retorna (linhas_alteradas, ids_abertos): as linhas novas/alteradas têm as
+    mesmas colunas de `fetch_kanban_cards` (incluindo encerradas, com Situacao
+    != 0) e `ids_abertos` é a lista de NumAtendimento ainda abertos.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(SQL_ATENDIMENTOS_IMPLANTACAO_DELTA, (watermark, watermark))
+        cols = [c[0] for c in cur.description]
+        changed = [dict(zip(cols, row)) for row in cur.fetchall()]
+        cur.execute(SQL_IMPLANTACOES_ABERTAS_IDS)
+        open_ids = [row[0] for row in cur.fetchall()]
+        return changed, open_ids
+    finally:
+        try:
+            cur.close()
+            conn.close()
+        except Exception:
+            pass
+
+
 def fetch_implantacoes_finalizadas():
     """Busca atendimentos de implantação com Situacao = 1 (finalizados).
 
@@ -395,6 +635,139 @@ def fetch_history(num_atendimento):
     return [dict(zip(cols, row)) for row in rows]
 
 
+SQL_TEXTO_ITERACAO = """
+SELECT AI.TextoIteracao
+FROM AtendimentoIteracao AI WITH (NOLOCK)
+WHERE AI.NumAtendimento = ?
+  AND AI.Desdobramento = 0
+  AND AI.NumIteracao = ?
+"""
+
+
+def fetch_iteration_text(num_atendimento, num_iteracao):
+    """Retorna o TextoIteracao completo (RTF) de uma iteração, ou None.
+
+    Usado para carregar sob demanda o texto que o board recebe truncado.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(SQL_TEXTO_ITERACAO, (num_atendimento, num_iteracao))
+        row = cur.fetchone()
+        return row[0] if row else None
+    finally:
+        try:
+            cur.close()
+            conn.close()
+        except Exception:
+            pass
+
+
+# pares (NumAtendimento, NumIteracao) por consulta: 2 parâmetros por par
+ITERATION_TEXTS_BATCH = 200
+
+
+def fetch_iteration_texts(pairs):
+    """Versão em lote de `fetch_iteration_text`.
+
+    Recebe pares (NumAtendimento, NumIteracao) e retorna dicionário
+    (NumAtendimento, NumIteracao) -> TextoIteracao.
+    """
+    unique = list(dict.fromkeys((n, i) for n, i in (pairs or []) if n is not None and i is not None))
+    if not unique:
+        return {}
+    result = {}
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        for start in range(0, len(unique), ITERATION_TEXTS_BATCH):
+            chunk = unique[start:start + ITERATION_TEXTS_BATCH]
+            where = " OR ".join("(AI.NumAtendimento = ? AND AI.NumIteracao = ?)" for _ in chunk)
+            sql = (
+                "SELECT AI.NumAtendimento, AI.NumIteracao, AI.TextoIteracao "
+                "FROM AtendimentoIteracao AI WITH (NOLOCK) "
+                f"WHERE AI.Desdobramento = 0 AND ({where})"
+            )
+            cur.execute(sql, tuple(v for pair in chunk for v in pair))
+            for num, it, texto in cur.fetchall():
+                result[(num, it)] = texto
+        return result
+    finally:
+        try:
+            cur.close()
+            conn.close()
+        except Exception:
+            pass
+
+
+# trecho do texto após a última imagem, para cards cuja iteração começa com um
+# print colado (o prefixo do board é só hexadecimal do \pict). O servidor acha o
+# último \pict, o início do hexadecimal (32 dígitos seguidos) e o primeiro
+# caractere que não é hexadecimal; só BOARD_SNIPPET_WINDOW_CHARS caracteres a
+# partir dali são transferidos, nunca o NVARCHAR(MAX) inteiro.
+try:
+    BOARD_SNIPPET_WINDOW_CHARS = max(256, int(os.getenv("BOARD_SNIPPET_WINDOW_CHARS", "4000")))
+except Exception:
+    BOARD_SNIPPET_WINDOW_CHARS = 4000
+
+SQL_TRECHO_APOS_IMAGEM = """
+SELECT AI.NumAtendimento, AI.NumIteracao,
+       CASE WHEN F.Inicio > 0 THEN SUBSTRING(T.Texto, F.Inicio, %(window)d) ELSE N'' END AS Trecho
+FROM AtendimentoIteracao AI WITH (NOLOCK)
+CROSS APPLY (SELECT CONVERT(NVARCHAR(MAX), AI.TextoIteracao) AS Texto) T
+CROSS APPLY (SELECT DATALENGTH(T.Texto) / 2 AS Tam, CHARINDEX(N'tcip\\', REVERSE(T.Texto)) AS Rev) R
+CROSS APPLY (SELECT CASE WHEN R.Rev > 0 THEN R.Tam - R.Rev - 3 ELSE 1 END AS Pict) P
+CROSS APPLY (
+    SELECT PATINDEX(N'%%' + REPLICATE(N'[0-9a-fA-F]', 32) + N'%%', SUBSTRING(T.Texto, P.Pict, R.Tam)) AS Rel
+) H
+CROSS APPLY (
+    SELECT CASE WHEN H.Rel > 0 THEN P.Pict + H.Rel - 1 ELSE 0 END AS HexIni
+) X
+CROSS APPLY (
+    SELECT CASE
+        WHEN X.HexIni = 0 THEN 0
+        ELSE X.HexIni - 1 + PATINDEX(
+            N'%%[^0-9a-fA-F' + NCHAR(13) + NCHAR(10) + N']%%', SUBSTRING(T.Texto, X.HexIni, R.Tam)
+        )
+    END AS Fim
+) E
+CROSS APPLY (
+    -- sem hexadecimal, ou hexadecimal até o fim (PATINDEX = 0): não há texto depois da imagem
+    SELECT CASE WHEN X.HexIni > 0 AND E.Fim < X.HexIni THEN 0 ELSE E.Fim END AS Inicio
+) F
+WHERE AI.Desdobramento = 0 AND (%(where)s)
+"""
+
+
+def fetch_iteration_snippet_texts(pairs):
+    """Janela do RTF após a última imagem de cada iteração, pronta para rtf_snippet.
+
+    Recebe pares (NumAtendimento, NumIteracao); retorna
+    (NumAtendimento, NumIteracao) -> RTF (ver rtf_fragment).
+    """
+    unique = list(dict.fromkeys((n, i) for n, i in (pairs or []) if n is not None and i is not None))
+    if not unique:
+        return {}
+    result = {}
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        for start in range(0, len(unique), ITERATION_TEXTS_BATCH):
+            chunk = unique[start:start + ITERATION_TEXTS_BATCH]
+            where = " OR ".join("(AI.NumAtendimento = ? AND AI.NumIteracao = ?)" for _ in chunk)
+            sql = SQL_TRECHO_APOS_IMAGEM % {"window": BOARD_SNIPPET_WINDOW_CHARS, "where": where}
+            cur.execute(sql, tuple(v for pair in chunk for v in pair))
+            for num, it, trecho in cur.fetchall():
+                result[(num, it)] = rtf_fragment(trecho)
+        return result
+    finally:
+        try:
+            cur.close()
+            conn.close()
+        except Exception:
+            pass
+
+
 def fetch_latest_iteration(num_atendimento):
     """Retorna a última iteração (uma linha) com NomeUsuario e Data/Hora/Texto, ou None."""
     conn = get_db_connection()
@@ -467,9 +840,9 @@ def fetch_rdms(num_atendimento):
             try:
                 # Limpa e sanitiza descrição (pode vir em RTF)
                 raw = r.get("Descricao") or ""
-                r["Descricao"] = sanitize_text(limpar_rtf(raw))
-                # remover ruídos e marcações repetidas deixadas pela conversão RTF
-                r["Descricao"] = normalize_description(r["Descricao"])
+                # limpar RTF e remover ruídos e marcações repetidas deixadas pela
+                # conversão (memoizado: a mesma descrição aparece a cada abertura)
+                r["Descricao"] = _text_cache.get_or_compute("rdm_descricao", raw, _clean_rdm_description)
             except Exception:
                 r["Descricao"] = sanitize_text(r.get("Descricao") or "")
             # sanitizar Desdobramento (preservar 0 em vez de transformá-lo em string vazia)
@@ -568,112 +941,78 @@ except Exception:
 def _image_cache_key(content) -> str:
     """Retorna a chave (sha256 hex) para o conteúdo fornecido.
 
-    Aceita bytes/str/None.
+    Aceita bytes/str/None. Mesmo esquema usado pelo cache de textos (text_cache.content_key).
     """
-    if content is None:
-        return None
+    return content_key(content)
+
+
+def get_image_flag_for_content(content) -> "bool|None":
+    """Retorna True/False se o cache indicar presença de imagem, ou None se não houver cache."""
     try:
-        if isinstance(content, (bytes, bytearray)):
-            b = bytes(content)
-        else:
-            b = str(content).encode("utf-8", errors="ignore")
-        return hashlib.sha256(b).hexdigest()
+        return _cache_index.get_flag(_image_cache_key(content))
     except Exception:
         return None
 
 
-def _image_flag_path_for_key(key: str) -> str:
-    return os.path.join(CACHE_DIR, f"{key}.hasimg") if key else None
-
+def get_image_flags_for_contents(contents) -> list:
+    """Versão em lote de get_image_flag_for_content (uma consulta ao índice).
 
-def get_image_flag_for_content(content) -> "bool|None":
-    """Retorna True/False se o cache indicar presença de imagem, ou None se não houver cache."""
+    Retorna uma lista alinhada a `contents` com True/False/None.
+    """
+    keys = [_image_cache_key(c) if c else None for c in contents]
     try:
-        key = _image_cache_key(content)
-        if not key:
-            return None
-        p = _image_flag_path_for_key(key)
-        if p and os.path.exists(p):
-            try:
-                with open(p, "r", encoding="utf-8") as f:
-                    v = f.read(1)
-                return v == "1"
-            except Exception:
-                return None
-        return None
+        found = _cache_index.get_flags(k for k in keys if k)
     except Exception:
-        return None
+        found = {}
+    return [found.get(k) if k else None for k in keys]
 
 
 def set_image_flag_for_content(content, exists: bool):
-    """Grava arquivo de flag indicando se o conteúdo contém uma imagem.
+    """Grava no índice do cache se o conteúdo contém uma imagem.
 
-    O arquivo é limpo pelo `clean_cache()` baseado em mtime.
+    Os flags são removidos pelo `clean_cache()` após CACHE_TTL_DAYS.
     """
     try:
-        key = _image_cache_key(content)
-        if not key:
-            return
-        p = _image_flag_path_for_key(key)
-        if not p:
-            return
-        with open(p, "w", encoding="utf-8") as f:
-            f.write("1" if exists else "0")
+        _cache_index.set_flag(_image_cache_key(content), exists)
     except Exception:
         pass
 
 
 def clean_cache():
-    """Remove arquivos do cache mais antigos que CACHE_TTL_DAYS (baseado em mtime)."""
+    """Aplica a expiração (CACHE_TTL_DAYS) e os limites de tamanho ao cache de imagens.
+
+    Imagens temporárias expiram pelo último acesso registrado no índice; flags
+    pela data de gravação. Depois da expiração, `enforce_cache_limits()` remove
+    as imagens menos recentemente acessadas se o cache ainda exceder
+    CACHE_MAX_MB/CACHE_MAX_ENTRIES. O custo é proporcional ao que é removido
+    (não há varredura do diretório). Retorna a quantidade de itens removidos.
+    """
     try:
-        now = time.time()
-        ttl_seconds = CACHE_TTL_DAYS * 24 * 3600
+        cutoff = time.time() - CACHE_TTL_DAYS * 24 * 3600
         removed = 0
 
-        # percorrer arquivos no diretório de cache (inclui subdiretórios)
-        for root_dir, dirs, files in os.walk(CACHE_DIR):
-            # preservar o subdiretório TEMP_IMAGE_SUBDIR (ex: tmp/) — iremos limpar seus arquivos, mas não o próprio diretório
-            for fname in files:
-                try:
-                    full = os.path.join(root_dir, fname)
-                    # checar mtime
-                    mtime = os.path.getmtime(full)
-                    if (now - mtime) > ttl_seconds:
-                        try:
-                            os.remove(full)
-                            removed += 1
-                        except Exception:
-                            pass
-                except Exception:
-                    continue
+        for key, ext in _cache_index.temp_images_not_accessed_since(cutoff):
+            try:
+                _forget_temp_image(key, ext)
+            except Exception:
+                continue
+            _cache_index.delete_temp_image(key)
+            removed += 1
 
-        if removed:
-            # debug print removed
-            pass
+        removed += _cache_index.delete_flags_older_than(cutoff)
+        # vínculos RTF -> imagem expirados; imagens sem nenhuma referência saem junto
+        for key, ext, _size in _cache_index.release_links_older_than(cutoff):
+            try:
+                _forget_temp_image(key, ext)
+                removed += 1
+            except Exception:
+                pass
+        removed += enforce_cache_limits()
         return removed
     except Exception as e:
         # debug print removed
         return 0
 
-    # após remoção de arquivos, tentar remover subdiretórios vazios (ex: tmp/)
-    try:
-        for name in os.listdir(CACHE_DIR):
-            full = os.path.join(CACHE_DIR, name)
-            try:
-                # preservar o diretório TEMP_IMAGE_SUBDIR (p.ex. tmp/) mesmo que esteja vazio;
-                # apenas limpar seu conteúdo — não removemos esse diretório
-                if os.path.isdir(full) and name != TEMP_IMAGE_SUBDIR:
-                    # listar conteúdo; se vazio, remover diretório
-                    if not os.listdir(full):
-                        try:
-                            os.rmdir(full)
-                        except Exception:
-                            pass
-            except Exception:
-                continue
-    except Exception:
-        pass
-
 
 def start_periodic_cache_clean(interval_hours=None):
     """Start a daemon thread that calls clean_cache() every interval_hours.
@@ -767,6 +1106,18 @@ def start_app(host: str = "0.0.0.0", port: int = 8080):
 
     # rota /static removida (não servimos arquivos estáticos locais)
 
+    # migrar flags legados (<sha256>.hasimg) e imagens temporárias ainda não
+    # indexadas para o índice do cache
+    for flag_dir in {os.path.abspath(CACHE_DIR), os.path.abspath(IMAGE_CACHE_DIR)}:
+        try:
+            _cache_index.import_flag_files(flag_dir)
+        except Exception:
+            pass
+    try:
+        _cache_index.import_temp_images(IMAGE_CACHE_DIR / TEMP_IMAGE_SUBDIR)
+    except Exception:
+        pass
+
     # registrar handler de shutdown para limpar o cache automaticamente
     try:
         def _on_shutdown():
@@ -775,6 +1126,18 @@ def start_app(host: str = "0.0.0.0", port: int = 8080):
             except Exception as e:
                 # debug print removed
                 pass
+            try:
+                db_async.shutdown()
+            except Exception:
+                pass
+            try:
+                _image_jobs.shutdown()
+            except Exception:
+                pass
+            try:
+                _board_poller.stop()
+            except Exception:
+                pass
 
         # FastAPI/Starlette suporta add_event_handler para 'shutdown'
         try:
@@ -810,28 +1173,15 @@ def start_app(host: str = "0.0.0.0", port: int = 8080):
 
                 cards = fetch_implantacoes_finalizadas() or []
 
-                # helper para converter valores possivelmente datetime/str em date
-                def _to_dt(v):
-                    if v is None:
-                        return None
-                    if isinstance(v, datetime):
-                        return v
-                    s = str(v)
-                    for fmt in ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y"):
-                        try:
-                            return datetime.strptime(s, fmt)
-                        except Exception:
-                            continue
-                    return None
-
-                # coletar anos disponíveis (baseado em Abertura)
+                # coletar anos disponíveis (baseado em Abertura); datas convertidas em lote
                 years = set()
                 processed = []
-                for c in cards:
-                    abertura = _to_dt(c.get("Abertura"))
+                aberturas = parse_datetimes([c.get("Abertura") for c in cards])
+                ultimas = parse_datetimes([c.get("UltimaIteracao") for c in cards])
+                for c, abertura, ultima in zip(cards, aberturas, ultimas):
                     if abertura:
                         years.add(abertura.year)
-                    processed.append((c, abertura))
+                    processed.append((c, abertura, ultima))
 
                 years_list = sorted(years)
 
@@ -840,11 +1190,10 @@ def start_app(host: str = "0.0.0.0", port: int = 8080):
                     processed = [t for t in processed if t[1] and t[1].year == year_filter]
 
                 rows = []
-                for c, abertura in processed:
+                for c, abertura, ultima in processed:
                     num = c.get('NumAtendimento')
                     nome = sanitize_text(c.get('NomeCliente') or '-')
                     analista = sanitize_text(c.get('NomeUsuario') or '-')
-                    ultima = _to_dt(c.get('UltimaIteracao'))
                     abertura_str = abertura.strftime('%Y-%m-%d') if abertura else '-'
                     ultima_str = ultima.strftime('%Y-%m-%d %H:%M:%S') if ultima else '-'
                     periodo = ''
@@ -907,6 +1256,18 @@ def start_app(host: str = "0.0.0.0", port: int = 8080):
     except Exception:
         pass
 
+    # aquecer os caches (board, snippets, flags e imagens) em segundo plano
+    try:
+        start_startup_warmup()
+    except Exception:
+        pass
+
+    # detecção de mudanças no board compartilhada pelas sessões
+    try:
+        start_board_poller()
+    except Exception:
+        pass
+
     # Nota: não iniciamos limpeza periódica de cache em memória.
 
     # ambiente de teste: se TEST_NUM_ATENDIMENTO estiver definida, tentar
@@ -985,12 +1346,12 @@ def show_login():
                     password = ui.input("Senha", password=True).classes("w-full")
                     message = ui.label("").classes("text-sm text-red-600")
 
-                    def do_login():
-                        user = verify_user(username.value, password.value)
+                    async def do_login():
+                        user = await run_db(verify_user, username.value, password.value)
                         if user:
                             logged_user.update(user)
                             ui.notify(f"Bem-vindo, {user['NomeUsuario']}!")
-                            show_kanban()
+                            await show_kanban()
                         else:
                             message.set_text("Usuário ou senha inválidos")
 
@@ -1000,11 +1361,258 @@ def show_login():
     # footer já criado no nível do módulo
 
 
-def show_kanban():
-    global root
-    try:
-        if root is None:
-            raise RuntimeError("root not initialized")
+# tamanho em memória das CardView da última carga do board (get_kanban_cache_stats)
+_card_views_footprint = {}
+
+
+# (NumAtendimento, NumIteracao) -> trecho das iterações que começam com imagem
+_iteration_snippets = {}
+
+
+def _fill_board_snippets(cards, full=False):
+    """Calcula o trecho de cada card (Snippet).
+
+    Quando o prefixo não tem texto, busca só a janela após a imagem, uma vez
+    por iteração (_iteration_snippets). Na carga completa (`full`) o cache é
+    reduzido às iterações ainda no board.
+    """
+    global _iteration_snippets
+    try:
+        fill_snippets(cards, card_snippet_cached, fetch_iteration_snippet_texts, _iteration_snippets)
+        if full:
+            current = {(c.get("NumAtendimento"), c.get("NumIteracaoUltima")) for c in cards or []}
+            _iteration_snippets = {k: v for k, v in _iteration_snippets.items() if k in current}
+    except Exception:
+        # sem o texto completo, fica o trecho do prefixo (possivelmente vazio)
+        for c in cards or []:
+            c.setdefault("Snippet", card_snippet_cached(c.get("TextoIteracao") or ""))
+
+
+def _load_board_snapshot():
+    """Busca os cards do board, a última iteração de cada um e as CardView dos cards."""
+    global _card_views_footprint
+    cards = fetch_kanban_cards()
+    _fill_board_snippets(cards, full=True)
+    try:
+        latest = fetch_latest_iterations([c.get("NumAtendimento") for c in cards])
+    except Exception:
+        latest = {}
+    views = build_card_views(cards, sanitize_text)
+    try:
+        _card_views_footprint = card_views_footprint(views)
+    except Exception:
+        pass
+    return cards, latest, views
+
+
+# cache do board compartilhado por todos os usuários do processo (ver board_cache.py)
+try:
+    KANBAN_CACHE_TTL_SECONDS = float(os.getenv("KANBAN_CACHE_TTL_SECONDS", "60"))
+except Exception:
+    KANBAN_CACHE_TTL_SECONDS = 60.0
+try:
+    KANBAN_CACHE_STALE_SECONDS = float(os.getenv("KANBAN_CACHE_STALE_SECONDS", "300"))
+except Exception:
+    KANBAN_CACHE_STALE_SECONDS = 300.0
+
+# modo do botão "Atualizar cards": "delta" (incremental por marca d'água) ou "full"
+KANBAN_REFRESH_MODE = os.getenv("KANBAN_REFRESH_MODE", "delta").strip().lower()
+
+# cards criados por coluna na abertura do board; os demais são criados em
+# páginas deste tamanho conforme a coluna é rolada (0 = todos de uma vez)
+try:
+    KANBAN_COLUMN_PAGE_SIZE = max(0, int(os.getenv("KANBAN_COLUMN_PAGE_SIZE", "20")))
+except Exception:
+    KANBAN_COLUMN_PAGE_SIZE = 20
+# rolagem (fração da coluna) a partir da qual a próxima página é criada
+KANBAN_SCROLL_THRESHOLD = 0.8
+
+_kanban_cache = CachedLoader(
+    _load_board_snapshot, ttl=KANBAN_CACHE_TTL_SECONDS, stale_ttl=KANBAN_CACHE_STALE_SECONDS
+)
+
+
+def fetch_board_data(force: bool = False):
+    """Retorna (cards, últimas iterações, CardView por id) do cache compartilhado do board.
+
+    Executada em thread de DB (ver run_db). Os dicionários dos cards são copiados
+    porque cada sessão anota seus próprios dados (ex.: `_last_move`) nos cards;
+    as CardView são somente leitura e compartilhadas entre as sessões.
+    """
+    cards, latest, views = _kanban_cache.get(force=force)
+    return [dict(c) for c in cards], dict(latest), views
+
+
+def fetch_board_delta(watermark):
+    """Refresh incremental: (linhas alteradas, ids abertos, últimas iterações e CardView das alteradas)."""
+    changed, open_ids = fetch_kanban_delta(watermark)
+    _fill_board_snippets(changed)
+    try:
+        latest = fetch_latest_iterations([c.get("NumAtendimento") for c in changed])
+    except Exception:
+        latest = {}
+    return changed, open_ids, latest, build_card_views(changed, sanitize_text)
+
+
+def get_kanban_cache_stats() -> dict:
+    """Contadores do cache do board (hits, misses, coalesced, ...) e tamanho das CardView."""
+    stats = _kanban_cache.stats()
+    stats["card_views"] = dict(_card_views_footprint)
+    return stats
+
+
+# ---------- atualização ao vivo do board ----------
+# um único poller por processo consulta as mudanças (refresh incremental) e
+# cada sessão aplica o log em memória num timer próprio (ver board_poller.py)
+KANBAN_LIVE_UPDATES = os.getenv("KANBAN_LIVE_UPDATES", "1").strip().lower() not in ("0", "false", "no")
+try:
+    KANBAN_POLL_INTERVAL_SECONDS = max(1.0, float(os.getenv("KANBAN_POLL_INTERVAL_SECONDS", "30")))
+except Exception:
+    KANBAN_POLL_INTERVAL_SECONDS = 30.0
+# intervalo do timer de cada sessão (só lê o log do poller, sem banco)
+KANBAN_LIVE_CLIENT_INTERVAL = 2.0
+
+
+def _poll_board_delta(watermark):
+    changed, open_ids, latest, views = fetch_board_delta(watermark)
+    return changed, open_ids, {"latest": latest, "views": views}
+
+
+def _on_board_change(entry):
+    """Aplica a mudança ao snapshot compartilhado do board (thread do poller).
+
+    Sessões novas já abrem atualizadas sem consultar o banco, e os caches dos
+    cards alterados são aquecidos uma vez por processo.
+    """
+    extra = entry.get("extra") or {}
+    snapshot = _kanban_cache.peek()
+    if snapshot is not None:
+        cards, latest, views = snapshot
+        # copiar: o snapshot atual pode estar sendo lido por outras threads
+        columns = {"board": [dict(c) for c in cards]}
+        apply_board_delta(columns, entry["changed"], entry["open_ids"], "board")
+        new_cards = columns["board"]
+        ids = {card_id(c) for c in new_cards}
+        new_views = {k: v for k, v in views.items() if k in ids}
+        new_views.update({k: v for k, v in (extra.get("views") or {}).items() if k in ids})
+        new_latest = dict(latest)
+        new_latest.update(extra.get("latest") or {})
+        # keep_age: o delta não renova o TTL, a carga completa continua periódica
+        _kanban_cache.prime((new_cards, new_latest, new_views), keep_age=True)
+    schedule_cache_warmup(entry["changed"])
+
+
+_board_poller = BoardPoller(_poll_board_delta, interval=KANBAN_POLL_INTERVAL_SECONDS, on_change=_on_board_change)
+
+
+def start_board_poller():
+    if KANBAN_LIVE_UPDATES:
+        _board_poller.start()
+
+
+def get_board_poller_stats() -> dict:
+    return _board_poller.stats()
+
+
+# ---------- pré-aquecimento dos caches ----------
+CACHE_WARMER_ENABLED = os.getenv("CACHE_WARMER_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+try:
+    CACHE_WARMER_CONCURRENCY = max(1, int(os.getenv("CACHE_WARMER_CONCURRENCY", "2")))
+except Exception:
+    CACHE_WARMER_CONCURRENCY = 2
+try:
+    CACHE_WARMER_BATCH = max(1, int(os.getenv("CACHE_WARMER_BATCH", "50")))
+except Exception:
+    CACHE_WARMER_BATCH = 50
+
+
+def _warm_prepare(card):
+    """Parte barata do aquecimento de um card: snippet e flag de imagem.
+
+    Retorna a tarefa de imagem (quando o card tem imagem) ou None.
+    """
+    texto = card.get("TextoIteracao") or ""
+    card_snippet_cached(texto)
+    has_img = card.get("TemImagem")
+    if has_img is None:
+        has_img = get_image_flag_for_content(texto)
+        if has_img is None:
+            # sonda apenas decide se vale extrair; a flag é gravada por _warm_image
+            has_img = has_embedded_image(texto)
+    if not has_img:
+        return None
+    num, it = card.get("NumAtendimento"), card.get("NumIteracaoUltima")
+    return {
+        "id": f"{num}:{it}" if it is not None else _image_cache_key(texto),
+        "num": num,
+        "it": it,
+        # texto truncado pelo SQL do board: completado em lote por _warm_fetch_texts
+        "rtf": None if card.get("TextoTruncado") else texto,
+    }
+
+
+def _warm_fetch_texts(tasks):
+    missing = [(t["num"], t["it"]) for t in tasks if t["rtf"] is None and t["it"] is not None]
+    texts = fetch_iteration_texts(missing) if missing else {}
+    for t in tasks:
+        if t["rtf"] is None:
+            t["rtf"] = texts.get((t["num"], t["it"]))
+
+
+def _warm_image(task):
+    """Parte pesada: texto limpo completo e imagem gravada (se ainda não estiver)."""
+    rtf = task.get("rtf")
+    if not rtf:
+        return
+    limpar_rtf_cached(rtf)
+    key = _image_cache_key(rtf)
+    if cached_temp_image_url(key) is not None:
+        return
+    img_b, mime = extract_first_image_from_rtf(rtf)
+    set_image_flag_for_content(rtf, bool(img_b and mime))
+    if img_b and mime:
+        save_temp_image_and_get_url(key, img_b, mime)
+
+
+_cache_warmer = CacheWarmer(
+    _warm_prepare,
+    _warm_fetch_texts,
+    _warm_image,
+    concurrency=CACHE_WARMER_CONCURRENCY,
+    batch_size=CACHE_WARMER_BATCH,
+)
+
+
+def schedule_cache_warmup(cards):
+    """Agenda o aquecimento dos caches para os cards (não bloqueia)."""
+    if CACHE_WARMER_ENABLED and cards:
+        _cache_warmer.schedule(cards)
+
+
+def get_cache_warmer_stats() -> dict:
+    return _cache_warmer.stats()
+
+
+def start_startup_warmup():
+    """Carrega o board (cache compartilhado) e aquece os caches logo após o start."""
+    if not CACHE_WARMER_ENABLED:
+        return
+
+    def _worker():
+        try:
+            cards, _latest, _views = fetch_board_data()
+        except Exception:
+            return
+        schedule_cache_warmup(cards)
+
+    threading.Thread(target=_worker, name="cache-warmup-start", daemon=True).start()
+
+
+async def show_kanban():
+    global root
+    try:
+        if root is None:
+            raise RuntimeError("root not initialized")
         root.clear()
     except Exception:
         root = ui.column().classes("w-full p-4")
@@ -1017,9 +1625,42 @@ def show_kanban():
     # construir mapa reverso: situacao_code -> column_name
     situ_to_column = {v['situacao']: k for k, v in COLUMN_MAP.items() if v.get('situacao') is not None}
 
+    # última iteração (analista) por NumAtendimento, carregada em lote junto com os cards
+    latest_by_num = {}
+
+    def _set_latest_iterations(latest):
+        latest_by_num.clear()
+        latest_by_num.update(latest or {})
+
+    # dados de exibição pré-calculados por id do card (kanban_board.CardView)
+    card_views = {}
+
+    def _card_view(card_item):
+        view = card_views.get(card_id(card_item))
+        if view is None:
+            view = card_views[card_id(card_item)] = CardView(card_item, sanitize_text)
+        return view
+
+    # carregar dados fora do event loop, exibindo um indicador enquanto a consulta roda
+    with root:
+        loading = ui.spinner(size="lg")
+    # versão do log do poller antes da carga: mudanças a partir daqui são
+    # reaplicadas (apply_board_delta ignora o que o snapshot já contém)
+    live_state = {"version": _board_poller.version}
+    try:
+        cards_data, latest, views = await run_db(fetch_board_data)
+    finally:
+        try:
+            loading.delete()
+        except Exception:
+            pass
+    _set_latest_iterations(latest)
+    card_views.update(views)
+    _board_poller.seed(board_watermark(cards_data))
+    schedule_cache_warmup(cards_data)
+
     with root:
         # cabeçalho: título + contador de cards (à esquerda) e botão Logout (canto direito)
-        cards_data = fetch_kanban_cards()
         # debug console log removed
         with ui.row().classes("w-full items-start mb-2 justify-between"):
             with ui.column().classes("items-start"):
@@ -1069,49 +1710,71 @@ def show_kanban():
 
                 dlg.open()
 
-            def _do_refresh(_=None):
+            async def _do_refresh_delta(watermark):
+                changed, open_ids, latest, views = await run_db(fetch_board_delta, watermark)
+                latest_by_num.update(latest)
+                card_views.update(views)
+                result = apply_board_delta(column_cards, changed, open_ids, start_col)
+                if not result["columns"]:
+                    ui.notify("Nenhuma alteração detectada nos cards.", color="info")
+                    return
+                render_board(cols_to_update=[name for (name, _, _) in COLUMNS if name in result["columns"]])
+                schedule_cache_warmup([c for lst in column_cards.values() for c in lst])
+                total = sum(len(lst) for lst in column_cards.values())
+                ui.notify(
+                    f"Atualização concluída: {total} cards "
+                    f"(+{len(result['added'])}/~{len(result['updated'])}/-{len(result['removed'])})",
+                    color="positive",
+                )
+
+            async def _do_refresh(_=None):
+                refresh_btn.props("loading")
                 try:
-                    new_cards = fetch_kanban_cards()
-                    # construir mapeamento novo por coluna (por enquanto todas vão para start_col como antes)
-                    new_column_cards = {name: [] for (name, _, _) in COLUMNS}
-                    for r in new_cards:
-                        new_column_cards[start_col].append(r)
-
-                    # calcular diffs por coluna (compare por NumAtendimento)
-                    changed_cols = []
-                    total_added = 0
-                    total_removed = 0
-                    for col_name in new_column_cards.keys():
-                        old_ids = {c.get("NumAtendimento") for c in (column_cards.get(col_name) or [])}
-                        new_ids = {c.get("NumAtendimento") for c in (new_column_cards.get(col_name) or [])}
-                        added = new_ids - old_ids
-                        removed = old_ids - new_ids
-                        if added or removed:
-                            # substituir a lista local e marcar a coluna para atualização
-                            column_cards[col_name] = [c for c in (new_column_cards.get(col_name) or [])]
-                            changed_cols.append(col_name)
-                            total_added += len(added)
-                            total_removed += len(removed)
-
-                    if changed_cols:
-                        # atualizar apenas as colunas que mudaram
-                        render_board(cols_to_update=changed_cols)
-                    else:
-                        # nada mudou, garantir que o UI esteja consistente
+                    watermark = None
+                    if KANBAN_REFRESH_MODE == "delta":
+                        watermark = board_watermark([c for lst in column_cards.values() for c in lst])
+                    if watermark is not None:
+                        await _do_refresh_delta(watermark)
+                        return
+                    new_cards, latest, views = await run_db(fetch_board_data, True)
+                    _set_latest_iterations(latest)
+                    card_views.clear()
+                    card_views.update(views)
+                    # mesmo caminho do refresh incremental: todas as linhas abertas passam
+                    # por apply_board_delta (atualiza no lugar, preservando a coluna) e
+                    # open_ids remove os cards que saíram do board
+                    result = apply_board_delta(
+                        column_cards, new_cards, [c.get("NumAtendimento") for c in new_cards], start_col
+                    )
+                    # colunas com algum card cuja assinatura mudou (ex.: só o analista da
+                    # última iteração); render_board/plan_column recriam apenas esses cards
+                    changed_cols = set(result["columns"])
+                    for col_name, lst in column_cards.items():
+                        # cards fora da janela da coluna ainda não têm elemento/assinatura
+                        if any(
+                            card_signatures.get(cid, sig) != sig
+                            for cid, sig in ((card_id(c), _card_signature(c)) for c in lst)
+                        ):
+                            changed_cols.add(col_name)
+                    if not changed_cols:
                         ui.notify("Nenhuma alteração detectada nos cards.", color="info")
                         return
-
+                    render_board(cols_to_update=[name for (name, _, _) in COLUMNS if name in changed_cols])
+                    schedule_cache_warmup(new_cards)
                     ui.notify(
-                        f"Atualização concluída: {len(new_cards)} cards (+{total_added}/-{total_removed})",
+                        f"Atualização concluída: {len(new_cards)} cards "
+                        f"(+{len(result['added'])}/~{len(result['updated'])}/-{len(result['removed'])})",
                         color="positive",
                     )
                 except Exception as e:
                     ui.notify(f"Erro ao atualizar cards: {e}", color="negative")
+                finally:
+                    refresh_btn.props(remove="loading")
 
-            ui.button("Atualizar cards", on_click=_do_refresh).classes("bg-green-600 text-white").style("background:#10b981 !important;color:#ffffff !important;")
-            def _open_implantacoes_dialog(_=None):
+            refresh_btn = ui.button("Atualizar cards", on_click=_do_refresh).classes("bg-green-600 text-white").style("background:#10b981 !important;color:#ffffff !important;")
+            async def _open_implantacoes_dialog(_=None):
                 try:
-                    cards = fetch_implantacoes_finalizadas() or []
+                    cards = await run_db(fetch_implantacoes_finalizadas) or []
                 except Exception as e:
                     # debug print removed
                     cards = []
@@ -1121,29 +1784,16 @@ def show_kanban():
                     # cabeçalho do diálogo: título, filtro por ano e botão fechar
                     # header será construído após coletar os anos disponíveis para o select
 
-                        # preparar filtro por ano (baseado na data de abertura)
-                        def _to_dt(v):
-                            if v is None:
-                                return None
-                            if isinstance(v, datetime):
-                                return v
-                            s = str(v)
-                            for fmt in ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y"):
-                                try:
-                                    return datetime.strptime(s, fmt)
-                                except Exception:
-                                    continue
-                            return None
-
+                        # preparar filtro por ano; datas convertidas uma vez, em lote
                         years = set()
                         processed = []
-                        for c in cards:
-                            abertura = _to_dt(c.get('Abertura'))
+                        aberturas = parse_datetimes([c.get('Abertura') for c in cards])
+                        ultimas = parse_datetimes([c.get('UltimaIteracao') for c in cards])
+                        for c, abertura, ultima_dt in zip(cards, aberturas, ultimas):
                             # usar o ano da data de conclusão (UltimaIteracao) para o filtro
-                            ultima_dt = _to_dt(c.get('UltimaIteracao'))
                             if ultima_dt:
                                 years.add(ultima_dt.year)
-                            processed.append((c, abertura))
+                            processed.append((c, abertura, ultima_dt))
 
 
                         # ordenar anos em ordem decrescente para mostrar o mais recente primeiro
@@ -1212,8 +1862,7 @@ def show_kanban():
                             # construir lista filtrada (filtrando pelo ano de conclusão),
                             # ordenar por ÚltimaIteracao (desc) e atualizar total
                             to_show = []
-                            for c, abertura in processed:
-                                ultima_dt = _to_dt((c or {}).get('UltimaIteracao'))
+                            for c, abertura, ultima_dt in processed:
                                 if yf and (not ultima_dt or ultima_dt.year != yf):
                                     continue
                                 to_show.append((c, abertura, ultima_dt))
@@ -1311,569 +1960,529 @@ def show_kanban():
     for row in cards_data:
         column_cards[start_col].append(row)
 
-    def render_board(cols_to_update=None):
-        """Renderiza colunas. Se cols_to_update for None, renderiza todas; caso contrário
-        apenas atualiza as colunas listadas (nomes).
-        """
+    # elementos dos cards, por id (kanban_board.card_id): criados uma vez e
+    # depois atualizados/movidos no lugar, em vez de recriar o board inteiro
+    card_elements = {}  # id -> {"card", "select", "move_note"}
+    card_column = {}  # id -> coluna onde o elemento está
+    card_signatures = {}  # id -> kanban_board.card_signature dos dados renderizados
 
-        def _format_datetime(value):
-            if value is None:
-                return "-"
-            if isinstance(value, datetime):
-                return value.strftime("%Y-%m-%d %H:%M:%S")
-            try:
-                s = value.decode(errors="ignore") if isinstance(value, (bytes, bytearray)) else str(value)
-                for fmt in ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y"):
-                    try:
-                        dt = datetime.strptime(s, fmt)
-                        return dt.strftime("%Y-%m-%d %H:%M:%S")
-                    except Exception:
-                        continue
-                return sanitize_text(s)
-            except Exception:
-                return sanitize_text(str(value))
+    # colunas com rolagem própria: só os primeiros `column_limits[col]` cards
+    # (ordenados) têm elemento; o limite cresce uma página por vez ao rolar
+    column_limits = {name: KANBAN_COLUMN_PAGE_SIZE for (name, _, _) in COLUMNS}
+    column_headers = {}
+    column_more_buttons = {}
 
-        def _days_open_for_card(card_item):
-            try:
-                av = card_item.get("Abertura")
-                if av is None:
-                    return -1
-                if isinstance(av, datetime):
-                    dt = av
-                else:
-                    s = av.decode(errors="ignore") if isinstance(av, (bytes, bytearray)) else str(av)
-                    dt = None
-                    for fmt in (
-                        "%Y-%m-%d %H:%M:%S.%f",
-                        "%Y-%m-%d %H:%M:%S",
-                        "%Y-%m-%d",
-                        "%d/%m/%Y %H:%M:%S",
-                        "%d/%m/%Y",
-                    ):
-                        try:
-                            dt = datetime.strptime(s, fmt)
-                            break
-                        except Exception:
-                            continue
-                if not dt:
-                    return -1
-                return (datetime.now() - dt).days
-            except Exception:
-                return -1
+    def _column_total(col_name):
+        return len(column_cards.get(col_name) or [])
 
-        # criar colunas (header + container) na primeira chamada
-        if not column_containers:
-            board.clear()
-            with board:
-                for col_name, bg_color, _ in COLUMNS:
-                    with ui.column().classes("basis-0 flex-1").style("min-width: 12rem;"):
-                        ui.label(col_name).classes("text-md font-semibold p-2 rounded w-full text-center").style(
-                            f"background:{bg_color};color:#ffffff !important;"
-                        )
-                        cards_container = ui.column().classes("p-2")
-                        column_containers[col_name] = cards_container
+    def _show_more(col_name):
+        total = _column_total(col_name)
+        if not KANBAN_COLUMN_PAGE_SIZE or column_limits[col_name] >= total:
+            return
+        column_limits[col_name] = grow_window(column_limits[col_name], total, KANBAN_COLUMN_PAGE_SIZE)
+        render_board(cols_to_update=[col_name])
 
-        cols = [c[0] for c in COLUMNS] if cols_to_update is None else cols_to_update
-        for col_name in cols:
-            cards_container = column_containers.get(col_name)
-            if cards_container is None:
-                continue
+    def _on_column_scroll(col_name, e):
+        try:
+            if e.vertical_percentage >= KANBAN_SCROLL_THRESHOLD:
+                _show_more(col_name)
+        except Exception:
+            pass
+
+    def _format_datetime(value):
+        formatted = format_datetime(value)
+        return formatted if formatted is not None else sanitize_text(value)
+
+    def _card_signature(card_item):
+        latest = latest_by_num.get(card_item.get("NumAtendimento"))
+        # a data do dia entra na assinatura: dias em aberto e cores mudam à meia-noite
+        return card_signature(card_item, (latest or {}).get("NomeUsuario"), datetime.now().date())
+
+    def _style_card(cid, col_name):
+        """Ajusta borda e seletor de um card que mudou de coluna."""
+        widgets = card_elements[cid]
+        widgets["card"].style(f"border-left:4px solid {COLUMN_MAP.get(col_name, {}).get('color', '#ffffff')};")
+        widgets["select"].value = col_name
+
+    def _drop_card(cid):
+        widgets = card_elements.pop(cid, None)
+        card_column.pop(cid, None)
+        card_signatures.pop(cid, None)
+        if widgets:
             try:
-                cards_container.clear()
+                widgets["card"].delete()
             except Exception:
                 pass
 
-            try:
-                # ordenar e renderizar os cards da coluna
-                cards_to_render = sorted(column_cards.get(col_name, []) or [], key=_days_open_for_card, reverse=True)
-            except Exception:
-                cards_to_render = column_cards.get(col_name, []) or []
+    def _build_card(card, col_name, img_flag=None):
+        """Cria o elemento de um card no container atual.
 
-            for card in cards_to_render:
-                num = card.get("NumAtendimento")
-                cliente = sanitize_text(card.get("NomeCliente") or "-")
-                ultima = _format_datetime(card.get("UltimaIteracao"))
-                texto_raw = card.get("TextoIteracao") or ""
-
-                with cards_container:
-                    with ui.card().classes("mb-3 shadow-sm").style(
-                        f"border-left:4px solid {COLUMN_MAP.get(col_name, {}).get('color', '#ffffff')};"
-                    ):
-                        # header: cliente + id
-                        with ui.row().classes("items-center justify-between w-full"):
-                            ui.label(cliente).classes("font-semibold text-lg")
-                            with ui.row().classes("items-center"):
-                                ui.label(f"#{num}").classes("text-sm text-gray-600 ml-2")
-
-                        # Abertura (dias em aberto) e Próximo contato
-                        abertura_val = card.get("Abertura")
-                        dt_abertura = None
-                        try:
-                            if isinstance(abertura_val, datetime):
-                                dt_abertura = abertura_val
-                            else:
-                                s = (
-                                    abertura_val.decode(errors="ignore")
-                                    if isinstance(abertura_val, (bytes, bytearray))
-                                    else str(abertura_val)
-                                )
-                                for fmt in (
-                                    "%Y-%m-%d %H:%M:%S.%f",
-                                    "%Y-%m-%d %H:%M:%S",
-                                    "%Y-%m-%d",
-                                    "%d/%m/%Y %H:%M:%S",
-                                    "%d/%m/%Y",
-                                ):
-                                    try:
-                                        dt_abertura = datetime.strptime(s, fmt)
-                                        break
-                                    except Exception:
-                                        continue
-                        except Exception:
-                            dt_abertura = None
+        `img_flag` é a flag "tem imagem" já consultada no índice (None = sondar o RTF).
+        Retorna os widgets que o board atualiza no lugar (card, select, move_note).
+        """
+        view = _card_view(card)
+        num = view.num
+        texto_raw = card.get("TextoIteracao") or ""
+
+        with ui.card().classes("mb-3 shadow-sm").style(
+            f"border-left:4px solid {COLUMN_MAP.get(col_name, {}).get('color', '#ffffff')};"
+        ) as card_el:
+            # header: cliente + id
+            with ui.row().classes("items-center justify-between w-full"):
+                ui.label(view.cliente).classes("font-semibold text-lg")
+                with ui.row().classes("items-center"):
+                    ui.label(f"#{num}").classes("text-sm text-gray-600 ml-2")
+
+            # Abertura (dias em aberto) e Próximo contato
+            now = datetime.now()
+            days_open = view.days_open(now)
+            if days_open is not None:
+                lbl = ui.label(f"Aberto há {days_open} dias").classes(
+                    f"text-sm font-bold {view.days_class(now)} ml-0"
+                )
+                try:
+                    ui.tooltip(lbl, f"Data de abertura: {view.abertura.strftime('%d/%m/%Y')}")
+                except Exception:
+                    pass
 
-                        days_open = None
+            ui.label(f"Próximo contato: {view.prox_label}").classes(f"text-sm {view.prox_class(now)} mt-1 mb-1")
+
+            # última interação e snippet
+            snippet = card.get("Snippet")
+            if snippet is None:
+                snippet = card_snippet_cached(texto_raw)
+            snippet = sanitize_text(snippet)
+            ui.label(f"Última interação: {view.ultima_label}").classes("text-xs text-gray-500 mb-1")
+            if snippet:
+                ui.label(snippet).classes("text-sm text-gray-700 mb-2")
+
+            # mostrar observação de movimento (informativo em memória) se existir;
+            # o label é sempre criado para ser atualizado no lugar ao mover o card
+            move_note = card.get('_last_move')
+            move_note_lbl = ui.label(move_note or "").classes('text-sm text-gray-600 mb-1').style('font-style:italic;')
+            move_note_lbl.set_visibility(bool(move_note))
+
+            with ui.row().classes("items-center gap-2"):
+                latest = latest_by_num.get(num)
+                analyst = sanitize_text((latest.get("NomeUsuario") if latest else None) or "-")
+                ui.label(f"Analista: {analyst}").classes("text-sm text-gray-600")
+                ui.button("Histórico", on_click=lambda _, n=num: show_history_dialog(n)).classes("primary")
+
+                # RDMs dialog
+                async def _show_rdms_local(_, n=num):
+                    dlg = ui.dialog()
+                    dlg.classes("w-full max-w-6xl")
+                    with dlg:
+                        loading = ui.spinner(size="lg")
+                    dlg.open()
+                    try:
+                        rdms = await run_db(fetch_rdms, n)
+                    except Exception as e:
+                        dlg.close()
+                        ui.notify(f"Erro ao carregar RDMs: {e}", color="negative")
+                        return
+                    finally:
+                        loading.delete()
+                    with dlg:
+                        if not rdms:
+                            ui.label("Nenhuma RDM encontrada").classes("text-sm text-gray-500")
+                        else:
+                            # organizar por SituaçãoRDM e dentro por NomeTipoRDM com totalizadores
+                            from collections import defaultdict
+
+                            situ_map = defaultdict(list)
+                            for r in rdms:
+                                key = r.get("SituacaoRDM")
+                                situ_map[key].append(r)
+
+                            with ui.row().classes("w-full justify-center"):
+                                with ui.column().classes("w-full max-w-4xl").style(
+                                    "overflow:auto; height:calc(100vh - 160px); padding-right:8px;"
+                                ):
+                                    # para cada situação mostrar total e depois total por tipo
+                                    for situ_key in sorted(situ_map.keys(), key=lambda x: str(x)):
+                                        group = situ_map[situ_key]
+                                        situ_label = sanitize_text(str(situ_key) if situ_key is not None else "")
+                                        total_sit = len(group)
+                                        ui.label(f"{situ_label}: {total_sit}").classes('text-sm font-semibold mt-2 mb-1')
+
+                                        # agrupar por tipo de RDM
+                                        type_map = defaultdict(list)
+                                        for r in group:
+                                            t = r.get("NomeTipoRDM") or ""
+                                            type_map[t].append(r)
+
+                                        for tname in sorted(type_map.keys()):
+                                            entries = type_map[tname]
+                                            cnt = len(entries)
+                                            t_display = sanitize_text(str(tname)) if tname is not None else ""
+                                            # mostrar total por tipo (badge-like)
+                                            ui.label(f"{t_display}: {cnt}").style('background:#6b7280;color:#ffffff;padding:4px 8px;border-radius:6px;').classes('text-sm font-medium ml-0 mt-0')
+
+                                            # listar cada RDM do tipo
+                                            for r in entries:
+                                                numrdm = sanitize_text(r.get("IdRdm") or "")
+                                                desdob_raw = r.get("Desdobramento")
+                                                desdob = sanitize_text(str(desdob_raw) if desdob_raw is not None else "")
+                                                tipordm = sanitize_text(r.get("NomeTipoRDM") or "")
+                                                situ = sanitize_text(r.get("SituacaoRDM") or "")
+                                                reg = r.get("RegInclusao")
+                                                data_str = _format_datetime(reg)
+                                                desc = sanitize_text(r.get("Descricao") or "")
+                                                md = (
+                                                    f"**Nº:** {numrdm} / {desdob}\n\n"
+                                                    f"**Tipo de RDM:** {tipordm}\n\n"
+                                                    f"**Situação:** {situ}\n\n"
+                                                    f"**Abertura:** {data_str}\n\n"
+                                                    f"**Descrição:** {desc}"
+                                                )
+                                                with ui.card().classes("mb-2 p-3 w-full"):
+                                                    ui.markdown(md)
+                        with ui.row().classes("w-full mt-4 justify-center"):
+                            ui.button("Fechar [ESC]", on_click=lambda _=None: dlg.close()).classes("primary")
+
+                ui.button("RDMs", on_click=_show_rdms_local).classes("secondary")
+
+                # imagem: verificar se existe imagem antes de habilitar o botão
+                async def _open_image_dialog_local(_, c=card):
+                    # o board traz apenas um prefixo do RTF; buscar o texto
+                    # completo somente quando o usuário pede a imagem
+                    rtf = c.get("TextoIteracao") or ""
+                    if c.get("TextoTruncado") and c.get("NumIteracaoUltima") is not None:
                         try:
-                            if dt_abertura:
-                                days_open = (datetime.now() - dt_abertura).days
+                            full = await run_db(
+                                fetch_iteration_text, c.get("NumAtendimento"), c.get("NumIteracaoUltima")
+                            )
+                            if full:
+                                rtf = full
                         except Exception:
-                            days_open = None
+                            pass
+                    await open_rtf_image_dialog(rtf)
 
-                        if days_open is not None:
-                            try:
-                                color_class = "text-blue-600" if int(days_open) <= 120 else "text-red-600"
-                            except Exception:
-                                color_class = "text-red-600"
-                            lbl = ui.label(f"Aberto há {days_open} dias").classes(
-                                f"text-sm font-bold {color_class} ml-0"
-                            )
-                            try:
-                                if dt_abertura:
-                                    ui.tooltip(lbl, f"Data de abertura: {dt_abertura.strftime('%d/%m/%Y')}")
-                            except Exception:
-                                pass
+                # detectar rapidamente se há imagem extraível para habilitar o botão
+                img_available = False
+                try:
+                    # indicador calculado no servidor (SQL_ATENDIMENTOS_IMPLANTACAO)
+                    server_flag = card.get("TemImagem")
+                    cached = bool(server_flag) if server_flag is not None else None
+                    if cached is None:
+                        cached = img_flag
+                    if cached is None:
+                        # sonda barata, só para exibir o botão; a flag é gravada
+                        # após a extração real (open_rtf_image_dialog)
+                        img_available = has_embedded_image(texto_raw)
+                    else:
+                        img_available = bool(cached)
+                except Exception as e:
+                    img_available = False
+
+                # mostrar apenas o botão "Imagem" quando de fato há uma imagem extraível
+                if img_available:
+                    ui.button("Imagem", on_click=_open_image_dialog_local).classes("secondary")
 
-                        # Próximo contato
-                        prox_val = card.get("DataProxContato")
-                        dt_prox = None
+                # botão Atendimentos: abre diálogo com totalização e lista agrupada
+                async def _show_atendimentos_local(_=None, c=card):
+                    try:
+                        # tentar obter o código do cliente a partir do card
+                        cod_cliente = (
+                            c.get('CodCliente')
+                            or c.get('CodigoCliente')
+                            or c.get('CodCli')
+                            or c.get('CodClienteCliente')
+                        )
+                    except Exception:
+                        cod_cliente = None
+
+                    if not cod_cliente:
+                        ui.notify('Código do cliente não disponível para este card', color='warning')
+                        return
+
+                    dlg = ui.dialog()
+                    dlg.classes('w-full')
+                    with dlg:
+                        loading = ui.spinner(size="lg")
+                    dlg.open()
+                    try:
+                        rows = await run_db(fetch_atendimentos_por_cliente, cod_cliente) or []
+                    except Exception as e:
+                        dlg.close()
+                        ui.notify(f"Erro ao carregar atendimentos: {e}", color="negative")
+                        return
+                    finally:
+                        loading.delete()
+                    total = len(rows)
+
+                    # agrupar por situacao e por NomeTipoAtendimento
+                    from collections import defaultdict
+
+                    situ_groups = defaultdict(list)
+                    for r in rows:
                         try:
-                            if isinstance(prox_val, datetime):
-                                dt_prox = prox_val
-                            else:
-                                s = (
-                                    prox_val.decode(errors="ignore")
-                                    if isinstance(prox_val, (bytes, bytearray))
-                                    else str(prox_val)
-                                )
-                                for fmt in (
-                                    "%Y-%m-%d %H:%M:%S.%f",
-                                    "%Y-%m-%d %H:%M:%S",
-                                    "%Y-%m-%d",
-                                    "%d/%m/%Y %H:%M:%S",
-                                    "%d/%m/%Y",
-                                ):
-                                    try:
-                                        dt_prox = datetime.strptime(s, fmt)
-                                        break
-                                    except Exception:
-                                        continue
+                            s = r.get('Situacao')
+                            s_val = int(s) if s is not None else None
                         except Exception:
-                            dt_prox = None
-
-                        if dt_prox:
                             try:
-                                prox_date_str = dt_prox.strftime("%d/%m/%Y")
+                                s_val = int(str(r.get('Situacao')))
                             except Exception:
-                                prox_date_str = sanitize_text(str(prox_val))
-                        else:
-                            prox_date_str = "-"
+                                s_val = None
+                        situ_groups[s_val].append(r)
+
+                    # centralizar um único card branco com largura máxima
+                    with dlg:
+                        with ui.row().classes('w-full justify-center'):
+                            with ui.column().classes('w-full max-w-3xl'):
+                                # card branco com espaçamento interno
+                                with ui.card().classes('p-3').style('background:#ffffff;color:#000000;line-height:1.1;'):
+                                    # título removido para layout compacto
+                                    ui.label(f"Total de atendimentos: {total}").style('background:#7f1d1d;color:#ffffff;padding:4px;border-radius:6px;').classes('text-sm font-semibold mb-0')
+
+                                    # resumo por situação (cada item em sua linha)
+                                    aberto_count = len(situ_groups.get(0, []))
+                                    concluido_count = len(situ_groups.get(1, []))
+                                    ui.label(f"Em aberto: {aberto_count}").classes('text-sm mb-0')
+                                    ui.label(f"Concluídos: {concluido_count}").classes('text-sm mb-0')
+
+                                    # listar detalhes por grupo (0 = aberto, 1 = concluído)
+                                    for situ_code, situ_label in ((0, 'Em aberto'), (1, 'Concluídos')):
+                                        group = situ_groups.get(situ_code, [])
+                                        ui.label(f"{situ_label}: {len(group)}").classes('text-sm font-semibold mt-1 mb-0')
+                                        if not group:
+                                            continue
 
-                        prox_color = "text-gray-500"
-                        try:
-                            if dt_prox:
-                                today = datetime.now().date()
-                                pd = dt_prox.date()
-                                if pd < today:
-                                    prox_color = "text-red-600"
-                                elif pd == today:
-                                    prox_color = "text-black"
-                                else:
-                                    prox_color = "text-blue-600"
-                        except Exception:
-                            prox_color = "text-gray-500"
-
-                        ui.label(f"Próximo contato: {prox_date_str}").classes(f"text-sm {prox_color} mt-1 mb-1")
-
-                        # última interação e snippet
-                        texto = limpar_rtf(texto_raw)
-                        snippet = (texto[:250] + "...") if len(texto) > 250 else texto
-                        snippet = sanitize_text(snippet)
-                        ui.label(f"Última interação: {ultima}").classes("text-xs text-gray-500 mb-1")
-                        if snippet:
-                            ui.label(snippet).classes("text-sm text-gray-700 mb-2")
-
-                        # mostrar observação de movimento (informativo em memória) se existir
-                        move_note = card.get('_last_move')
-                        if move_note:
-                            ui.label(move_note).classes('text-sm text-gray-600 mb-1').style('font-style:italic;')
-
-                        with ui.row().classes("items-center gap-2"):
-                            latest = fetch_latest_iteration(num)
-                            analyst = sanitize_text((latest.get("NomeUsuario") if latest else None) or "-")
-                            ui.label(f"Analista: {analyst}").classes("text-sm text-gray-600")
-                            ui.button("Histórico", on_click=lambda _, n=num: show_history_dialog(n)).classes("primary")
-
-                            # RDMs dialog
-                            def _show_rdms_local(_, n=num):
-                                rdms = fetch_rdms(n)
-                                dlg = ui.dialog()
-                                dlg.classes("w-full max-w-6xl")
-                                with dlg:
-                                    if not rdms:
-                                        ui.label("Nenhuma RDM encontrada").classes("text-sm text-gray-500")
-                                    else:
-                                        # organizar por SituaçãoRDM e dentro por NomeTipoRDM com totalizadores
-                                        from collections import defaultdict
-
-                                        situ_map = defaultdict(list)
-                                        for r in rdms:
-                                            key = r.get("SituacaoRDM")
-                                            situ_map[key].append(r)
-
-                                        with ui.row().classes("w-full justify-center"):
-                                            with ui.column().classes("w-full max-w-4xl").style(
-                                                "overflow:auto; height:calc(100vh - 160px); padding-right:8px;"
-                                            ):
-                                                # para cada situação mostrar total e depois total por tipo
-                                                for situ_key in sorted(situ_map.keys(), key=lambda x: str(x)):
-                                                    group = situ_map[situ_key]
-                                                    situ_label = sanitize_text(str(situ_key) if situ_key is not None else "")
-                                                    total_sit = len(group)
-                                                    ui.label(f"{situ_label}: {total_sit}").classes('text-sm font-semibold mt-2 mb-1')
-
-                                                    # agrupar por tipo de RDM
-                                                    type_map = defaultdict(list)
-                                                    for r in group:
-                                                        t = r.get("NomeTipoRDM") or ""
-                                                        type_map[t].append(r)
-
-                                                    for tname in sorted(type_map.keys()):
-                                                        entries = type_map[tname]
-                                                        cnt = len(entries)
-                                                        t_display = sanitize_text(str(tname)) if tname is not None else ""
-                                                        # mostrar total por tipo (badge-like)
-                                                        ui.label(f"{t_display}: {cnt}").style('background:#6b7280;color:#ffffff;padding:4px 8px;border-radius:6px;').classes('text-sm font-medium ml-0 mt-0')
-
-                                                        # listar cada RDM do tipo
-                                                        for r in entries:
-                                                            numrdm = sanitize_text(r.get("IdRdm") or "")
-                                                            desdob_raw = r.get("Desdobramento")
-                                                            desdob = sanitize_text(str(desdob_raw) if desdob_raw is not None else "")
-                                                            tipordm = sanitize_text(r.get("NomeTipoRDM") or "")
-                                                            situ = sanitize_text(r.get("SituacaoRDM") or "")
-                                                            reg = r.get("RegInclusao")
-                                                            data_str = _format_datetime(reg)
-                                                            desc = sanitize_text(r.get("Descricao") or "")
-                                                            md = (
-                                                                f"**Nº:** {numrdm} / {desdob}\n\n"
-                                                                f"**Tipo de RDM:** {tipordm}\n\n"
-                                                                f"**Situação:** {situ}\n\n"
-                                                                f"**Abertura:** {data_str}\n\n"
-                                                                f"**Descrição:** {desc}"
-                                                            )
-                                                            with ui.card().classes("mb-2 p-3 w-full"):
-                                                                ui.markdown(md)
-                                    with ui.row().classes("w-full mt-4 justify-center"):
-                                        ui.button("Fechar [ESC]", on_click=lambda _=None: dlg.close()).classes("primary")
-                                dlg.open()
-
-                            ui.button("RDMs", on_click=_show_rdms_local).classes("secondary")
-
-                            # imagem: verificar se existe imagem antes de habilitar o botão
-                            def _open_image_dialog_local(_, rtf=texto_raw):
-                                img_bytes, mime = extract_first_image_from_rtf(rtf)
-                                dlg = ui.dialog()
-                                with dlg:
-                                    if img_bytes and mime:
-                                        b64 = base64.b64encode(img_bytes).decode()
-                                        ui.image(f"data:{mime};base64,{b64}").style(IMG_STYLE)
-                                    else:
-                                        ui.label("[Imagem] — não foi possível extrair a imagem").classes(
-                                            "text-sm text-gray-600"
-                                        )
-                                    with ui.row().classes("w-full justify-end gap-2"):
-                                        ui.button("Fechar [ESC]", on_click=lambda _=None: dlg.close()).classes("secondary")
-                                dlg.open()
-
-                            # detectar rapidamente se há imagem extraível para habilitar o botão
-                            img_available = False
+                                        # agrupar por NomeTipoAtendimento
+                                        type_map = defaultdict(list)
+                                        for r in group:
+                                            t = r.get('NomeTipoAtendimento') or ''
+                                            type_map[t].append(r)
+
+                                        for tname in sorted(type_map.keys()):
+                                            entries = type_map[tname]
+                                            count = len(entries)
+                                            t_display = sanitize_text(str(tname)) if tname is not None else ''
+                                            ui.label(f"{t_display}: {count}").style('background:#6b7280;color:#ffffff;padding:4px 8px;border-radius:6px;').classes('text-sm font-semibold ml-0 mt-0')
+                                            for r in entries:
+                                                numa = sanitize_text(str(r.get('NumAtendimento') or ''))
+                                                desd_raw = r.get('Desdobramento')
+                                                desd = sanitize_text(str(desd_raw) if desd_raw is not None else '')
+                                                assunto = sanitize_text(str(r.get('AssuntoAtendimento') or ''))
+                                                # cada atendimento em linha própria
+                                                ui.label(f"{numa}/{desd} — {assunto}").classes('text-sm ml-2 mb-0')
+
+                                    # botão fechar centralizado abaixo (menos espaço)
+                                    with ui.row().classes('w-full justify-center mt-2'):
+                                        ui.button('Fechar [ESC]', on_click=lambda _=None: dlg.close()).classes('primary')
+
+                ui.button('Atendimentos', on_click=_show_atendimentos_local).classes('secondary')
+
+                # mover
+                options = [name for (name, _, _) in COLUMNS]
+                sel = ui.select(options, value=col_name).classes("w-full")
+
+                def do_move(_, c=card, select_widget=sel):
+                    dest = select_widget.value
+                    if dest == card_column.get(card_id(c)):
+                        ui.notify("O card já está nessa coluna", color="warning")
+                        return
+
+                    # localizar o card atual em qualquer coluna (mais robusto)
+                    found_col = None
+                    moved = None
+                    for col_k, lst in column_cards.items():
+                        for it in lst:
                             try:
-                                cached = get_image_flag_for_content(texto_raw)
-                                key = _image_cache_key(texto_raw)
-                                if cached is None:
-                                    try_img, try_mime = extract_first_image_from_rtf(texto_raw)
-                                    img_available = bool(try_img and try_mime)
-                                    # debug prints removed
-                                    # gravar no cache booleano
-                                    set_image_flag_for_content(texto_raw, img_available)
-                                else:
-                                    img_available = bool(cached)
-                            except Exception as e:
-                                img_available = False
+                                if str(it.get("NumAtendimento")) == str(c.get("NumAtendimento")):
+                                    moved = it
+                                    found_col = col_k
+                                    break
+                            except Exception:
+                                continue
+                        if moved:
+                            break
 
-                            # mostrar apenas o botão "Imagem" quando de fato há uma imagem extraível
-                            if img_available:
-                                ui.button("Imagem", on_click=_open_image_dialog_local).classes("secondary")
+                    if not moved:
+                        ui.notify("Card não encontrado para mover", color="negative")
+                        return
 
-                            # botão Atendimentos: abre diálogo com totalização e lista agrupada
-                            def _show_atendimentos_local(_=None, c=card):
-                                try:
-                                    # tentar obter o código do cliente a partir do card
-                                    cod_cliente = (
-                                        c.get('CodCliente')
-                                        or c.get('CodigoCliente')
-                                        or c.get('CodCli')
-                                        or c.get('CodClienteCliente')
-                                    )
-                                except Exception:
-                                    cod_cliente = None
+                    # remover da coluna onde foi encontrado e adicionar na coluna destino
+                    try:
+                        column_cards.get(found_col, []).remove(moved)
+                    except Exception:
+                        pass
+                    column_cards.setdefault(dest, []).append(moved)
 
-                                if not cod_cliente:
-                                    ui.notify('Código do cliente não disponível para este card', color='warning')
-                                    return
+                    # A operação de mover NÃO deve realizar nenhuma escrita no banco.
+                    # Registrar a movimentação apenas em memória no objeto do card.
+                    try:
+                        now_str = datetime.now().strftime('%d/%m/%Y %H:%M:%S')
+                        user_name = sanitize_text(logged_user.get('NomeUsuario') or '')
+                        obs_text = f"Movido em {now_str} — De: {found_col} para: {dest} — Usuário: {user_name}"
+                        moved['_last_move'] = obs_text
+                    except Exception:
+                        pass
+                    ui.notify(f'✔ "{moved.get("NomeCliente")}" movido para "{dest}"')
+
+                    # atualizar a observação no próprio elemento e só movê-lo de coluna
+                    cid = card_id(moved)
+                    widgets = card_elements.get(cid)
+                    if widgets is not None:
+                        widgets["move_note"].set_text(moved.get('_last_move') or "")
+                        widgets["move_note"].set_visibility(bool(moved.get('_last_move')))
+                        card_signatures[cid] = _card_signature(moved)
+                    render_board(cols_to_update=[found_col, dest])
+
+                # habilitar mover apenas para usuários autorizados
+                _allowed_movers = {"Alex", "Angelo.Gabriel", "Marco.Aurelio", "Vinicius.Souza"}
+                _current_user = sanitize_text(logged_user.get('NomeUsuario') or '')
+                if _current_user in _allowed_movers:
+                    btn_move = ui.button("Mover", on_click=do_move).classes("bg-purple-600 text-white").style("background:#7c3aed !important;color:#ffffff !important;")
+                else:
+                    btn_move = ui.button("Mover", on_click=do_move).classes("bg-purple-600 text-white").props('disabled').style("background:#7c3aed !important;color:#ffffff !important;")
+                    try:
+                        ui.tooltip(btn_move, "Mover cards somente habilitado para usuários autorizados")
+                    except Exception:
+                        pass
 
-                                rows = fetch_atendimentos_por_cliente(cod_cliente) or []
-                                total = len(rows)
+        return {"card": card_el, "select": sel, "move_note": move_note_lbl}
 
-                                # agrupar por situacao e por NomeTipoAtendimento
-                                from collections import defaultdict
+    def render_board(cols_to_update=None):
+        """Renderiza colunas. Se cols_to_update for None, renderiza todas; caso contrário
+        apenas atualiza as colunas listadas (nomes).
 
-                                situ_groups = defaultdict(list)
-                                for r in rows:
-                                    try:
-                                        s = r.get('Situacao')
-                                        s_val = int(s) if s is not None else None
-                                    except Exception:
-                                        try:
-                                            s_val = int(str(r.get('Situacao')))
-                                        except Exception:
-                                            s_val = None
-                                    situ_groups[s_val].append(r)
-
-                                dlg = ui.dialog()
-                                dlg.classes('w-full')
-                                # centralizar um único card branco com largura máxima
-                                with dlg:
-                                    with ui.row().classes('w-full justify-center'):
-                                        with ui.column().classes('w-full max-w-3xl'):
-                                            # card branco com espaçamento interno
-                                            with ui.card().classes('p-3').style('background:#ffffff;color:#000000;line-height:1.1;'):
-                                                # título removido para layout compacto
-                                                ui.label(f"Total de atendimentos: {total}").style('background:#7f1d1d;color:#ffffff;padding:4px;border-radius:6px;').classes('text-sm font-semibold mb-0')
-
-                                                # resumo por situação (cada item em sua linha)
-                                                aberto_count = len(situ_groups.get(0, []))
-                                                concluido_count = len(situ_groups.get(1, []))
-                                                ui.label(f"Em aberto: {aberto_count}").classes('text-sm mb-0')
-                                                ui.label(f"Concluídos: {concluido_count}").classes('text-sm mb-0')
-
-                                                # listar detalhes por grupo (0 = aberto, 1 = concluído)
-                                                for situ_code, situ_label in ((0, 'Em aberto'), (1, 'Concluídos')):
-                                                    group = situ_groups.get(situ_code, [])
-                                                    ui.label(f"{situ_label}: {len(group)}").classes('text-sm font-semibold mt-1 mb-0')
-                                                    if not group:
-                                                        continue
-
-                                                    # agrupar por NomeTipoAtendimento
-                                                    type_map = defaultdict(list)
-                                                    for r in group:
-                                                        t = r.get('NomeTipoAtendimento') or ''
-                                                        type_map[t].append(r)
-
-                                                    for tname in sorted(type_map.keys()):
-                                                        entries = type_map[tname]
-                                                        count = len(entries)
-                                                        t_display = sanitize_text(str(tname)) if tname is not None else ''
-                                                        ui.label(f"{t_display}: {count}").style('background:#6b7280;color:#ffffff;padding:4px 8px;border-radius:6px;').classes('text-sm font-semibold ml-0 mt-0')
-                                                        for r in entries:
-                                                            numa = sanitize_text(str(r.get('NumAtendimento') or ''))
-                                                            desd_raw = r.get('Desdobramento')
-                                                            desd = sanitize_text(str(desd_raw) if desd_raw is not None else '')
-                                                            assunto = sanitize_text(str(r.get('AssuntoAtendimento') or ''))
-                                                            # cada atendimento em linha própria
-                                                            ui.label(f"{numa}/{desd} — {assunto}").classes('text-sm ml-2 mb-0')
-
-                                                # botão fechar centralizado abaixo (menos espaço)
-                                                with ui.row().classes('w-full justify-center mt-2'):
-                                                    ui.button('Fechar [ESC]', on_click=lambda _=None: dlg.close()).classes('primary')
-
-                                dlg.open()
-
-                            ui.button('Atendimentos', on_click=_show_atendimentos_local).classes('secondary')
-
-                            # mover
-                            options = [name for (name, _, _) in COLUMNS]
-                            sel = ui.select(options, value=col_name).classes("w-full")
-
-                            def do_move(_, c=card, select_widget=sel):
-                                dest = select_widget.value
-                                if dest == col_name:
-                                    ui.notify("O card já está nessa coluna", color="warning")
-                                    return
-
-                                # localizar o card atual em qualquer coluna (mais robusto)
-                                found_col = None
-                                moved = None
-                                for col_k, lst in column_cards.items():
-                                    for it in lst:
-                                        try:
-                                            if str(it.get("NumAtendimento")) == str(c.get("NumAtendimento")):
-                                                moved = it
-                                                found_col = col_k
-                                                break
-                                        except Exception:
-                                            continue
-                                    if moved:
-                                        break
+        Só cria elementos para cards novos ou com dados alterados (card_signature);
+        os demais são mantidos e, se preciso, reposicionados/movidos de coluna.
+        """
+        # criar colunas (header + área rolável com o container) na primeira chamada
+        if not column_containers:
+            board.clear()
+            with board:
+                for col_name, bg_color, _ in COLUMNS:
+                    with ui.column().classes("basis-0 flex-1").style("min-width: 12rem;"):
+                        column_headers[col_name] = ui.label(col_name).classes(
+                            "text-md font-semibold p-2 rounded w-full text-center"
+                        ).style(f"background:{bg_color};color:#ffffff !important;")
+                        with ui.scroll_area(on_scroll=lambda e, c=col_name: _on_column_scroll(c, e)).classes(
+                            "w-full"
+                        ).style("height: calc(100vh - 220px);"):
+                            cards_container = ui.column().classes("p-2 w-full")
+                            # alternativa à rolagem quando a primeira página não enche a coluna
+                            column_more_buttons[col_name] = ui.button(
+                                "Carregar mais", on_click=lambda _=None, c=col_name: _show_more(c)
+                            ).props("flat dense").classes("w-full")
+                        column_containers[col_name] = cards_container
 
-                                if not moved:
-                                    ui.notify("Card não encontrado para mover", color="negative")
-                                    return
+        cols = [c[0] for c in COLUMNS] if cols_to_update is None else cols_to_update
+        # ids de todos os cards do board, em qualquer coluna
+        placed = {card_id(c) for lst in column_cards.values() for c in lst}
+        for col_name in cols:
+            cards_container = column_containers.get(col_name)
+            if cards_container is None:
+                continue
+            try:
+                # ordenar os cards da coluna (mais antigos primeiro, chave pré-calculada)
+                cards_to_render = sorted(column_cards.get(col_name, []) or [], key=lambda c: _card_view(c).sort_key)
+            except Exception:
+                cards_to_render = column_cards.get(col_name, []) or []
 
-                                # remover da coluna onde foi encontrado e adicionar na coluna destino
-                                try:
-                                    column_cards.get(found_col, []).remove(moved)
-                                except Exception:
-                                    pass
-                                column_cards.setdefault(dest, []).append(moved)
+            # janela da coluna: apenas os primeiros cards da ordenação ganham elemento
+            limit = column_limits.get(col_name) or len(cards_to_render)
+            visible = cards_to_render[:limit]
+            by_id = {card_id(c): c for c in visible}
+            plan = plan_column(card_signatures, [(cid, _card_signature(c)) for cid, c in by_id.items()])
+            to_build = [by_id[cid] for cid in plan["create"] + plan["update"]]
+
+            # flags "tem imagem" do índice, em uma consulta por coluna, apenas para os
+            # cards que serão (re)criados e não têm o indicador do servidor (TemImagem)
+            no_server_flag = [c for c in to_build if c.get("TemImagem") is None]
+            indexed_flags = dict(
+                zip(
+                    (id(c) for c in no_server_flag),
+                    get_image_flags_for_contents([c.get("TextoIteracao") or "" for c in no_server_flag]),
+                )
+            )
 
-                                # A operação de mover NÃO deve realizar nenhuma escrita no banco.
-                                # Registrar a movimentação apenas em memória no objeto do card.
-                                try:
-                                    now_str = datetime.now().strftime('%d/%m/%Y %H:%M:%S')
-                                    user_name = sanitize_text(logged_user.get('NomeUsuario') or '')
-                                    obs_text = f"Movido em {now_str} — De: {found_col} para: {dest} — Usuário: {user_name}"
-                                    moved['_last_move'] = obs_text
-                                except Exception:
-                                    pass
-                                ui.notify(f'✔ "{moved.get("NomeCliente")}" movido para "{dest}"')
+            for card in to_build:
+                cid = card_id(card)
+                _drop_card(cid)
+                try:
+                    with cards_container:
+                        card_elements[cid] = _build_card(card, col_name, indexed_flags.get(id(card)))
+                except Exception:
+                    continue
+                card_column[cid] = col_name
+                card_signatures[cid] = _card_signature(card)
+
+            # remover elementos que saíram do board (os que foram para outra coluna
+            # são movidos quando a coluna de destino é renderizada) e os desta
+            # coluna que ficaram fora da janela
+            stale = [k for k, col in card_column.items() if col == col_name and k not in placed]
+            stale += [k for k in (card_id(c) for c in cards_to_render[limit:]) if k in card_elements]
+            for cid in stale:
+                _drop_card(cid)
+
+            # ordem de exibição: mover apenas os elementos fora de posição
+            for index, cid in enumerate(plan["order"]):
+                widgets = card_elements.get(cid)
+                if widgets is None:
+                    continue
+                children = cards_container.default_slot.children
+                if card_column.get(cid) == col_name and index < len(children) and children[index] is widgets["card"]:
+                    continue
+                if card_column.get(cid) != col_name:
+                    _style_card(cid, col_name)
+                widgets["card"].move(target_container=cards_container, target_index=index)
+                card_column[cid] = col_name
 
-                                render_board()
+            try:
+                column_headers[col_name].set_text(column_header(col_name, len(cards_to_render), len(visible)))
+                remaining = len(cards_to_render) - len(visible)
+                column_more_buttons[col_name].set_text(f"Carregar mais ({remaining})")
+                column_more_buttons[col_name].set_visibility(remaining > 0)
+            except Exception:
+                pass
 
-                            # habilitar mover apenas para usuários autorizados
-                            _allowed_movers = {"Alex", "Angelo.Gabriel", "Marco.Aurelio", "Vinicius.Souza"}
-                            _current_user = sanitize_text(logged_user.get('NomeUsuario') or '')
-                            if _current_user in _allowed_movers:
-                                btn_move = ui.button("Mover", on_click=do_move).classes("bg-purple-600 text-white").style("background:#7c3aed !important;color:#ffffff !important;")
-                            else:
-                                btn_move = ui.button("Mover", on_click=do_move).classes("bg-purple-600 text-white").props('disabled').style("background:#7c3aed !important;color:#ffffff !important;")
-                                try:
-                                    ui.tooltip(btn_move, "Mover cards somente habilitado para usuários autorizados")
-                                except Exception:
-                                    pass
+    async def show_history_dialog(num_atendimento):
+        dlg = ui.dialog()
+        with dlg:
+            loading = ui.spinner(size="lg")
+        dlg.open()
+        try:
+            hist = await run_db(fetch_history, num_atendimento)
+        except Exception as e:
+            dlg.close()
+            ui.notify(f"Erro ao carregar histórico: {e}", color="negative")
+            return
+        finally:
+            loading.delete()
 
-    def show_history_dialog(num_atendimento):
-        hist = fetch_history(num_atendimento)
+        # ordenar por DataIteracao asc e HoraIteracao asc quando possível;
+        # data/hora de cada iteração convertidas uma única vez (ordenação e exibição)
+        hist_dts = {id(h): combine_date_time(h.get("DataIteracao"), h.get("HoraIteracao")) for h in hist}
 
-        # ordenar por DataIteracao asc e HoraIteracao asc quando possível
         def _make_dt(h):
-            try:
-                d = h.get("DataIteracao")
-                t = h.get("HoraIteracao")
-                # se já for datetime
-                if isinstance(d, datetime):
-                    date_part = d
-                else:
-                    # tentar converter string para date
-                    try:
-                        date_part = datetime.strptime(str(d), "%Y-%m-%d")
-                    except Exception:
-                        try:
-                            date_part = datetime.strptime(str(d), "%Y-%m-%d %H:%M:%S")
-                        except Exception:
-                            date_part = datetime.min
-                # hora pode ser string hh:mm:ss
-                if t:
-                    try:
-                        if isinstance(t, str):
-                            time_part = datetime.strptime(t, "%H:%M:%S").time()
-                        else:
-                            time_part = t
-                    except Exception:
-                        time_part = None
-                else:
-                    time_part = None
-                if time_part:
-                    return datetime.combine(date_part.date(), time_part)
-                return date_part
-            except Exception:
-                return datetime.min
+            return hist_dts.get(id(h)) or datetime.min
 
         try:
             hist_sorted = sorted(hist, key=_make_dt)
         except Exception:
             hist_sorted = hist
 
-        dlg = ui.dialog()
         with dlg:
             # centralizar conteúdo do histórico em lista com largura limitada
             with ui.row().classes("w-full justify-center"):
                 with ui.column().classes("w-full max-w-4xl"):
                     # título removido pelo usuário: não exibir label de cabeçalho
-                    for h in hist_sorted:
+                    hist_flags = get_image_flags_for_contents([h.get("TextoIteracao") or "" for h in hist_sorted])
+                    for h, cached_flag in zip(hist_sorted, hist_flags):
                         usuario = sanitize_text(h.get("NomeUsuario") or "-")
-                        texto = sanitize_text(limpar_rtf(h.get("TextoIteracao") or ""))
+                        texto = sanitize_text(limpar_rtf_cached(h.get("TextoIteracao") or ""))
 
-                        def _format_dt(d, t):
-                            # tenta montar um datetime a partir de DataIteracao (data) e HoraIteracao (hora)
-                            # lida com casos em que HoraIteracao vem como
-                            # '1900-01-01 12:50:52' e DataIteracao como
-                            # '2025-10-17 00:00:00'
-                            try:
-                                # parse da parte de data
-                                date_part = None
-                                if isinstance(d, datetime):
-                                    date_part = d
-                                else:
-                                    s = str(d) if d is not None else ""
-                                    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y"):
-                                        try:
-                                            date_part = datetime.strptime(s, fmt)
-                                            break
-                                        except Exception:
-                                            continue
-                                if date_part is None:
-                                    date_part = datetime.min
-
-                                # parse da parte de hora — aceitar tanto 'HH:MM:SS' quanto
-                                # um datetime completo com data (ex.: 1900-01-01 12:50:52)
-                                time_part = None
-                                if isinstance(t, datetime):
-                                    time_part = t.time()
-                                elif t:
-                                    ts = str(t)
-                                    for fmt in ("%H:%M:%S", "%H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M"):
-                                        try:
-                                            parsed = datetime.strptime(ts, fmt)
-                                            # se o formato incluiu data, extrair a hora
-                                            time_part = parsed.time()
-                                            break
-                                        except Exception:
-                                            continue
-
-                                # construir datetime final: usar a data de date_part
-                                # e a hora de time_part quando disponível
-                                if time_part:
-                                    combined = datetime.combine(date_part.date(), time_part)
-                                else:
-                                    combined = date_part
-
-                                # retornar no formato pedido (YYYY-MM-DD HH:MM:SS)
-                                return combined.strftime("%Y-%m-%d %H:%M:%S")
-                            except Exception:
-                                return f"{sanitize_text(d)} {sanitize_text(t)}"
-
-                        data_str = _format_dt(h.get("DataIteracao"), h.get("HoraIteracao"))
+                        # HoraIteracao pode vir como '12:50:52' ou '1900-01-01 12:50:52'
+                        # e DataIteracao como '2025-10-17 00:00:00' (ver dt_parse.combine_date_time)
+                        combined = hist_dts.get(id(h))
+                        if combined is not None:
+                            data_str = combined.strftime("%Y-%m-%d %H:%M:%S")
+                        else:
+                            data_str = f"{sanitize_text(h.get('DataIteracao'))} {sanitize_text(h.get('HoraIteracao'))}"
 
                         # cartão por iteração com labels em negrito
                         with ui.card().classes("mb-2 p-3 w-full"):
@@ -1885,12 +2494,11 @@ def show_kanban():
                             rtf_content = h.get("TextoIteracao") or ""
                             img_exists = False
                             try:
-                                cached = get_image_flag_for_content(rtf_content)
-                                key = _image_cache_key(rtf_content)
+                                cached = cached_flag
                                 if cached is None:
-                                    ib, imime = extract_first_image_from_rtf(rtf_content)
-                                    img_exists = bool(ib and imime)
-                                    set_image_flag_for_content(rtf_content, img_exists)
+                                    # sonda barata, só para exibir o botão; a flag é
+                                    # gravada após a extração real (open_rtf_image_dialog)
+                                    img_exists = has_embedded_image(rtf_content)
                                 else:
                                     img_exists = bool(cached)
                             except Exception as e:
@@ -1898,92 +2506,50 @@ def show_kanban():
 
                             if img_exists:
 
-                                def _open_history_image(_=None, rtf=rtf_content):
-                                    try:
-                                        key = _image_cache_key(rtf)
-                                        cached_now = get_image_flag_for_content(rtf)
-                                    except Exception:
-                                        pass
-                                    try:
-                                        img_b, mime = extract_first_image_from_rtf(rtf)
-                                    except Exception as e:
-                                        img_b, mime = None, None
-                                    dlg = ui.dialog()
-                                    dlg.classes("w-full max-w-6xl")
-                                    with dlg:
-                                        if img_b and mime:
-                                            key = _image_cache_key(rtf)
-                                            # debug: log expected on-disk path before trying to save
-                                            try:
-                                                ext = _ext_for_mime(mime)
-                                                expected_path = _temp_image_path_for_key(key, ext)
-                                                msg = (
-                                                    f"[DEBUG] history will write temp image path={expected_path} "
-                                                    f"exists_before={expected_path.exists()} ext={ext}"
-                                                )
-                                                # debug logging removed
-                                            except Exception:
-                                                pass
-                                            url = save_temp_image_and_get_url(key, img_b, mime)
-                                            if url:
-                                                # debug: log that we are inserting an <img> with this URL
-                                                try:
-                                                    present = temp_image_exists_on_disk(key)
-                                                    import os
-
-                                                    msg = (
-                                                        "[DEBUG] creating ui.image: pid="
-                                                        f"{os.getpid()} for key={key} url={url} "
-                                                        f"present_on_disk={present}"
-                                                    )
-                                                    # debug print removed
-                                                except Exception:
-                                                    pass
-                                                # Use relative URL to avoid cross-host issues
-                                                # so the browser requests the same host/port
-                                                rel_url = url  # already starts with '/_temp_img/'
-                                                img_html = f'<img src="{rel_url}" style="{IMG_STYLE}">'
-                                                ui.html(img_html, sanitize=False)
-                                                link_html = (
-                                                    f'<div style="margin-top:8px;">'
-                                                    f'<a href="{rel_url}" target="_blank" rel="noopener" '
-                                                    f'style="color:#ffd700; text-decoration:underline;">'
-                                                    'Abrir imagem em nova aba</a></div>'
-                                                )
-                                                ui.html(link_html, sanitize=False)
-                                            else:
-                                                # fallback para data-uri caso gravação falhe
-                                                b64 = base64.b64encode(img_b).decode()
-                                                data_img_html = (
-                                                    f'<img src="data:{mime};base64,{b64}" '
-                                                    f'style="{IMG_STYLE}">'
-                                                )
-                                                ui.html(data_img_html, sanitize=False)
-                                        else:
-                                            ui.label("[Imagem] — não foi possível extrair a imagem").classes(
-                                                "text-sm text-gray-600"
-                                            )
-                                        with ui.row().classes("w-full justify-end gap-2"):
-                                            ui.button("Fechar [ESC]", on_click=lambda _=None: dlg.close()).classes(
-                                                "secondary"
-                                            )
-                                    dlg.open()
+                                async def _open_history_image(_=None, rtf=rtf_content):
+                                    await open_rtf_image_dialog(rtf)
 
                                 ui.button("Imagem", on_click=_open_history_image).classes("secondary")
                     # botão fechar centralizado
                     with ui.row().classes("w-full justify-center mt-4"):
                         ui.button("Fechar [ESC]", on_click=lambda _: dlg.close()).classes("primary")
-        dlg.open()
 
     render_board()
 
+    async def _apply_live_updates():
+        """Aplica as mudanças do poller compartilhado que esta sessão ainda não viu."""
+        version, entries = _board_poller.changes_since(live_state["version"])
+        if entries is None:
+            # o log já descartou mudanças desta sessão: refresh completo
+            live_state["version"] = version
+            await _do_refresh()
+            return
+        if not entries:
+            return
+        live_state["version"] = version
+        cols = set()
+        for entry in entries:
+            extra = entry.get("extra") or {}
+            latest_by_num.update(extra.get("latest") or {})
+            card_views.update(extra.get("views") or {})
+            cols |= apply_board_delta(column_cards, entry["changed"], entry["open_ids"], start_col)["columns"]
+        if cols:
+            render_board(cols_to_update=[name for (name, _, _) in COLUMNS if name in cols])
+
+    # timer da sessão (removido junto com root ao trocar de tela)
+    if KANBAN_LIVE_UPDATES:
+        with root:
+            ui.timer(KANBAN_LIVE_CLIENT_INTERVAL, _apply_live_updates)
+
 
 # ---------- Execução ----------
 # A inicialização da UI (show_login/show_kanban + ui.run) fica
 # dentro do guard "if __name__ == '__main__'" para evitar que o
 # servidor NiceGUI seja iniciado quando este módulo for importado
 # por testes ou outras ferramentas.
-if __name__ in {"__main__", "__mp_main__"}:
+# processos do pool de imagens (image_jobs) reimportam este módulo como
+# __mp_main__ e não devem iniciar a UI
+if __name__ in {"__main__", "__mp_main__"} and not os.getenv(image_jobs.WORKER_ENV):
     # limpar cache de imagens expiradas antes de iniciar a UI
     clean_cache()
 
@@ -4,82 +4,204 @@ import re
 import unicodedata
 
 
-def rtf_to_text(rtf_data):
-    """
-    Convert RTF data to plain text, handling both string and binary RTF content.
-    Returns the original data if conversion fails or if it's not RTF.
-    """
-    if not rtf_data:
-        return rtf_data
+# ---------- tokenizador RTF (passada única) ----------
+# Um token por match, sempre a partir da posição corrente do documento:
+#   1/2: palavra de controle (\par, \u233, \b0) com parâmetro opcional; o espaço
+#        delimitador faz parte da palavra
+#   3:   escape hexadecimal \'xx
+#   4:   símbolo de controle (\~, \{, \*, \<nova linha>, ...)
+#   5:   abertura/fechamento de grupo
+#   6:   texto literal
+#   (sem grupo): quebras de linha cruas, que o RTF ignora
+_RTF_TOKEN = re.compile(
+    r"\\([a-zA-Z]{1,32})(-?\d{1,10})? ?"
+    r"|\\'([0-9a-fA-F]{2})"
+    r"|\\(.)"
+    r"|([{}])"
+    r"|([^\\{}\r\n]+)"
+    r"|[\r\n]+",
+    re.DOTALL,
+)
+# dentro de destinos ignorados (ex.: \pict com megabytes de hex) pulamos tudo que
+# não seja controle/grupo de uma vez só, incluindo as quebras de linha do hex
+_RTF_SKIP_RUN = re.compile(r"[^\\{}]+")
+
+# destinos cujo conteúdo não é texto visível
+_RTF_SKIP_DESTINATIONS = frozenset(
+    (
+        "fonttbl", "colortbl", "stylesheet", "info", "pict", "object", "objdata",
+        "themedata", "colorschememapping", "datastore", "latentstyles", "listtable",
+        "listoverridetable", "rsidtbl", "generator", "xmlnstbl", "mmathPr", "pgdsctbl",
+        "filetbl", "revtbl", "nonshppict", "fldinst", "bkmkstart", "bkmkend",
+    )
+)
+# palavras de controle que representam quebras (viram espaço no texto plano)
+_RTF_BREAK_WORDS = frozenset(("par", "line", "tab", "sect", "page", "cell", "row", "lbr", "column"))
+_RTF_CHAR_WORDS = {
+    "emdash": "\u2014",
+    "endash": "\u2013",
+    "bullet": "\u2022",
+    "lquote": "\u2018",
+    "rquote": "\u2019",
+    "ldblquote": "\u201c",
+    "rdblquote": "\u201d",
+    "emspace": " ",
+    "enspace": " ",
+    "qmspace": " ",
+}
+_RTF_SYMBOLS = {"~": "\xa0", "-": "", "_": "-", "{": "{", "}": "}", "\\": "\\", "\n": " ", "\r": " ", "\t": " "}
+
+
+def _build_hex_table():
+    # \'xx é um byte na code page do documento; cp1252 é o padrão dos RTFs
+    # gerados no Windows (e coincide com latin-1 fora de 0x80-0x9F)
+    table = []
+    for n in range(256):
+        try:
+            table.append(bytes([n]).decode("cp1252"))
+        except UnicodeDecodeError:
+            table.append(bytes([n]).decode("latin-1"))
+    return table
+
+
+_RTF_HEX_CHARS = _build_hex_table()
+
 
-    # If it's bytes, try to decode as Latin-1 first
+def _rtf_decode_input(rtf_data):
+    """Normaliza a entrada (bytes/str) para str. Retorna None se não for possível."""
     if isinstance(rtf_data, bytes):
         try:
             # First try UTF-8, fall back to Latin-1
             try:
-                rtf_text = rtf_data.decode("utf-8")
+                return rtf_data.decode("utf-8")
             except UnicodeDecodeError:
-                rtf_text = rtf_data.decode("latin-1")
+                return rtf_data.decode("latin-1")
         except Exception as e:
             print(f"Error decoding bytes: {e}")
-            try:
-                # If still failing, try to extract text between {\rtf and }
-                rtf_str = str(rtf_data)
-                start = rtf_str.find("{\\rtf")
-                if start >= 0:
-                    end = rtf_str.rfind("}")
-                    if end > start:
-                        rtf_text = rtf_str[start:end + 1]
-                    else:
-                        rtf_text = rtf_str[start:]
-                else:
-                    return f"[Binary data: {len(rtf_data)} bytes]"
-            except Exception:
-                return f"[Binary data: {len(rtf_data)} bytes]"
-    else:
-        rtf_text = str(rtf_data)
+            return None
+    return str(rtf_data)
 
-    # Check if it's RTF (starts with {\rtf)
-    rtf_text = rtf_text.strip()
-    if not rtf_text.startswith("{\\rtf"):
-        return rtf_text
 
-    try:
-        # Primeiro, converte escapes hex (ex: \'e7) para o caractere correspondente
-        def replace_hex(m):
-            try:
-                b = bytes([int(m.group(1), 16)])
-                return b.decode("latin-1")
-            except Exception:
-                return ""
+def _iter_rtf_text(rtf_text):
+    r"""Percorre o RTF uma única vez produzindo os trechos de texto visível.
 
-        rtf_text = re.sub(r"\\'([0-9a-fA-F]{2})", replace_hex, rtf_text)
-
-        # Converte escapes Unicode do tipo \\uN (onde N pode ser negativo). RTF frequentemente usa decimal.
-        def replace_unicode(m):
-            try:
-                n = int(m.group(1))
+    Consciente de grupos: destinos como \fonttbl, \colortbl, \stylesheet, \pict
+    e qualquer grupo \* são descartados inteiros; \binN pula N bytes crus;
+    \'xx e \uN (respeitando \ucN) são decodificados na hora.
+    """
+    pos = 0
+    end = len(rtf_text)
+    skip = False  # grupo atual é um destino ignorado
+    uc = 1  # quantos caracteres de fallback seguem cada \uN
+    stack = []
+    pending = 0  # caracteres de fallback ainda a descartar após \uN
+    high = None  # surrogate alto aguardando o par
+
+    match = _RTF_TOKEN.match
+    while pos < end:
+        if skip:
+            m = _RTF_SKIP_RUN.match(rtf_text, pos)
+            if m:
+                pos = m.end()
+                continue
+        m = match(rtf_text, pos)
+        if m is None:
+            # barra invertida no fim do documento
+            break
+        pos = m.end()
+        word, text, brace = m.group(1), m.group(6), m.group(5)
+
+        if text is not None:
+            if pending:
+                n = min(pending, len(text))
+                text = text[n:]
+                pending -= n
+            if text and not skip:
+                yield text
+        elif word is not None:
+            pending = 0
+            if word in _RTF_SKIP_DESTINATIONS:
+                skip = True
+            elif word == "bin":
+                try:
+                    pos += max(0, int(m.group(2) or 0))
+                except ValueError:
+                    pass
+            elif skip:
+                continue
+            elif word == "u":
+                try:
+                    n = int(m.group(2))
+                except (TypeError, ValueError):
+                    continue
                 if n < 0:
-                    n = 65536 + n
-                return chr(n)
-            except Exception:
-                return ""
+                    n += 65536
+                pending = uc
+                if 0xD800 <= n <= 0xDBFF:
+                    high = n
+                    continue
+                if 0xDC00 <= n <= 0xDFFF and high is not None:
+                    n = 0x10000 + ((high - 0xD800) << 10) + (n - 0xDC00)
+                high = None
+                yield chr(n)
+            elif word == "uc":
+                try:
+                    uc = max(0, int(m.group(2) or 0))
+                except ValueError:
+                    pass
+            elif word in _RTF_BREAK_WORDS:
+                yield " "
+            elif word in _RTF_CHAR_WORDS:
+                yield _RTF_CHAR_WORDS[word]
+        elif m.group(3) is not None:
+            if pending:
+                pending -= 1
+            elif not skip:
+                yield _RTF_HEX_CHARS[int(m.group(3), 16)]
+        elif brace is not None:
+            pending = 0
+            if brace == "{":
+                stack.append((skip, uc))
+            elif stack:
+                skip, uc = stack.pop()
+        else:
+            sym = m.group(4)
+            if sym is None:
+                # quebra de linha crua: ignorada pelo RTF
+                continue
+            pending = 0
+            if sym == "*":
+                # destino opcional: nenhum dos que usamos carrega texto visível
+                skip = True
+            elif not skip:
+                yield _RTF_SYMBOLS.get(sym, " ")
 
-        rtf_text = re.sub(r"\\u(-?\d+)", replace_unicode, rtf_text)
 
-        # Remove comandos RTF (control words) como \par, \b0, etc., mantendo o texto
-        rtf_text = re.sub(r"\\[a-zA-Z]+-?\d*\s?", " ", rtf_text)
-        # Remove escapes residuais como \\~ or \\{
-        rtf_text = re.sub(r"\\[^a-zA-Z0-9]", " ", rtf_text)
+def rtf_to_text(rtf_data):
+    """
+    Convert RTF data to plain text, handling both string and binary RTF content.
+    Returns the original data if conversion fails or if it's not RTF.
 
-        # Remove chaves e conteúdo de grupos binários residuais -- mantém o texto simples
-        rtf_text = rtf_text.replace("{", " ").replace("}", " ")
+    The document is tokenized in a single group-aware pass (see _iter_rtf_text):
+    non-text destinations such as font/color tables and embedded pictures are
+    skipped instead of being turned into text and trimmed afterwards.
+    """
+    if not rtf_data:
+        return rtf_data
 
-        # Normaliza espaços
-        text = re.sub(r"\s+", " ", rtf_text).strip()
+    rtf_text = _rtf_decode_input(rtf_data)
+    if rtf_text is None:
+        return f"[Binary data: {len(rtf_data)} bytes]"
 
-        return text if text.strip() else rtf_text
+    # Check if it's RTF (starts with {\rtf)
+    rtf_text = rtf_text.strip()
+    if not rtf_text.startswith("{\\rtf"):
+        return rtf_text
 
+    try:
+        text = "".join(_iter_rtf_text(rtf_text))
+        # Normaliza espaços
+        return re.sub(r"\s+", " ", text).strip()
     except Exception as e:
         print(f"Error converting RTF: {e}")
         try:
@@ -103,52 +225,7 @@ def limpar_rtf(texto):
         texto_limpo = rtf_to_text(texto)
         if texto_limpo is None:
             return ""
-        texto_limpo = str(texto_limpo).strip()
-
-        # remover surrogates e caracteres de controle invisíveis
-        texto_limpo = "".join(ch for ch in texto_limpo if not (0xD800 <= ord(ch) <= 0xDFFF))
-        texto_limpo = "".join(ch for ch in texto_limpo if unicodedata.category(ch)[0] != "C")
-
-        # Se o texto resultante tiver baixa taxa de caracteres legíveis, extrair substrings legíveis ASCII/Unicode
-        total = len(texto_limpo)
-        if total == 0:
-            return ""
-        legiveis = sum(1 for ch in texto_limpo if (ch.isprintable() and not unicodedata.category(ch).startswith("C")))
-        ratio = legiveis / total
-        if ratio < 0.45:
-            # extrai blocos legíveis usando um charset latino razoável (A-Z, acentos, dígitos, pontuação comum)
-            # isso evita dependência de módulos Unicode avançados
-            latin_pattern = r"[A-Za-zÀ-ÖØ-öø-ÿ0-9\-',.;:()\/&%\s]{4,}"
-            parts = re.findall(latin_pattern, texto_limpo)
-            parts = [p.strip() for p in parts if p.strip()]
-            if parts:
-                joined = " ... ".join(parts)
-                return limpar_unicode_basico(joined)
-            # fallback: keep printable ASCII sequences
-            ascii_parts = re.findall(r"[\x20-\x7E]{4,}", texto_limpo)
-            if ascii_parts:
-                return limpar_unicode_basico(" ... ".join(ascii_parts))
-
-        # remover metadados de estilo que aparecem em alguns RTFs (ex: Calibri; Tahoma; ... Table Simple 1;)
-        texto_limpo = re.sub(r"Calibri;[^\n]{0,200}?Table Simple 1;?", " ", texto_limpo, flags=re.IGNORECASE)
-        texto_limpo = re.sub(r"_dx_frag_StartFragment", " ", texto_limpo, flags=re.IGNORECASE)
-
-        # Substituir HYPERLINKs: HYPERLINK "url" "texto"  -> texto
-        try:
-            texto_limpo = re.sub(r'HYPERLINK\s+"([^"]+)"\s+"([^"]+)"', r"\2", texto_limpo, flags=re.IGNORECASE)
-            # HYPERLINK "url" texto (sem aspas de exibição)
-            texto_limpo = re.sub(r'HYPERLINK\s+"([^"]+)"\s+([^\n\r]+)', r"\2", texto_limpo, flags=re.IGNORECASE)
-            # remover eventuais tokens HYPERLINK restantes
-            texto_limpo = re.sub(r"\bHYPERLINK\b", " ", texto_limpo, flags=re.IGNORECASE)
-        except Exception:
-            pass
-
-        # remover longas sequências hex/bin (e.g. arquivos embutidos: começando com PK.. -> 504b03)
-        m = re.search(r"(504b03|[0-9a-fA-F]{40,})", texto_limpo)
-        if m:
-            texto_limpo = texto_limpo[: m.start()].strip()
-
-        return limpar_unicode_basico(texto_limpo)
+        return _limpar_texto_extraido(str(texto_limpo).strip())
     except Exception as e:
         print(f"Erro ao limpar RTF: {e}")
         try:
@@ -157,6 +234,107 @@ def limpar_rtf(texto):
             return ""
 
 
+def _limpar_texto_extraido(texto_limpo):
+    """Pós-processamento de limpar_rtf sobre o texto já extraído do RTF."""
+    # remover surrogates e caracteres de controle invisíveis
+    texto_limpo = "".join(ch for ch in texto_limpo if not (0xD800 <= ord(ch) <= 0xDFFF))
+    texto_limpo = "".join(ch for ch in texto_limpo if unicodedata.category(ch)[0] != "C")
+
+    # Se o texto resultante tiver baixa taxa de caracteres legíveis, extrair substrings legíveis ASCII/Unicode
+    total = len(texto_limpo)
+    if total == 0:
+        return ""
+    legiveis = sum(1 for ch in texto_limpo if (ch.isprintable() and not unicodedata.category(ch).startswith("C")))
+    ratio = legiveis / total
+    if ratio < 0.45:
+        # extrai blocos legíveis usando um charset latino razoável (A-Z, acentos, dígitos, pontuação comum)
+        # isso evita dependência de módulos Unicode avançados
+        latin_pattern = r"[A-Za-zÀ-ÖØ-öø-ÿ0-9\-',.;:()\/&%\s]{4,}"
+        parts = re.findall(latin_pattern, texto_limpo)
+        parts = [p.strip() for p in parts if p.strip()]
+        if parts:
+            joined = " ... ".join(parts)
+            return limpar_unicode_basico(joined)
+        # fallback: keep printable ASCII sequences
+        ascii_parts = re.findall(r"[\x20-\x7E]{4,}", texto_limpo)
+        if ascii_parts:
+            return limpar_unicode_basico(" ... ".join(ascii_parts))
+
+    # remover metadados de estilo que aparecem em alguns RTFs (ex: Calibri; Tahoma; ... Table Simple 1;)
+    texto_limpo = re.sub(r"Calibri;[^\n]{0,200}?Table Simple 1;?", " ", texto_limpo, flags=re.IGNORECASE)
+    texto_limpo = re.sub(r"_dx_frag_StartFragment", " ", texto_limpo, flags=re.IGNORECASE)
+
+    # Substituir HYPERLINKs: HYPERLINK "url" "texto"  -> texto
+    try:
+        texto_limpo = re.sub(r'HYPERLINK\s+"([^"]+)"\s+"([^"]+)"', r"\2", texto_limpo, flags=re.IGNORECASE)
+        # HYPERLINK "url" texto (sem aspas de exibição)
+        texto_limpo = re.sub(r'HYPERLINK\s+"([^"]+)"\s+([^\n\r]+)', r"\2", texto_limpo, flags=re.IGNORECASE)
+        # remover eventuais tokens HYPERLINK restantes
+        texto_limpo = re.sub(r"\bHYPERLINK\b", " ", texto_limpo, flags=re.IGNORECASE)
+    except Exception:
+        pass
+
+    # remover longas sequências hex/bin (e.g. arquivos embutidos: começando com PK.. -> 504b03)
+    m = re.search(r"(504b03|[0-9a-fA-F]{40,})", texto_limpo)
+    if m:
+        texto_limpo = texto_limpo[: m.start()].strip()
+
+    return limpar_unicode_basico(texto_limpo)
+
+
+# folga de caracteres extraídos além do pedido em rtf_snippet: cobre os ajustes
+# do pós-processamento (metadados de estilo removidos por regex de até ~200
+# chars, HYPERLINKs, colapso de espaços) para que o trecho seja um prefixo exato
+_SNIPPET_MARGIN = 512
+
+
+def rtf_snippet(rtf, max_chars=250):
+    """Retorna os primeiros `max_chars` caracteres de `limpar_rtf(rtf)`.
+
+    Interrompe a leitura do RTF assim que há texto visível suficiente, de modo
+    que o custo é proporcional ao trecho e não ao tamanho do documento (útil
+    para cards com imagens de vários megabytes após o texto). A heurística de
+    "texto ilegível" de limpar_rtf é avaliada sobre o trecho lido.
+    """
+    if not rtf or max_chars <= 0:
+        return ""
+    rtf_text = _rtf_decode_input(rtf)
+    if rtf_text is None:
+        return limpar_rtf(rtf)[:max_chars]
+    rtf_text = rtf_text.strip()
+    if not rtf_text.startswith("{\\rtf"):
+        return limpar_rtf(rtf)[:max_chars]
+    try:
+        target = max_chars + _SNIPPET_MARGIN
+        parts = []
+        raw_len = 0
+        next_check = target
+        for piece in _iter_rtf_text(rtf_text):
+            parts.append(piece)
+            raw_len += len(piece)
+            if raw_len >= next_check:
+                # só é preciso recontar após colapsar espaços quando já há bruto suficiente
+                if len(re.sub(r"\s+", " ", "".join(parts)).strip()) >= target:
+                    break
+                next_check = raw_len + target
+        text = re.sub(r"\s+", " ", "".join(parts)).strip()
+        return _limpar_texto_extraido(text)[:max_chars]
+    except Exception:
+        return limpar_rtf(rtf)[:max_chars]
+
+
+def rtf_fragment(trecho):
+    """Transforma um trecho do meio de um RTF em um documento que rtf_snippet lê.
+
+    Usado com o trecho que o servidor devolve logo após o hexadecimal da
+    última imagem: as chaves que fechavam o grupo \\pict são descartadas e o
+    restante é envolvido em um cabeçalho {\\rtf1 mínimo.
+    """
+    if not trecho:
+        return ""
+    return "{\\rtf1 " + trecho.lstrip("}\r\n\t ")
+
+
 def limpar_unicode_basico(texto):
     """
     Limpeza básica que não converte caracteres válidos em ?
@@ -279,6 +457,40 @@ def limpar_texto_para_pdf(texto):
     return texto_final
 
 
+# sinais baratos de imagem embutida (ver has_embedded_image)
+_PICT_BLIP_STR = re.compile(r"\\(?:pngblip|jpegblip)\b", re.IGNORECASE)
+_PICT_BLIP_BYTES = re.compile(rb"\\(?:pngblip|jpegblip)\b", re.IGNORECASE)
+_IMG_SIGNATURE_STR = re.compile(r"89504e47|ffd8ff|\x89PNG|\xff\xd8\xff", re.IGNORECASE)
+_IMG_SIGNATURE_BYTES = re.compile(rb"89504e47|ffd8ff|\x89PNG|\xff\xd8\xff", re.IGNORECASE)
+
+
+def has_embedded_image(rtf_data) -> bool:
+    r"""Indica, sem decodificar nada, se o RTF parece conter uma imagem PNG/JPEG.
+
+    Procura um grupo \pict com \pngblip/\jpegblip ou a assinatura PNG/JPEG (em
+    hex ou binária). Serve para decidir se o botão "Imagem" deve aparecer; a
+    extração completa (extract_first_image_from_rtf) só roda quando o usuário
+    clica. Pode dar falso positivo em RTFs corrompidos — nesse caso o diálogo
+    informa que não foi possível extrair a imagem.
+    """
+    if not rtf_data:
+        return False
+    try:
+        if isinstance(rtf_data, (bytes, bytearray)):
+            data = bytes(rtf_data)
+            has_pict = data.find(b"\\pict") >= 0 or data.find(b"\\PICT") >= 0
+            if has_pict and _PICT_BLIP_BYTES.search(data):
+                return True
+            return _IMG_SIGNATURE_BYTES.search(data) is not None
+        s = str(rtf_data)
+        has_pict = s.find("\\pict") >= 0 or s.find("\\PICT") >= 0
+        if has_pict and _PICT_BLIP_STR.search(s):
+            return True
+        return _IMG_SIGNATURE_STR.search(s) is not None
+    except Exception:
+        return False
+
+
 def extract_first_image_from_rtf(rtf_data):
     r"""
     Tenta extrair a primeira imagem embutida em um bloco RTF (\pict).
@@ -0,0 +1,159 @@
+# temp_images.py
+"""Resolução das URLs /_temp_img/<chave> e cabeçalhos de cache HTTP.
+
+Separado de main.py (que depende da UI) para que a lógica do endpoint possa
+ser testada sem NiceGUI/Starlette:
+
+- `TempImageIndex` mantém o índice em memória chave -> (caminho, mime,
+  larguras dos variantes, chave da imagem), evitando consultar o índice
+  SQLite a cada requisição. Chaves desconhecidas são procuradas no índice
+  SQLite (compartilhado entre workers), pelo vínculo RTF -> imagem (URLs
+  antigas usavam a chave do RTF) e, por último, por glob (arquivos legados).
+  O acesso (last_access) é registrado no máximo a cada `touch_interval`.
+- `temp_image_response` escolhe o arquivo (original ou variante ?w=N) e monta
+  ETag, Last-Modified e Cache-Control, avaliando as requisições condicionais.
+"""
+
+import re
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+
+from image_cache import VARIANT_MIME, select_variant
+
+MIME_BY_EXT = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+}
+# chaves de imagem são hashes hex; validar evita que a chave vire um padrão de glob
+TEMP_KEY_RE = re.compile(r"^[0-9a-fA-F]{16,128}$")
+# imagens temporárias são endereçadas pelo hash do conteúdo: a mesma URL nunca muda
+TEMP_IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class TempImageIndex:
+    def __init__(self, store, touch_interval: float = 300, clock=time.time):
+        """`store` é o image_cache.ImageStore do diretório de imagens temporárias."""
+        self.store = store
+        self.touch_interval = touch_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._touched = {}
+
+    def add(self, key: str, path: Path, mime: str = None, widths=(), img_key: str = None):
+        mime = mime or MIME_BY_EXT.get(Path(path).suffix.lower(), "application/octet-stream")
+        with self._lock:
+            self._entries[key] = (Path(path), mime, tuple(widths or ()), img_key or key)
+
+    def forget(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._touched.pop(key, None)
+
+    def _get(self, key: str):
+        with self._lock:
+            return self._entries.get(key)
+
+    def resolve(self, key: str):
+        """Retorna (Path, mime, larguras dos variantes, chave da imagem) de `key`, ou None.
+
+        `key` pode ser a chave da imagem ou, para URLs antigas, a chave do RTF.
+        """
+        if not key or not TEMP_KEY_RE.match(key):
+            return None
+        entry = self._get(key)
+        if entry is not None:
+            if entry[0].is_file():
+                return entry
+            # arquivo removido pela limpeza do cache
+            with self._lock:
+                self._entries.pop(key, None)
+        index = self.store.index
+        try:
+            meta = index.get_temp_image(key)
+            if meta is not None:
+                p = self.store.path_for(key, meta["ext"])
+                if p.is_file():
+                    self.add(key, p, widths=meta["variants"])
+                    return self._get(key)
+                index.delete_temp_image(key)
+            else:
+                # URLs antigas usavam a chave do RTF; seguir o vínculo RTF -> imagem
+                found = self.store.lookup_rtf(key)
+                if found is not None:
+                    self.add(key, found[1], widths=found[2], img_key=found[0])
+                    return self._get(key)
+        except Exception:
+            pass
+        try:
+            for p in self.store.directory.glob(f"{key}.*"):
+                # ignorar variantes reduzidos (<key>.w320.webp)
+                if p.is_file() and p.name.count(".") == 1:
+                    # arquivo anterior ao índice: registrá-lo para as próximas consultas
+                    try:
+                        st = p.stat()
+                        index.put_temp_image(key, p.suffix, st.st_size, st.st_mtime)
+                    except Exception:
+                        pass
+                    self.add(key, p)
+                    return self._get(key)
+        except Exception:
+            pass
+        return None
+
+    def touch(self, key: str):
+        """Registra o acesso a `key` no índice (no máximo a cada `touch_interval`)."""
+        now = self._clock()
+        with self._lock:
+            if now - self._touched.get(key, 0) < self.touch_interval:
+                return
+            self._touched[key] = now
+        try:
+            self.store.index.touch_temp_image(key, now)
+        except Exception:
+            pass
+
+
+def not_modified(headers, etag: str, mtime: float) -> bool:
+    """Avalia If-None-Match / If-Modified-Since (RFC 9110: If-None-Match tem precedência)."""
+    inm = headers.get("if-none-match")
+    if inm is not None:
+        tags = [t.strip() for t in inm.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+    ims = headers.get("if-modified-since")
+    if ims:
+        try:
+            return int(mtime) <= int(parsedate_to_datetime(ims).timestamp())
+        except Exception:
+            return False
+    return False
+
+
+def temp_image_response(entry, headers, width=None, store=None, cache_control: str = TEMP_IMAGE_CACHE_CONTROL):
+    """Decide a resposta para uma entrada resolvida por TempImageIndex.resolve.
+
+    `headers` são os cabeçalhos da requisição (chaves em minúsculas, como os
+    de Starlette) e `width` o ?w= pedido. Com largura, é servido o menor
+    variante WebP com largura >= `width` (ou o original). Retorna
+    (status 200/304, Path, mime, cabeçalhos, os.stat_result); levanta
+    FileNotFoundError se o arquivo escolhido não existe (o endpoint responde 404).
+    """
+    path, mime, widths, img_key = entry
+    chosen = select_variant(widths, width)
+    etag = f'"{img_key}"'
+    if chosen is not None:
+        path, mime = store.variant_path(img_key, chosen), VARIANT_MIME
+        etag = f'"{img_key}-w{chosen}"'
+    st = path.stat()
+    out = {
+        "ETag": etag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "Cache-Control": cache_control,
+    }
+    status = 304 if not_modified(headers, etag, st.st_mtime) else 200
+    return status, path, mime, out, st
@@ -0,0 +1,95 @@
+"""Dublê mínimo de pyodbc para exercitar o pool e as funções de DB offline.
+
+Uso nos testes::
+
+    import fake_pyodbc
+    sys.modules.setdefault("pyodbc", fake_pyodbc)
+
+`connect()` devolve FakeConnection; as consultas respondem com `result_rows`
+(configurável por conexão) e todas as conexões abertas ficam em `connections`.
+"""
+
+
+class Error(Exception):
+    pass
+
+
+class OperationalError(Error):
+    pass
+
+
+connections = []
+
+
+def reset():
+    connections.clear()
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self._conn = conn
+        self._rows = []
+        self.description = None
+        self.closed = False
+
+    def execute(self, sql, params=()):
+        if self._conn.closed:
+            raise OperationalError("connection is closed")
+        if self._conn.broken:
+            raise OperationalError("communication link failure")
+        self._conn.executed.append((sql, tuple(params)))
+        if sql.strip().upper() == "SELECT 1":
+            self.description = [("",)]
+            self._rows = [(1,)]
+        else:
+            self.description = [(c,) for c in self._conn.result_columns]
+            self._rows = list(self._conn.result_rows)
+        return self
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchmany(self, size=1):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self, conn_str, autocommit=False):
+        self.conn_str = conn_str
+        self.autocommit = autocommit
+        self.closed = False
+        self.broken = False
+        self.rollbacks = 0
+        self.executed = []
+        self.result_columns = []
+        self.result_rows = []
+
+    def cursor(self):
+        if self.closed:
+            raise OperationalError("connection is closed")
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        if self.broken:
+            raise OperationalError("communication link failure")
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+def connect(conn_str, autocommit=False, **kwargs):
+    conn = FakeConnection(conn_str, autocommit=autocommit)
+    connections.append(conn)
+    return conn
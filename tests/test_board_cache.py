@@ -0,0 +1,120 @@
+import threading
+import time
+import unittest
+
+from board_cache import CachedLoader
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCachedLoader(unittest.TestCase):
+    def test_hit_within_ttl(self):
+        calls = []
+        clock = FakeClock()
+        cache = CachedLoader(lambda: calls.append(1) or len(calls), ttl=10, stale_ttl=0, clock=clock)
+        self.assertEqual(cache.get(), 1)
+        clock.now = 5
+        self.assertEqual(cache.get(), 1)
+        clock.now = 11
+        self.assertEqual(cache.get(), 2)
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["loads"]), (1, 2, 2))
+
+    def test_stale_value_served_while_revalidating(self):
+        release = threading.Event()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            if len(calls) > 1:
+                release.wait(2)
+            return len(calls)
+
+        clock = FakeClock()
+        cache = CachedLoader(loader, ttl=10, stale_ttl=60, clock=clock)
+        self.assertEqual(cache.get(), 1)
+        clock.now = 20
+        # valor antigo entregue imediatamente; recarga acontece em segundo plano
+        self.assertEqual(cache.get(), 1)
+        self.assertEqual(cache.get(), 1)
+        release.set()
+        for _ in range(100):
+            if cache.stats()["loads"] == 2:
+                break
+            time.sleep(0.01)
+        self.assertEqual(cache.get(), 2)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(cache.stats()["stale_hits"], 2)
+
+    def test_concurrent_misses_are_coalesced(self):
+        gate = threading.Event()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            gate.wait(2)
+            return "cards"
+
+        cache = CachedLoader(loader, ttl=60)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get())) for _ in range(20)]
+        for t in threads:
+            t.start()
+        time.sleep(0.05)
+        gate.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, ["cards"] * 20)
+        self.assertEqual(len(calls), 1)
+        stats = cache.stats()
+        self.assertEqual(stats["misses"] + stats["coalesced"], 20)
+
+    def test_errors_propagate_and_are_not_cached(self):
+        calls = []
+
+        def loader():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("db down")
+            return "ok"
+
+        cache = CachedLoader(loader, ttl=60)
+        with self.assertRaises(RuntimeError):
+            cache.get()
+        self.assertEqual(cache.get(), "ok")
+        self.assertEqual(cache.stats()["errors"], 1)
+
+    def test_force_bypasses_fresh_value(self):
+        calls = []
+        cache = CachedLoader(lambda: calls.append(1) or len(calls), ttl=60)
+        cache.get()
+        self.assertEqual(cache.get(force=True), 2)
+
+    def test_peek_does_not_load(self):
+        calls = []
+        cache = CachedLoader(lambda: calls.append(1) or len(calls), ttl=60)
+        self.assertIsNone(cache.peek())
+        cache.prime("primed")
+        self.assertEqual(cache.peek(), "primed")
+        self.assertEqual(calls, [])
+
+    def test_prime_keep_age_does_not_extend_ttl(self):
+        calls = []
+        clock = FakeClock()
+        cache = CachedLoader(lambda: calls.append(1) or len(calls), ttl=10, stale_ttl=0, clock=clock)
+        self.assertEqual(cache.get(), 1)
+        clock.now = 8
+        cache.prime("delta", keep_age=True)
+        self.assertEqual(cache.get(), "delta")
+        clock.now = 11
+        self.assertEqual(cache.get(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
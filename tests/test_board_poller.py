@@ -0,0 +1,95 @@
+import unittest
+from datetime import datetime
+
+from board_poller import BoardPoller
+
+
+def _row(num, ultima, situ=0, **extra):
+    row = {"NumAtendimento": num, "Situacao": situ, "Abertura": datetime(2025, 1, 1), "UltimaIteracao": ultima}
+    row.update(extra)
+    return row
+
+
+class FakeDelta:
+    def __init__(self):
+        self.calls = []
+        self.changed = []
+        self.open_ids = []
+
+    def __call__(self, watermark):
+        self.calls.append(watermark)
+        return list(self.changed), list(self.open_ids), {"n": len(self.calls)}
+
+
+class TestBoardPoller(unittest.TestCase):
+    def setUp(self):
+        self.fetch = FakeDelta()
+        self.poller = BoardPoller(self.fetch, interval=5)
+
+    def test_no_poll_without_watermark(self):
+        self.assertIsNone(self.poller.poll_once())
+        self.assertEqual(self.fetch.calls, [])
+
+    def test_versioned_log_and_watermark_advance(self):
+        self.poller.seed(datetime(2025, 3, 1))
+        self.fetch.open_ids = [1, 2]
+        first = self.poller.poll_once()
+        self.assertEqual(first["version"], 1)
+
+        self.fetch.changed = [_row(1, datetime(2025, 3, 2))]
+        entry = self.poller.poll_once()
+        self.assertEqual(entry["version"], 2)
+        self.assertEqual(self.fetch.calls[-1], datetime(2025, 3, 1))
+        self.poller.poll_once()
+        self.assertEqual(self.fetch.calls[-1], datetime(2025, 3, 2))
+
+        version, entries = self.poller.changes_since(1)
+        self.assertEqual(version, 2)
+        self.assertEqual([e["version"] for e in entries], [2])
+        self.assertEqual(self.poller.changes_since(2), (2, []))
+
+    def test_unchanged_boundary_rows_do_not_create_entries(self):
+        self.poller.seed(datetime(2025, 3, 1))
+        self.fetch.open_ids = [1]
+        self.fetch.changed = [_row(1, datetime(2025, 3, 2))]
+        self.assertIsNotNone(self.poller.poll_once())
+        self.assertIsNone(self.poller.poll_once())
+        self.assertEqual(self.poller.version, 1)
+
+    def test_closure_detected_by_open_ids(self):
+        self.poller.seed(datetime(2025, 3, 1))
+        self.fetch.open_ids = [1, 2]
+        self.poller.poll_once()
+        self.fetch.open_ids = [2]
+        entry = self.poller.poll_once()
+        self.assertEqual((entry["changed"], entry["open_ids"]), ([], [2]))
+
+    def test_trimmed_log_requires_resync(self):
+        poller = BoardPoller(self.fetch, interval=5, max_entries=2)
+        poller.seed(datetime(2025, 3, 1))
+        for i in range(4):
+            self.fetch.changed = [_row(1, datetime(2025, 3, 2 + i))]
+            poller.poll_once()
+        self.assertEqual(poller.changes_since(0), (4, None))
+        self.assertEqual([e["version"] for e in poller.changes_since(2)[1]], [3, 4])
+
+    def test_on_change_callback(self):
+        seen = []
+        poller = BoardPoller(self.fetch, interval=5, on_change=seen.append)
+        poller.seed(datetime(2025, 3, 1))
+        self.fetch.changed = [_row(1, datetime(2025, 3, 2))]
+        poller.poll_once()
+        self.assertEqual([e["version"] for e in seen], [1])
+
+    def test_idle_without_clients(self):
+        now = [0.0]
+        poller = BoardPoller(self.fetch, interval=5, clock=lambda: now[0])
+        self.assertTrue(poller._idle())
+        poller.changes_since(0)
+        self.assertFalse(poller._idle())
+        now[0] = 100.0
+        self.assertTrue(poller._idle())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import fake_pyodbc  # noqa: E402
+
+sys.modules.setdefault("pyodbc", fake_pyodbc)
+
+import board_queries  # noqa: E402
+
+# limite do SQL Server por comando
+SQL_SERVER_MAX_PARAMS = 2100
+
+
+class LatestIterationsConnection(fake_pyodbc.FakeConnection):
+    """Responde a cada lote com uma linha (última iteração) por NumAtendimento pedido."""
+
+    def __init__(self):
+        super().__init__("DSN=fake")
+        self.result_columns = ["NumAtendimento", "NumIteracao", "DataIteracao", "HoraIteracao", "NomeUsuario"]
+
+    def cursor(self):
+        conn = self
+
+        class Cursor(fake_pyodbc.FakeCursor):
+            def execute(self, sql, params=()):
+                conn.result_rows = [(n, 7, "2025-01-02", "10:00:00", f"Analista {n}") for n in params]
+                return super().execute(sql, params)
+
+        return Cursor(self)
+
+
+class TestFetchLatestIterations(unittest.TestCase):
+    def setUp(self):
+        self.conn = LatestIterationsConnection()
+        patcher = mock.patch.object(board_queries, "get_db_connection", return_value=self.conn)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_batches_and_deduplicates_ids(self):
+        batch = board_queries.LATEST_ITERATIONS_BATCH
+        nums = list(range(1, batch + 51)) + [1, 2, None, 3]
+        result = board_queries.fetch_latest_iterations(nums)
+        self.assertEqual(len(self.conn.executed), 2)
+        sizes = [len(params) for _sql, params in self.conn.executed]
+        self.assertEqual(sizes, [batch, 50])
+        sent = [n for _sql, params in self.conn.executed for n in params]
+        self.assertEqual(sent, list(range(1, batch + 51)))
+        for sql, params in self.conn.executed:
+            self.assertEqual(sql.count("?"), len(params))
+            self.assertLess(sql.count("?"), SQL_SERVER_MAX_PARAMS)
+            self.assertIn("ROW_NUMBER()", sql)
+        self.assertEqual(len(result), batch + 50)
+        self.assertTrue(self.conn.closed)
+
+    def test_returns_mapping_by_num_atendimento(self):
+        result = board_queries.fetch_latest_iterations([10, 20, 10])
+        self.assertEqual(sorted(result), [10, 20])
+        self.assertEqual(result[20]["NomeUsuario"], "Analista 20")
+        self.assertEqual(result[10]["NumIteracao"], 7)
+
+    def test_empty_input_does_not_query(self):
+        self.assertEqual(board_queries.fetch_latest_iterations([None]), {})
+        self.assertEqual(self.conn.executed, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
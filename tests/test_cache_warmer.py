@@ -0,0 +1,73 @@
+import threading
+import unittest
+
+from cache_warmer import CacheWarmer
+
+
+class TestCacheWarmer(unittest.TestCase):
+    def _warmer(self, warm=None, **kwargs):
+        self.prepared = []
+        self.fetched = []
+        self.warmed = []
+
+        def prepare(card):
+            self.prepared.append(card["n"])
+            return {"id": card["n"], "rtf": None} if card.get("img") else None
+
+        def fetch_texts(tasks):
+            self.fetched.append([t["id"] for t in tasks])
+            for t in tasks:
+                t["rtf"] = f"rtf-{t['id']}"
+
+        return CacheWarmer(prepare, fetch_texts, warm or (lambda t: self.warmed.append(t["rtf"])), delay=0, **kwargs)
+
+    def test_batches_texts_and_warms_image_tasks(self):
+        warmer = self._warmer(batch_size=2)
+        warmer.schedule([{"n": 1, "img": True}, {"n": 2}, {"n": 3, "img": True}, {"n": 4, "img": True}])
+        self.assertTrue(warmer.wait_idle(5))
+        self.assertEqual(self.prepared, [1, 2, 3, 4])
+        self.assertEqual(self.fetched, [[1, 3], [4]])
+        self.assertEqual(sorted(self.warmed), ["rtf-1", "rtf-3", "rtf-4"])
+        self.assertEqual(warmer.stats()["warmed"], 3)
+
+    def test_completed_tasks_are_not_repeated(self):
+        warmer = self._warmer()
+        warmer.schedule([{"n": 1, "img": True}])
+        warmer.wait_idle(5)
+        warmer.schedule([{"n": 1, "img": True}, {"n": 2, "img": True}])
+        warmer.wait_idle(5)
+        self.assertEqual(sorted(self.warmed), ["rtf-1", "rtf-2"])
+        self.assertEqual(warmer.stats()["skipped"], 1)
+
+    def test_concurrency_limit(self):
+        lock = threading.Lock()
+        active = [0, 0]
+
+        def warm(task):
+            with lock:
+                active[0] += 1
+                active[1] = max(active[1], active[0])
+            threading.Event().wait(0.02)
+            with lock:
+                active[0] -= 1
+
+        warmer = self._warmer(warm=warm, concurrency=2)
+        warmer.schedule([{"n": i, "img": True} for i in range(8)])
+        self.assertTrue(warmer.wait_idle(5))
+        self.assertLessEqual(active[1], 2)
+
+    def test_errors_do_not_stop_the_run(self):
+        def warm(task):
+            if task["id"] == 1:
+                raise ValueError("boom")
+            self.warmed.append(task["rtf"])
+
+        warmer = self._warmer(warm=warm)
+        warmer.schedule([{"n": 1, "img": True}, {"n": 2, "img": True}])
+        warmer.wait_idle(5)
+        self.assertEqual(self.warmed, ["rtf-2"])
+        self.assertEqual(warmer.stats()["errors"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
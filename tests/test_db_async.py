@@ -0,0 +1,36 @@
+import asyncio
+import threading
+import unittest
+
+import db_async
+
+
+class TestRunDb(unittest.TestCase):
+    def test_runs_off_the_event_loop_thread(self):
+        def work(a, b=0):
+            return a + b, threading.current_thread().name
+
+        async def main():
+            return await db_async.run_db(work, 1, b=2), threading.current_thread().name
+
+        (total, worker_name), loop_name = asyncio.run(main())
+        self.assertEqual(total, 3)
+        self.assertNotEqual(worker_name, loop_name)
+        self.assertTrue(worker_name.startswith("db"))
+
+    def test_slow_call_does_not_block_other_coroutines(self):
+        gate = threading.Event()
+
+        async def main():
+            slow = asyncio.ensure_future(db_async.run_db(gate.wait, 2))
+            # o loop continua livre enquanto a chamada bloqueante espera
+            await asyncio.sleep(0.01)
+            self.assertFalse(slow.done())
+            gate.set()
+            return await slow
+
+        self.assertTrue(asyncio.run(main()))
+
+
+if __name__ == "__main__":
+    unittest.main()
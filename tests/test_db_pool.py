@@ -0,0 +1,114 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import fake_pyodbc  # noqa: E402
+
+sys.modules.setdefault("pyodbc", fake_pyodbc)
+
+import authentication  # noqa: E402
+from db_pool import ConnectionPool, PoolTimeout  # noqa: E402
+
+
+def _make_pool(**kwargs):
+    return ConnectionPool(lambda: fake_pyodbc.connect("DSN=fake"), **kwargs)
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        fake_pyodbc.reset()
+
+    def test_close_returns_connection_for_reuse(self):
+        pool = _make_pool(max_size=2)
+        conn = pool.acquire()
+        raw = conn._raw
+        conn.close()
+        self.assertEqual(raw.rollbacks, 1)
+        self.assertFalse(raw.closed)
+        again = pool.acquire()
+        self.assertIs(again._raw, raw)
+        self.assertEqual(len(fake_pyodbc.connections), 1)
+        stats = pool.stats()
+        self.assertEqual(stats["created"], 1)
+        self.assertEqual(stats["reused"], 1)
+        self.assertEqual(stats["in_use"], 1)
+
+    def test_checkout_timeout_when_exhausted(self):
+        pool = _make_pool(max_size=1, timeout=0.05)
+        held = pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        self.assertEqual(pool.stats()["timeouts"], 1)
+        held.close()
+
+    def test_waiter_gets_released_connection(self):
+        pool = _make_pool(max_size=1, timeout=2)
+        held = pool.acquire()
+        threading.Timer(0.05, held.close).start()
+        conn = pool.acquire()
+        self.assertGreaterEqual(pool.stats()["waits"], 1)
+        conn.close()
+
+    def test_idle_connections_are_evicted(self):
+        pool = _make_pool(max_size=2, idle_timeout=0.01)
+        conn = pool.acquire()
+        raw = conn._raw
+        conn.close()
+        time.sleep(0.03)
+        self.assertEqual(pool.evict_idle(), 1)
+        self.assertTrue(raw.closed)
+        self.assertEqual(pool.stats()["size"], 0)
+
+    def test_pre_ping_discards_dead_connection(self):
+        pool = _make_pool(max_size=2)
+        conn = pool.acquire()
+        raw = conn._raw
+        conn.close()
+        raw.broken = True
+        fresh = pool.acquire()
+        self.assertIsNot(fresh._raw, raw)
+        self.assertTrue(raw.closed)
+        self.assertEqual(pool.stats()["ping_failures"], 1)
+        self.assertEqual(pool.stats()["size"], 1)
+
+    def test_closed_proxy_rejects_use(self):
+        pool = _make_pool()
+        conn = pool.acquire()
+        conn.close()
+        conn.close()  # idempotente
+        with self.assertRaises(AttributeError):
+            conn.cursor()
+
+
+class TestGetDbConnection(unittest.TestCase):
+    def setUp(self):
+        fake_pyodbc.reset()
+        self._orig_pyodbc = authentication.pyodbc
+        authentication.pyodbc = fake_pyodbc
+        authentication._pool = None
+
+    def tearDown(self):
+        if authentication._pool is not None:
+            authentication._pool.dispose()
+        authentication._pool = None
+        authentication.pyodbc = self._orig_pyodbc
+
+    def test_existing_callers_reuse_one_connection(self):
+        for _ in range(5):
+            conn = authentication.get_db_connection()
+            cur = conn.cursor()
+            cur.execute("SELECT NumAtendimento FROM CNSAtendimento")
+            cur.fetchall()
+            cur.close()
+            conn.close()
+        self.assertEqual(len(fake_pyodbc.connections), 1)
+        self.assertIn("Trusted_Connection=yes", fake_pyodbc.connections[0].conn_str)
+        self.assertEqual(authentication.get_pool_stats()["reused"], 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
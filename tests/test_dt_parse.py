@@ -0,0 +1,69 @@
+import unittest
+from datetime import date, datetime, time
+
+from dt_parse import (
+    DateParser,
+    combine_date_time,
+    format_datetime,
+    parse_datetime,
+    parse_datetimes,
+    parse_time,
+)
+
+
+class TestParseDatetime(unittest.TestCase):
+    def test_native_values(self):
+        dt = datetime(2025, 1, 31, 10, 20)
+        self.assertIs(parse_datetime(dt), dt)
+        self.assertEqual(parse_datetime(date(2025, 1, 31)), datetime(2025, 1, 31))
+        self.assertIsNone(parse_datetime(None))
+
+    def test_text_formats(self):
+        self.assertEqual(parse_datetime("2025-01-31 10:20:30.250"), datetime(2025, 1, 31, 10, 20, 30, 250000))
+        self.assertEqual(parse_datetime(b"2025-01-31"), datetime(2025, 1, 31))
+        self.assertEqual(parse_datetime("31/01/2025 10:20:30"), datetime(2025, 1, 31, 10, 20, 30))
+        self.assertEqual(parse_datetime("31/01/2025"), datetime(2025, 1, 31))
+
+    def test_invalid(self):
+        self.assertIsNone(parse_datetime(""))
+        self.assertIsNone(parse_datetime("amanhã"))
+        self.assertIsNone(parse_datetime("2025-13-45"))
+
+    def test_last_format_is_tried_first(self):
+        parser = DateParser(("%Y-%m-%d", "%d/%m/%Y"), iso=False)
+        self.assertEqual(parser.parse("31/01/2025"), datetime(2025, 1, 31))
+        self.assertEqual(parser._last, "%d/%m/%Y")
+        self.assertEqual(parser.parse("2025-02-01"), datetime(2025, 2, 1))
+        self.assertEqual(parser._last, "%Y-%m-%d")
+
+    def test_batch(self):
+        values = ["31/01/2025", None, datetime(2025, 2, 1), "31/01/2025", "x"]
+        self.assertEqual(
+            parse_datetimes(values),
+            [datetime(2025, 1, 31), None, datetime(2025, 2, 1), datetime(2025, 1, 31), None],
+        )
+
+
+class TestDateAndTime(unittest.TestCase):
+    def test_parse_time(self):
+        self.assertEqual(parse_time("12:50:52"), time(12, 50, 52))
+        self.assertEqual(parse_time("1900-01-01 12:50:52"), time(12, 50, 52))
+        self.assertEqual(parse_time(datetime(1900, 1, 1, 8, 5)), time(8, 5))
+        self.assertIsNone(parse_time("?"))
+
+    def test_combine(self):
+        self.assertEqual(
+            combine_date_time("2025-10-17 00:00:00", "1900-01-01 12:50:52"),
+            datetime(2025, 10, 17, 12, 50, 52),
+        )
+        self.assertEqual(combine_date_time(datetime(2025, 10, 17), None), datetime(2025, 10, 17))
+        self.assertIsNone(combine_date_time(None, "12:00"))
+
+    def test_format(self):
+        self.assertEqual(format_datetime("31/01/2025"), "2025-01-31 00:00:00")
+        self.assertEqual(format_datetime(None), "-")
+        self.assertIsNone(format_datetime("x"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+import importlib.util
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from image_cache import ImageCacheIndex, ImageStore, build_variants, image_key, select_variant
+
+
+class TestImageCacheIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.index = ImageCacheIndex(os.path.join(self.tmp, "cache_index.sqlite3"))
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_flags_roundtrip_and_batch_lookup(self):
+        self.assertIsNone(self.index.get_flag("a"))
+        self.index.set_flag("a", True)
+        self.index.set_flags({"b": False, "c": True})
+        self.index.set_flag("a", False)
+        self.assertFalse(self.index.get_flag("a"))
+        self.assertEqual(self.index.get_flags(["a", "b", "c", "zz"]), {"a": False, "b": False, "c": True})
+
+    def test_import_legacy_flag_files(self):
+        for name, value in (("k1", "1"), ("k2", "0")):
+            with open(os.path.join(self.tmp, f"{name}.hasimg"), "w", encoding="utf-8") as f:
+                f.write(value)
+        self.assertEqual(self.index.import_flag_files(self.tmp), 2)
+        self.assertEqual(self.index.get_flags(["k1", "k2"]), {"k1": True, "k2": False})
+        self.assertFalse([n for n in os.listdir(self.tmp) if n.endswith(".hasimg")])
+
+    def test_temp_image_metadata(self):
+        self.index.put_temp_image("abc", ".png", 1234, mtime=10.0)
+        meta = self.index.get_temp_image("abc")
+        self.assertEqual((meta["ext"], meta["size"], meta["mtime"]), (".png", 1234, 10.0))
+        self.index.touch_temp_image("abc", when=1.0)
+        self.assertEqual(self.index.temp_images_not_accessed_since(5.0), [("abc", ".png")])
+        self.index.delete_temp_image("abc")
+        self.assertIsNone(self.index.get_temp_image("abc"))
+
+    def test_usage_totals_are_incremental(self):
+        self.index.put_temp_image("a", ".png", 100)
+        self.index.put_temp_image("b", ".png", 50)
+        self.index.put_temp_image("a", ".png", 70)  # regravação ajusta o total
+        self.index.delete_temp_image("b")
+        self.index.delete_temp_image("missing")
+        usage = self.index.usage()
+        self.assertEqual((usage["bytes"], usage["entries"]), (70, 1))
+
+    def test_evict_lru_by_bytes_and_entries(self):
+        for i, key in enumerate(("old", "mid", "new")):
+            self.index.put_temp_image(key, ".png", 100)
+            self.index.touch_temp_image(key, when=float(i))
+        self.index.touch_temp_image("old", when=10.0)  # acesso recente protege "old"
+
+        self.assertEqual(self.index.evict_lru(max_bytes=300), [])
+        self.assertEqual(self.index.evict_lru(max_bytes=250), [("mid", ".png", 100)])
+        self.assertEqual(self.index.evict_lru(max_entries=1), [("new", ".png", 100)])
+        usage = self.index.usage()
+        self.assertEqual((usage["bytes"], usage["entries"]), (100, 1))
+        self.assertEqual((usage["evictions"], usage["evicted_bytes"]), (2, 200))
+        self.assertIsNotNone(self.index.get_temp_image("old"))
+
+    def test_import_untracked_temp_images(self):
+        tmp_dir = os.path.join(self.tmp, "tmp")
+        os.makedirs(tmp_dir)
+        with open(os.path.join(tmp_dir, "abc.png"), "wb") as f:
+            f.write(b"x" * 10)
+        self.assertEqual(self.index.import_temp_images(tmp_dir), 1)
+        self.assertEqual(self.index.import_temp_images(tmp_dir), 0)
+        self.assertEqual(self.index.usage()["bytes"], 10)
+
+    def test_shared_between_connections(self):
+        other = ImageCacheIndex(self.index.db_path)
+        self.index.set_flag("x", True)
+        result = {}
+        t = threading.Thread(target=lambda: result.update(other.get_flags(["x"])))
+        t.start()
+        t.join()
+        self.assertEqual(result, {"x": True})
+
+
+class TestImageStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.index = ImageCacheIndex(os.path.join(self.tmp, "cache_index.sqlite3"))
+        self.store = ImageStore(os.path.join(self.tmp, "tmp"), self.index)
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_same_image_from_different_rtf_is_stored_once(self):
+        writes = []
+
+        def transform(b):
+            writes.append(b)
+            return b
+
+        k1, p1, _ = self.store.store("rtf-a", b"\x89PNG same", "image/png", transform=transform)
+        k2, p2, _ = self.store.store("rtf-b", b"\x89PNG same", "image/png", transform=transform)
+        self.assertEqual((k1, p1), (k2, p2))
+        self.assertEqual(k1, image_key(b"\x89PNG same"))
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(self.index.get_temp_image(k1)["refcount"], 2)
+        self.assertEqual(self.store.lookup_rtf("rtf-b")[:2], (k1, p1))
+        self.assertEqual(self.index.usage()["entries"], 1)
+
+    def test_last_released_link_removes_the_image(self):
+        key, path, _ = self.store.store("rtf-a", b"old image", "image/png")
+        self.store.store("rtf-b", b"old image", "image/png")
+        self.store.store("rtf-a", b"new image", "image/png")  # rtf-a passa a apontar para outra imagem
+        self.assertTrue(path.is_file())
+        self.store.store("rtf-b", b"new image", "image/png")
+        self.assertFalse(path.is_file())
+        self.assertIsNone(self.index.get_temp_image(key))
+        self.assertEqual(self.index.usage()["entries"], 1)
+
+    def test_expired_links_release_images(self):
+        key, path, _ = self.store.store("rtf-a", b"img", "image/jpeg")
+        orphaned = self.index.release_links_older_than(float("inf"))
+        self.assertEqual([(k, e) for k, e, _ in orphaned], [(key, ".jpg")])
+        self.assertIsNone(self.store.lookup_rtf("rtf-a"))
+
+    def test_recently_viewed_image_keeps_old_link(self):
+        # vinculada há muito tempo, mas vista todo dia: não pode ser liberada
+        key, path, _ = self.store.store("rtf-a", b"img", "image/png")
+        self.index._conn().execute("UPDATE rtf_images SET linked = 0")
+        self.assertEqual(self.store.lookup_rtf("rtf-a")[0], key)
+        self.index.touch_temp_image(key, 2000.0)
+        self.assertEqual(self.index.release_links_older_than(1000.0), [])
+        self.assertEqual(self.store.lookup_rtf("rtf-a")[:2], (key, path))
+        self.assertEqual(self.index.get_temp_image(key)["refcount"], 1)
+        # sem acesso desde o corte: o vínculo expira e a imagem sai
+        orphaned = self.index.release_links_older_than(3000.0)
+        self.assertEqual([k for k, _e, _s in orphaned], [key])
+
+    def test_remove_files_deletes_variants(self):
+        key, path, _ = self.store.store("rtf-a", b"img", "image/png")
+        for w in self.store.variant_widths:
+            self.store.variant_path(key, w).write_bytes(b"v")
+        self.store.remove_files([(key, ".png")])
+        self.assertEqual(os.listdir(self.store.directory), [])
+
+
+class TestVariants(unittest.TestCase):
+    def test_select_variant(self):
+        self.assertEqual(select_variant((320, 1280), "200"), 320)
+        self.assertEqual(select_variant((320, 1280), "800"), 1280)
+        self.assertIsNone(select_variant((320, 1280), "4000"))
+        self.assertIsNone(select_variant((320, 1280), None))
+        self.assertIsNone(select_variant((320, 1280), "abc"))
+        self.assertIsNone(select_variant((), "320"))
+
+    def test_build_variants_without_pillow_or_bad_bytes(self):
+        self.assertEqual(build_variants(b"not an image"), {})
+
+    @unittest.skipUnless(importlib.util.find_spec("PIL"), "Pillow não instalado")
+    def test_build_variants_downscales_only(self):
+        from io import BytesIO
+
+        from PIL import Image
+
+        buf = BytesIO()
+        Image.new("RGBA", (2000, 1000), (255, 0, 0, 128)).save(buf, format="PNG")
+        variants = build_variants(buf.getvalue(), (320, 1280, 4000))
+        self.assertEqual(sorted(variants), [320, 1280])
+        self.assertEqual(Image.open(BytesIO(variants[320])).size, (320, 160))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from io import BytesIO
+from unittest import mock
+
+import image_jobs
+from image_cache import ImageCacheIndex, ImageStore
+from image_jobs import ImageJobQueue
+
+
+def _png(color=(255, 0, 0, 0)):
+    try:
+        from PIL import Image
+    except ImportError:
+        return b"\x89PNG not really"
+    buf = BytesIO()
+    Image.new("RGBA", (40, 20), color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class TestImageJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.index = ImageCacheIndex(os.path.join(self.tmp, "cache_index.sqlite3"))
+        self.store = ImageStore(os.path.join(self.tmp, "tmp"), self.index, variant_widths=(8,))
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_concurrent_requests_for_same_image_share_one_job(self):
+        queue = ImageJobQueue(self.store, max_workers=0)
+        gate = threading.Event()
+        calls = []
+        real = image_jobs.normalize_and_write
+
+        def slow(*args):
+            calls.append(args[1])
+            gate.wait(5)
+            return real(*args)
+
+        img = _png()
+        with mock.patch.object(image_jobs, "normalize_and_write", slow):
+            f1 = queue.submit("rtf-a", img, "image/png")
+            f2 = queue.submit("rtf-b", img, "image/png")
+            gate.set()
+            r1, r2 = f1.result(5), f2.result(5)
+        queue.shutdown(wait=True)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(r1, r2)
+        self.assertTrue(r1[1].is_file())
+        self.assertEqual(self.index.get_temp_image(r1[0])["refcount"], 2)
+        self.assertEqual(queue.stats()["coalesced"], 1)
+        # nenhum arquivo temporário (.part) sobra no diretório
+        self.assertFalse([n for n in os.listdir(self.store.directory) if n.startswith(".")])
+
+    def test_stored_image_resolves_without_a_job(self):
+        queue = ImageJobQueue(self.store, max_workers=0)
+        img = _png()
+        first = queue.submit("rtf-a", img, "image/png").result(5)
+        again = queue.submit("rtf-b", img, "image/png").result(5)
+        queue.shutdown(wait=True)
+        self.assertEqual(first, again)
+        self.assertEqual(queue.stats()["already_stored"], 1)
+
+    def test_process_pool_flattens_alpha(self):
+        try:
+            from PIL import Image
+        except ImportError:
+            self.skipTest("Pillow não instalado")
+        queue = ImageJobQueue(self.store, max_workers=1)
+        try:
+            key, path, widths = queue.submit("rtf-a", _png(), "image/png").result(60)
+        finally:
+            queue.shutdown(wait=True)
+        self.assertEqual(Image.open(path).mode, "RGB")
+        self.assertEqual(widths, (8,))
+        self.assertNotIn(image_jobs.WORKER_ENV, os.environ)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,239 @@
+import re
+import unittest
+from datetime import datetime
+
+from kanban_board import (
+    CardView,
+    apply_board_delta,
+    board_watermark,
+    build_card_views,
+    card_id,
+    card_signature,
+    card_views_footprint,
+    column_header,
+    fill_snippets,
+    grow_window,
+    plan_column,
+)
+from rtf_utils import rtf_fragment, rtf_snippet
+
+
+def _card(num, situ=0, ultima=None, **extra):
+    row = {
+        "NumAtendimento": num,
+        "NomeCliente": f"Cliente {num}",
+        "Situacao": situ,
+        "Abertura": datetime(2025, 1, 1),
+        "UltimaIteracao": ultima,
+    }
+    row.update(extra)
+    return row
+
+
+class TestWatermark(unittest.TestCase):
+    def test_max_of_iteration_and_opening(self):
+        cards = [
+            _card(1, ultima=datetime(2025, 3, 1)),
+            _card(2, ultima=None, Abertura=datetime(2025, 4, 2)),
+        ]
+        self.assertEqual(board_watermark(cards), datetime(2025, 4, 2))
+
+    def test_none_without_datetimes(self):
+        self.assertIsNone(board_watermark([{"NumAtendimento": 1, "Abertura": "2025-01-01"}]))
+
+
+class TestApplyBoardDelta(unittest.TestCase):
+    def setUp(self):
+        self.moved = _card(2, ultima=datetime(2025, 2, 1), _last_move="Movido")
+        self.columns = {
+            "A iniciar": [_card(1, ultima=datetime(2025, 2, 1)), _card(3)],
+            "Implantação pausada": [self.moved],
+        }
+
+    def test_add_update_remove(self):
+        changed = [
+            _card(2, ultima=datetime(2025, 5, 1)),  # nova iteração
+            _card(3, situ=1),  # encerrado com iteração
+            _card(4),  # novo
+        ]
+        result = apply_board_delta(self.columns, changed, open_ids=[1, 2, 4], start_col="A iniciar")
+        self.assertEqual(result["added"], ["4"])
+        self.assertEqual(result["updated"], ["2"])
+        self.assertEqual(result["removed"], ["3"])
+        self.assertEqual(result["columns"], {"A iniciar", "Implantação pausada"})
+        # card movido continua na coluna e mantém a anotação local
+        self.assertIs(self.columns["Implantação pausada"][0], self.moved)
+        self.assertEqual(self.moved["UltimaIteracao"], datetime(2025, 5, 1))
+        self.assertEqual(self.moved["_last_move"], "Movido")
+        self.assertEqual([c["NumAtendimento"] for c in self.columns["A iniciar"]], [1, 4])
+
+    def test_closed_without_new_iteration_detected_by_open_ids(self):
+        result = apply_board_delta(self.columns, [], open_ids=[2, 3], start_col="A iniciar")
+        self.assertEqual(result["removed"], ["1"])
+        self.assertEqual(result["columns"], {"A iniciar"})
+
+    def test_boundary_rows_without_changes_are_ignored(self):
+        same = dict(self.columns["A iniciar"][0])
+        result = apply_board_delta(self.columns, [same], open_ids=[1, 2, 3], start_col="A iniciar")
+        self.assertEqual((result["added"], result["updated"], result["removed"]), ([], [], []))
+        self.assertEqual(result["columns"], set())
+
+    def test_full_refresh_updates_changed_cards_in_place(self):
+        # refresh completo: todas as linhas abertas, open_ids = ids devolvidos
+        rendered = {card_id(c): card_signature(c) for lst in self.columns.values() for c in lst}
+        full = [
+            _card(1, ultima=datetime(2025, 2, 1), DataProxContato=datetime(2025, 6, 1)),  # só dado alterado
+            _card(2, ultima=datetime(2025, 2, 1)),
+            _card(3),
+        ]
+        result = apply_board_delta(self.columns, full, [c["NumAtendimento"] for c in full], "A iniciar")
+        self.assertEqual(result["updated"], ["1"])
+        self.assertEqual(result["columns"], {"A iniciar"})
+        col = self.columns["A iniciar"]
+        plan = plan_column(rendered, [(card_id(c), card_signature(c)) for c in col])
+        self.assertEqual((plan["create"], plan["update"]), ([], ["1"]))
+
+
+class TestPlanColumn(unittest.TestCase):
+    def test_signature_ignores_key_order_and_includes_extra(self):
+        a = _card(1, ultima=datetime(2025, 3, 1))
+        b = dict(reversed(list(a.items())))
+        self.assertEqual(card_signature(a), card_signature(b))
+        self.assertNotEqual(card_signature(a, "Ana"), card_signature(a, "Bia"))
+
+    def test_only_new_and_changed_cards_are_built(self):
+        c1, c2, c3 = _card(1), _card(2), _card(3)
+        rendered = {"1": card_signature(c1), "2": card_signature(c2)}
+        c2["_last_move"] = "Movido"
+        plan = plan_column(rendered, [(str(c["NumAtendimento"]), card_signature(c)) for c in (c3, c1, c2)])
+        self.assertEqual(plan["create"], ["3"])
+        self.assertEqual(plan["update"], ["2"])
+        self.assertEqual(plan["order"], ["3", "1", "2"])
+
+    def test_unchanged_column_is_a_no_op(self):
+        c1 = _card(1)
+        plan = plan_column({"1": card_signature(c1)}, [("1", card_signature(dict(c1)))])
+        self.assertEqual((plan["create"], plan["update"]), ([], []))
+
+
+class TestCardView(unittest.TestCase):
+    NOW = datetime(2025, 6, 1, 12, 0)
+
+    def test_parses_text_dates_and_derives_labels(self):
+        row = _card(
+            7,
+            Abertura="2025-01-01 08:00:00",
+            DataProxContato="01/06/2025",
+            UltimaIteracao=datetime(2025, 5, 30, 9, 15),
+        )
+        view = CardView(row)
+        self.assertEqual(view.cid, "7")
+        self.assertEqual(view.days_open(self.NOW), 151)
+        self.assertEqual(view.days_class(self.NOW), "text-red-600")
+        self.assertEqual((view.prox_label, view.prox_class(self.NOW)), ("01/06/2025", "text-black"))
+        self.assertEqual(view.ultima_label, "2025-05-30 09:15:00")
+
+    def test_missing_dates(self):
+        view = CardView(_card(1, Abertura=None, DataProxContato="?"))
+        self.assertIsNone(view.days_open(self.NOW))
+        self.assertEqual((view.prox_label, view.prox_class(self.NOW)), ("-", "text-gray-500"))
+        self.assertEqual(view.ultima_label, "-")
+
+    def test_date_relative_fields_follow_the_current_day(self):
+        # a mesma view usada dias depois (sessão longa) não fica com cores antigas
+        view = CardView(_card(2, Abertura=datetime(2025, 2, 1), DataProxContato=datetime(2025, 6, 2)))
+        self.assertEqual((view.days_open(self.NOW), view.days_class(self.NOW)), (120, "text-blue-600"))
+        self.assertEqual(view.prox_class(self.NOW), "text-blue-600")
+        later = datetime(2025, 6, 3, 9, 0)
+        self.assertEqual((view.days_open(later), view.days_class(later)), (122, "text-red-600"))
+        self.assertEqual(view.prox_class(later), "text-red-600")
+
+    def test_sort_key_orders_oldest_first_and_undated_last(self):
+        rows = [_card(1, Abertura=None), _card(2, Abertura=datetime(2025, 3, 1)), _card(3)]
+        views = build_card_views(rows)
+        ordered = sorted(views.values(), key=lambda v: v.sort_key)
+        self.assertEqual([v.cid for v in ordered], ["3", "2", "1"])
+
+    def test_footprint(self):
+        views = build_card_views([_card(n) for n in range(10)])
+        self.assertFalse(hasattr(views["1"], "__dict__"))
+        fp = card_views_footprint(views)
+        self.assertEqual(fp["cards"], 10)
+        self.assertGreater(fp["avg_bytes"], 0)
+
+
+class TestColumnWindow(unittest.TestCase):
+    def test_grow_window_by_pages_up_to_total(self):
+        self.assertEqual(grow_window(20, 55, 20), 40)
+        self.assertEqual(grow_window(40, 55, 20), 55)
+        self.assertEqual(grow_window(55, 55, 20), 55)
+
+    def test_page_size_zero_shows_everything(self):
+        self.assertEqual(grow_window(0, 300, 0), 300)
+
+    def test_header(self):
+        self.assertEqual(column_header("A iniciar", 37, 20), "A iniciar (20 de 37)")
+        self.assertEqual(column_header("A iniciar", 12, 12), "A iniciar (12)")
+
+
+class TestFillSnippets(unittest.TestCase):
+    PREFIX = 16000
+
+    def _doc(self):
+        pict = "{\\pict\\pngblip\\picw100\\pich100 " + "89504e47" + "ab" * 40000 + "}"
+        return "{\\rtf1\\ansi " + pict + "\\par Cliente pediu ajuste no relatorio\\par}"
+
+    @staticmethod
+    def _window_after_image(doc, size=4000):
+        # o que main.SQL_TRECHO_APOS_IMAGEM devolve: a janela após o hexadecimal do último \pict
+        start = doc.rindex("\\pict")
+        hex_start = re.search("[0-9a-fA-F]{32}", doc[start:]).start() + start
+        hex_end = re.search("[^0-9a-fA-F\r\n]", doc[hex_start:]).start() + hex_start
+        return doc[hex_end:hex_end + size]
+
+    def test_iteration_starting_with_image_uses_window_after_image(self):
+        doc = self._doc()
+        card = {
+            "NumAtendimento": 10,
+            "NumIteracaoUltima": 3,
+            "TextoIteracao": doc[: self.PREFIX],
+            "TextoTruncado": 1,
+        }
+        requested = []
+
+        def fetch(pairs):
+            requested.extend(pairs)
+            return {(10, 3): rtf_fragment(self._window_after_image(doc))}
+
+        snippet = lambda t: rtf_snippet(t, 100)
+        cache = {}
+        self.assertEqual(snippet(card["TextoIteracao"]), "")
+        self.assertEqual(fill_snippets([card], snippet, fetch, cache), 1)
+        self.assertEqual(requested, [(10, 3)])
+        self.assertEqual(card["Snippet"], "Cliente pediu ajuste no relatorio")
+
+        # próximo delta com o mesmo card: trecho vem do cache, sem consultar o banco
+        again = dict(card, Snippet=None)
+        self.assertEqual(fill_snippets([again], snippet, fetch, cache), 0)
+        self.assertEqual(requested, [(10, 3)])
+        self.assertEqual(again["Snippet"], "Cliente pediu ajuste no relatorio")
+
+    def test_empty_result_is_cached(self):
+        card = {"NumAtendimento": 5, "NumIteracaoUltima": 1, "TextoIteracao": "{\\rtf1{\\pict ab", "TextoTruncado": 1}
+        calls = []
+        fetch = lambda pairs: calls.append(pairs) or {}
+        cache = {}
+        fill_snippets([card], lambda t: rtf_snippet(t, 100), fetch, cache)
+        fill_snippets([card], lambda t: rtf_snippet(t, 100), fetch, cache)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(card["Snippet"], "")
+
+    def test_cards_with_text_in_prefix_do_not_fetch(self):
+        card = {"NumAtendimento": 1, "NumIteracaoUltima": 1, "TextoIteracao": "{\\rtf1 Ola}", "TextoTruncado": 1}
+        fetch = lambda pairs: self.fail("não deveria buscar")
+        self.assertEqual(fill_snippets([card], lambda t: rtf_snippet(t, 100), fetch), 0)
+        self.assertEqual(card["Snippet"], "Ola")
+
+
+if __name__ == "__main__":
+    unittest.main()
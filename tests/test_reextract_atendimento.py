@@ -0,0 +1,97 @@
+import importlib.util
+import io
+import shutil
+import tempfile
+import unittest
+from argparse import Namespace
+from datetime import datetime
+from pathlib import Path
+
+from image_cache import image_key
+from tools import reextract_atendimento as reextract
+
+
+def _args(**kw):
+    base = {"ids": [], "open": False, "latest": False, "date_from": None, "date_to": None}
+    base.update(kw)
+    return Namespace(**base)
+
+
+class TestBuildQueries(unittest.TestCase):
+    def test_ids_are_deduplicated_and_chunked(self):
+        ids = list(range(reextract.ID_BATCH + 10)) + [0, 1]
+        queries = reextract.build_queries(_args(ids=ids))
+        self.assertEqual([len(p) for _sql, p in queries], [reextract.ID_BATCH, 10])
+        for sql, params in queries:
+            self.assertEqual(sql.count("?"), len(params))
+            self.assertNotIn("X.rn = 1", sql)
+        self.assertEqual([n for _sql, p in queries for n in p], list(range(reextract.ID_BATCH + 10)))
+
+    def test_latest_filters_row_number(self):
+        (sql, params), = reextract.build_queries(_args(ids=[5], latest=True))
+        self.assertIn("AND X.rn = 1", sql)
+        self.assertEqual(params, (5,))
+
+    def test_date_range_params(self):
+        d1, d2 = datetime(2025, 1, 1), datetime(2025, 2, 1)
+        (sql, params), = reextract.build_queries(_args(date_from=d1, date_to=d2))
+        self.assertIn("AI.RegInclusao >= ? AND AI.RegInclusao < ?", sql)
+        self.assertEqual(params, (d1, d2))
+        (sql, params), = reextract.build_queries(_args(date_to=d2))
+        self.assertNotIn(">= ?", sql)
+        self.assertEqual(params, (d2,))
+
+    def test_open_has_no_params(self):
+        (sql, params), = reextract.build_queries(_args(open=True))
+        self.assertIn("A.Situacao = 0", sql)
+        self.assertEqual(params, ())
+
+
+@unittest.skipUnless(importlib.util.find_spec("PIL"), "Pillow não instalado")
+class TestExtractAndWrite(unittest.TestCase):
+    WIDTHS = (320,)
+
+    def setUp(self):
+        from PIL import Image
+
+        self.tmp = Path(tempfile.mkdtemp())
+        buf = io.BytesIO()
+        Image.new("RGB", (800, 400), (20, 120, 220)).save(buf, "PNG")
+        self.png = buf.getvalue()
+        self.rtf = "{\\rtf1{\\pict\\pngblip " + self.png.hex() + "}\\par texto}"
+        self.key = image_key(self.png)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_writes_original_and_variants(self):
+        r = reextract.extract_and_write(str(self.tmp), self.rtf, False, self.WIDTHS)
+        self.assertEqual((r["key"], r["ext"], r["widths"]), (self.key, ".png", (320,)))
+        self.assertTrue((self.tmp / f"{self.key}.png").is_file())
+        self.assertTrue((self.tmp / f"{self.key}.w320.webp").is_file())
+        # segunda passada sem --overwrite: nada é regravado
+        again = reextract.extract_and_write(str(self.tmp), self.rtf, False, self.WIDTHS)
+        self.assertIsNone(again["size"])
+
+    def test_overwrite_moves_original_and_variants_to_bad(self):
+        reextract.extract_and_write(str(self.tmp), self.rtf, False, self.WIDTHS)
+        # variante de uma largura que não está mais configurada também sai
+        (self.tmp / f"{self.key}.w1280.webp").write_bytes(b"old variant")
+        r = reextract.extract_and_write(str(self.tmp), self.rtf, True, self.WIDTHS)
+        self.assertIsNotNone(r["size"])
+        bad = sorted(p.name for p in (self.tmp / "bad").iterdir())
+        self.assertEqual(bad, sorted([f"{self.key}.png", f"{self.key}.w320.webp", f"{self.key}.w1280.webp"]))
+        self.assertTrue((self.tmp / f"{self.key}.png").is_file())
+        self.assertTrue((self.tmp / f"{self.key}.w320.webp").is_file())
+        self.assertFalse((self.tmp / f"{self.key}.w1280.webp").exists())
+        # segunda sobrescrita: backups numerados, nada perdido
+        reextract.extract_and_write(str(self.tmp), self.rtf, True, self.WIDTHS)
+        self.assertIn(f"{self.key}.1.png", {p.name for p in (self.tmp / "bad").iterdir()})
+        self.assertIn(f"{self.key}.1.w320.webp", {p.name for p in (self.tmp / "bad").iterdir()})
+
+    def test_rtf_without_image(self):
+        self.assertIsNone(reextract.extract_and_write(str(self.tmp), "{\\rtf1 texto}", False, self.WIDTHS))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import contextlib
+import importlib.util
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from image_cache import ImageCacheIndex, ImageStore
+from tools import repair_temp_images as repair
+
+HAS_WEBP = False
+if importlib.util.find_spec("PIL"):
+    from PIL import Image, features
+
+    HAS_WEBP = features.check("webp")
+
+
+def _image_bytes(fmt, size, color):
+    buf = io.BytesIO()
+    Image.new("RGBA" if fmt == "PNG" else "RGB", size, color).save(buf, fmt)
+    return buf.getvalue()
+
+
+@unittest.skipUnless(HAS_WEBP, "Pillow com WebP não instalado")
+class TestRepairTempImages(unittest.TestCase):
+    KEY = "a" * 64
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.dir = self.tmp / "tmp"
+        self.dir.mkdir()
+        self.index = ImageCacheIndex(self.tmp / "cache_index.sqlite3")
+        self.store = ImageStore(self.dir, self.index, (320, 1280))
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _add_image(self, original, variants):
+        self.store.path_for(self.KEY, ".png").write_bytes(original)
+        size = len(original)
+        for w, data in variants.items():
+            self.store.variant_path(self.KEY, w).write_bytes(data)
+            size += len(data)
+        self.store.register(self.KEY, ".png", size, list(variants))
+        self.store.link("rtf-a", self.KEY)
+        return size
+
+    def _run(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return repair.main(["--dir", str(self.dir), "--workers", "1", "--full"])
+
+    def test_variant_width(self):
+        self.assertEqual(repair.variant_width(f"{self.KEY}.w320.webp"), 320)
+        self.assertIsNone(repair.variant_width(f"{self.KEY}.png"))
+        self.assertIsNone(repair.variant_width(f"{self.KEY}.webp"))
+
+    def test_small_valid_variant_is_kept(self):
+        original = _image_bytes("PNG", (1600, 900), (255, 255, 255, 255)) + b"\0" * 1024
+        thumb = _image_bytes("WEBP", (320, 180), (255, 255, 255))
+        self.assertLess(len(thumb), repair.MIN_SIZE)
+        size = self._add_image(original, {320: thumb})
+        self.assertEqual(self._run(), 0)
+        self.assertTrue(self.store.variant_path(self.KEY, 320).is_file())
+        self.assertEqual(self.store.lookup_rtf("rtf-a")[0], self.KEY)
+        self.assertEqual(self.index.get_temp_image(self.KEY)["size"], size)
+
+    def test_corrupt_variant_drops_only_that_variant(self):
+        original = _image_bytes("PNG", (1600, 900), (255, 255, 255, 255)) + b"\0" * 1024
+        thumb = _image_bytes("WEBP", (320, 180), (255, 255, 255))
+        size = self._add_image(original, {320: thumb, 1280: b"RIFF broken"})
+        self.assertEqual(self._run(), 0)
+        self.assertFalse(self.store.variant_path(self.KEY, 1280).exists())
+        self.assertTrue((self.dir / "bad" / f"{self.KEY}.w1280.webp").is_file())
+        self.assertTrue(self.store.path_for(self.KEY, ".png").is_file())
+        meta = self.index.get_temp_image(self.KEY)
+        self.assertEqual(meta["variants"], (320,))
+        self.assertEqual(meta["size"], size - len(b"RIFF broken"))
+        self.assertEqual(self.store.lookup_rtf("rtf-a")[0], self.KEY)
+
+    def test_transparent_original_is_dropped_with_variants(self):
+        original = _image_bytes("PNG", (1600, 900), (0, 0, 0, 0))
+        thumb = _image_bytes("WEBP", (320, 180), (255, 255, 255))
+        self._add_image(original, {320: thumb})
+        self.assertEqual(self._run(), 0)
+        self.assertEqual(sorted(os.listdir(self.dir)), ["bad"])
+        self.assertIsNone(self.index.get_temp_image(self.KEY))
+        self.assertIsNone(self.store.lookup_rtf("rtf-a"))
+        self.assertEqual(self.index.usage()["entries"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,8 @@
 import unittest
+from unittest import mock
 
-from rtf_utils import limpar_rtf
+import rtf_utils
+from rtf_utils import extract_first_image_from_rtf, has_embedded_image, limpar_rtf, rtf_snippet, rtf_to_text
 
 
 class TestRtfUtils(unittest.TestCase):
@@ -36,6 +38,73 @@ class TestRtfUtils(unittest.TestCase):
         out = limpar_rtf(data)
         self.assertIn("Olá", out)
 
+    def test_destinations_skipped(self):
+        rtf = (
+            r"{\rtf1\ansi{\fonttbl{\f0 Calibri;}}{\colortbl ;\red0\green0\blue255;}"
+            r"{\stylesheet{\ql Normal;}}{\*\shppict{\pict\pngblip 89504e470d0a1a0a}}Texto visivel}"
+        )
+        self.assertEqual(rtf_to_text(rtf), "Texto visivel")
+
+    def test_unicode_fallback_and_bin_skipped(self):
+        rtf = r"{\rtf1\ansi\uc1 a\u231\'e7o {\pict\bin4 {}\x}fim}"
+        self.assertEqual(rtf_to_text(rtf), "aço fim")
+
+    def test_image_only_iteration_has_no_text(self):
+        rtf = "{\\rtf1{\\pict\\pngblip\n" + "89504e47" * 200 + "\n}}"
+        self.assertEqual(limpar_rtf(rtf), "")
+
+
+class TestRtfSnippet(unittest.TestCase):
+    DOCS = [
+        r"{\rtf1\ansi Ol\'e1 mundo}",
+        r"{\rtf1\ansi{\fonttbl{\f0 Calibri;}}" + r"Linha com acentua\'e7\'e3o e \u233 ?\par " * 80 + "}",
+        r"{\rtf1\ansi HYPERLINK \"file.pdf\" \"Relat\'f3rio\" " + "palavra " * 200 + "}",
+        r"{\rtf1\ansi Texto antes 504b030414000200080000}",
+        "plain text without rtf " * 30,
+    ]
+
+    def test_matches_prefix_of_limpar_rtf(self):
+        for doc in self.DOCS:
+            for n in (1, 10, 250, 5000):
+                self.assertEqual(rtf_snippet(doc, n), limpar_rtf(doc)[:n], (doc[:40], n))
+
+    def test_stops_reading_after_enough_text(self):
+        doc = r"{\rtf1\ansi " + "texto visivel\\par " * 50 + "{\\pict " + "ab" * 100000 + "}" + "fim\\par " * 5000 + "}"
+        consumed = []
+        original = rtf_utils._iter_rtf_text
+
+        def counting(text):
+            for piece in original(text):
+                consumed.append(piece)
+                yield piece
+
+        with mock.patch.object(rtf_utils, "_iter_rtf_text", counting):
+            snippet = rtf_snippet(doc, 50)
+        self.assertEqual(snippet, limpar_rtf(doc)[:50])
+        self.assertLess(len(consumed), 1000)
+
+    def test_empty(self):
+        self.assertEqual(rtf_snippet("", 10), "")
+        self.assertEqual(rtf_snippet(None, 10), "")
+
+
+class TestHasEmbeddedImage(unittest.TestCase):
+    PNG_HEX = "89504e470d0a1a0a0000000d49484452" * 4
+
+    def test_pict_with_blip(self):
+        rtf = r"{\rtf1{\*\shppict{\pict\pngblip\picw10 " + self.PNG_HEX + "}}}"
+        self.assertTrue(has_embedded_image(rtf))
+        self.assertTrue(has_embedded_image(rtf.encode("latin-1")))
+        self.assertIsNotNone(extract_first_image_from_rtf(rtf)[0])
+
+    def test_hex_signature_without_blip(self):
+        self.assertTrue(has_embedded_image(r"{\rtf1 {\object ffd8ffe000104a46}}"))
+
+    def test_plain_text(self):
+        self.assertFalse(has_embedded_image(r"{\rtf1\ansi Sem imagem aqui}"))
+        self.assertFalse(has_embedded_image(r"{\rtf1{\pict\wmetafile8 0100090000}}"))
+        self.assertFalse(has_embedded_image(None))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,126 @@
+import os
+import shutil
+import tempfile
+import unittest
+from email.utils import formatdate
+
+from image_cache import ImageCacheIndex, ImageStore
+from temp_images import TEMP_IMAGE_CACHE_CONTROL, TempImageIndex, not_modified, temp_image_response
+
+RTF_KEY = "b" * 64
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTempImageIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.index = ImageCacheIndex(os.path.join(self.tmp, "cache_index.sqlite3"))
+        self.store = ImageStore(os.path.join(self.tmp, "tmp"), self.index, (320,))
+        self.clock = FakeClock()
+        self.images = TempImageIndex(self.store, touch_interval=300, clock=self.clock)
+        self.key, self.path, _ = self.store.store(RTF_KEY, b"\x89PNG bytes", "image/png")
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_resolves_image_key_through_the_index(self):
+        entry = self.images.resolve(self.key)
+        self.assertEqual(entry, (self.path, "image/png", (), self.key))
+
+    def test_resolves_legacy_rtf_key_through_the_link(self):
+        entry = self.images.resolve(RTF_KEY)
+        self.assertEqual((entry[0], entry[3]), (self.path, self.key))
+
+    def test_invalid_or_unknown_keys(self):
+        self.assertIsNone(self.images.resolve("../etc/passwd"))
+        self.assertIsNone(self.images.resolve("c" * 64))
+
+    def test_missing_file_is_dropped(self):
+        self.assertIsNotNone(self.images.resolve(self.key))
+        os.remove(self.path)
+        self.assertIsNone(self.images.resolve(self.key))
+        self.assertIsNone(self.index.get_temp_image(self.key))
+
+    def test_unindexed_legacy_file_is_registered(self):
+        legacy = "d" * 64
+        p = self.store.path_for(legacy, ".jpg")
+        p.write_bytes(b"jpeg")
+        entry = self.images.resolve(legacy)
+        self.assertEqual((entry[0], entry[1]), (p, "image/jpeg"))
+        self.assertEqual(self.index.get_temp_image(legacy)["size"], 4)
+
+    def test_touch_is_throttled(self):
+        self.images.touch(self.key)
+        self.assertEqual(self.index.get_temp_image(self.key)["last_access"], 1000.0)
+        self.clock.now = 1100.0
+        self.images.touch(self.key)
+        self.assertEqual(self.index.get_temp_image(self.key)["last_access"], 1000.0)
+        self.clock.now = 1400.0
+        self.images.touch(self.key)
+        self.assertEqual(self.index.get_temp_image(self.key)["last_access"], 1400.0)
+
+
+class TestTempImageResponse(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.index = ImageCacheIndex(os.path.join(self.tmp, "cache_index.sqlite3"))
+        self.store = ImageStore(os.path.join(self.tmp, "tmp"), self.index, (320,))
+        self.images = TempImageIndex(self.store)
+        self.key, self.path, _ = self.store.store(RTF_KEY, b"\x89PNG bytes", "image/png")
+        os.utime(self.path, (1700000000, 1700000000))
+        self.entry = self.images.resolve(self.key)
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_headers(self):
+        status, path, mime, headers, st = temp_image_response(self.entry, {}, None, self.store)
+        self.assertEqual((status, path, mime), (200, self.path, "image/png"))
+        self.assertEqual(headers["ETag"], f'"{self.key}"')
+        self.assertEqual(headers["Last-Modified"], formatdate(1700000000, usegmt=True))
+        self.assertEqual(headers["Cache-Control"], TEMP_IMAGE_CACHE_CONTROL)
+        self.assertEqual(st.st_size, len(b"\x89PNG bytes"))
+
+    def test_if_none_match(self):
+        etag = f'"{self.key}"'
+        for value in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+            status = temp_image_response(self.entry, {"if-none-match": value}, None, self.store)[0]
+            self.assertEqual(status, 304, value)
+        status = temp_image_response(self.entry, {"if-none-match": '"other"'}, None, self.store)[0]
+        self.assertEqual(status, 200)
+
+    def test_if_modified_since(self):
+        same = {"if-modified-since": formatdate(1700000000, usegmt=True)}
+        older = {"if-modified-since": formatdate(1600000000, usegmt=True)}
+        self.assertEqual(temp_image_response(self.entry, same, None, self.store)[0], 304)
+        self.assertEqual(temp_image_response(self.entry, older, None, self.store)[0], 200)
+        self.assertEqual(temp_image_response(self.entry, {"if-modified-since": "lixo"}, None, self.store)[0], 200)
+
+    def test_if_none_match_takes_precedence(self):
+        headers = {"if-none-match": '"other"', "if-modified-since": formatdate(1700000000, usegmt=True)}
+        self.assertFalse(not_modified(headers, f'"{self.key}"', 1700000000))
+
+    def test_variant_width(self):
+        self.store.variant_path(self.key, 320).write_bytes(b"webp")
+        entry = (self.path, "image/png", (320,), self.key)
+        status, path, mime, headers, _st = temp_image_response(entry, {}, "200", self.store)
+        self.assertEqual((path, mime), (self.store.variant_path(self.key, 320), "image/webp"))
+        self.assertEqual(headers["ETag"], f'"{self.key}-w320"')
+
+    def test_missing_file_raises_for_404(self):
+        os.remove(self.path)
+        with self.assertRaises(FileNotFoundError):
+            temp_image_response(self.entry, {}, None, self.store)
+
+
+if __name__ == "__main__":
+    unittest.main()
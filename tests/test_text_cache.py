@@ -0,0 +1,52 @@
+import hashlib
+import unittest
+
+from text_cache import TextCache, content_key
+
+
+class TestTextCache(unittest.TestCase):
+    def test_content_key_matches_sha256_scheme(self):
+        self.assertEqual(content_key("abc"), hashlib.sha256(b"abc").hexdigest())
+        self.assertEqual(content_key(b"abc"), content_key("abc"))
+        self.assertIsNone(content_key(None))
+
+    def test_identical_content_is_computed_once(self):
+        calls = []
+        cache = TextCache()
+
+        def clean(s):
+            calls.append(s)
+            return s.upper()
+
+        self.assertEqual(cache.get_or_compute("limpar", "{\\rtf1 x}", clean), "{\\RTF1 X}")
+        self.assertEqual(cache.get_or_compute("limpar", "{\\rtf1 x}", clean), "{\\RTF1 X}")
+        self.assertEqual(len(calls), 1)
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertAlmostEqual(stats["hit_ratio"], 0.5)
+
+    def test_namespaces_are_independent(self):
+        cache = TextCache()
+        cache.get_or_compute("a", "conteudo", lambda s: "A")
+        self.assertEqual(cache.get_or_compute("b", "conteudo", lambda s: "B"), "B")
+
+    def test_evicts_least_recently_used_by_size(self):
+        cache = TextCache(max_bytes=3000)
+        for i in range(3):
+            cache.get_or_compute("n", f"doc{i}", lambda s: "x" * 600)
+        cache.get_or_compute("n", "doc0", lambda s: "novo")  # doc0 passa a ser o mais recente
+        cache.get_or_compute("n", "doc3", lambda s: "x" * 600)
+        stats = cache.stats()
+        self.assertLessEqual(stats["bytes"], 3000)
+        self.assertGreaterEqual(stats["evictions"], 1)
+        self.assertEqual(cache.get_or_compute("n", "doc0", lambda s: "recalculado"), "x" * 600)
+        self.assertEqual(cache.get_or_compute("n", "doc1", lambda s: "recalculado"), "recalculado")
+
+    def test_oversized_values_are_not_cached(self):
+        cache = TextCache(max_bytes=100)
+        cache.get_or_compute("n", "doc", lambda s: "x" * 1000)
+        self.assertEqual(cache.stats()["entries"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
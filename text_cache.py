@@ -0,0 +1,107 @@
+# text_cache.py
+"""Memoização de textos limpos (RTF -> texto) por hash do conteúdo.
+
+O mesmo TextoIteracao é limpo várias vezes (snippet do card, diálogo de
+histórico, RDMs). `TextCache` guarda o resultado em um LRU limitado pelo
+tamanho aproximado em memória (não pelo número de entradas) e chaveado pelo
+sha256 do conteúdo original, o mesmo esquema de `_image_cache_key` em main.py.
+"""
+
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+
+# custo fixo aproximado por entrada: chave (namespace + hex de 64 chars),
+# tupla e nó do OrderedDict
+_ENTRY_OVERHEAD = 200
+
+
+def content_key(content) -> str:
+    """Retorna a chave (sha256 hex) para o conteúdo fornecido.
+
+    Aceita bytes/str/None.
+    """
+    if content is None:
+        return None
+    try:
+        if isinstance(content, (bytes, bytearray)):
+            b = bytes(content)
+        else:
+            b = str(content).encode("utf-8", errors="ignore")
+        return hashlib.sha256(b).hexdigest()
+    except Exception:
+        return None
+
+
+class TextCache:
+    """LRU thread-safe de resultados por (namespace, hash do conteúdo)."""
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max(0, int(max_bytes))
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @staticmethod
+    def _sizeof(value) -> int:
+        try:
+            return sys.getsizeof(value) + _ENTRY_OVERHEAD
+        except Exception:
+            return _ENTRY_OVERHEAD
+
+    def get_or_compute(self, namespace: str, content, fn):
+        """Retorna fn(content), reaproveitando o resultado de um conteúdo idêntico."""
+        if not content:
+            return fn(content)
+        digest = content_key(content)
+        if digest is None:
+            return fn(content)
+        key = (namespace, digest)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+            self._misses += 1
+
+        value = fn(content)
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_ratio": (self._hits / lookups) if lookups else 0.0,
+            }
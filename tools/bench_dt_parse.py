@@ -0,0 +1,110 @@
+"""Micro-benchmark: date parsing for a 500-card board, legacy strptime loop vs dt_parse.
+
+The legacy function is the loop that used to be copied across main.py (five
+strptime attempts, one exception per miss). Each card has three date fields
+(Abertura, DataProxContato, UltimaIteracao); the benchmark runs them as
+datetimes (the usual pyodbc case), ISO text and dd/mm/yyyy text.
+
+Usage:
+    python tools/bench_dt_parse.py [--cards 500] [--repeat 20]
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from dt_parse import parse_datetime, parse_datetimes  # noqa: E402
+
+FIELDS = ("Abertura", "DataProxContato", "UltimaIteracao")
+LEGACY_FORMATS = ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y")
+
+
+def legacy_parse(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value
+    s = value.decode(errors="ignore") if isinstance(value, (bytes, bytearray)) else str(value)
+    for fmt in LEGACY_FORMATS:
+        try:
+            return datetime.strptime(s, fmt)
+        except Exception:
+            continue
+    return None
+
+
+def make_cards(n: int, kind: str):
+    rnd = random.Random(42)
+    base = datetime(2024, 1, 1)
+    cards = []
+    for i in range(n):
+        row = {"NumAtendimento": 1000000 + i}
+        for field in FIELDS:
+            dt = base + timedelta(days=rnd.randint(0, 600), seconds=rnd.randint(0, 86399))
+            if kind == "iso":
+                value = dt.strftime("%Y-%m-%d %H:%M:%S")
+            elif kind == "br":
+                value = dt.strftime("%d/%m/%Y %H:%M:%S")
+            else:
+                value = dt
+            row[field] = value
+        cards.append(row)
+    return cards
+
+
+def run(fn, cards, repeat: int) -> float:
+    """Best time (seconds) of `repeat` runs of fn(cards)."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(cards)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def per_card_legacy(cards):
+    for c in cards:
+        for f in FIELDS:
+            legacy_parse(c.get(f))
+
+
+def per_card_new(cards):
+    for c in cards:
+        for f in FIELDS:
+            parse_datetime(c.get(f))
+
+
+def batch_new(cards):
+    for f in FIELDS:
+        parse_datetimes([c.get(f) for c in cards])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark date parsing for the Kanban board.")
+    parser.add_argument("--cards", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    print(f"{args.cards} cards x {len(FIELDS)} date fields, best of {args.repeat}")
+    print(f"{'values':<10}{'legacy':>12}{'dt_parse':>12}{'batch':>12}{'speedup':>10}   (us per card)")
+    for kind in ("datetime", "iso", "br"):
+        cards = make_cards(args.cards, kind)
+        legacy = run(per_card_legacy, cards, args.repeat)
+        new = run(per_card_new, cards, args.repeat)
+        batch = run(batch_new, cards, args.repeat)
+        us = 1e6 / max(1, args.cards)
+        print(
+            f"{kind:<10}{legacy * us:>12.2f}{new * us:>12.2f}{batch * us:>12.2f}"
+            f"{legacy / max(min(new, batch), 1e-12):>9.1f}x"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,78 +1,257 @@
+"""Re-extract the embedded images of atendimento iterations into the temp image cache.
+
+Images are written with the same layout the app serves (/_temp_img/<image_key>):
+cache_images/tmp/<sha256 of the image bytes><ext> plus the downscaled variants,
+registered in the cache index and linked from the RTF key, with the
+"has image" flag set.
+
+Usage:
+    python tools/reextract_atendimento.py 1110195 [1110196 ...]
+    python tools/reextract_atendimento.py --from 2025-01-01 --to 2025-02-01
+    python tools/reextract_atendimento.py --open [--latest]
+
+Iterations are streamed in batches (fetchmany) and only those containing
+\\pict are transferred; extraction and Pillow normalization run in a process
+pool. --overwrite rewrites files already in the cache (the old original and
+its .w<N>.webp variants are moved to cache_images/tmp/bad).
+"""
+import argparse
+import os
+import shutil
 import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
 from pathlib import Path
+
 # ensure project root is on sys.path so local modules (authentication, rtf_utils) can be imported
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
-import hashlib
-import shutil
-from datetime import datetime
 
-from authentication import get_db_connection
+from image_cache import IMAGE_VARIANT_WIDTHS, VARIANT_EXT, ImageCacheIndex, ImageStore, ext_for_mime, image_key
+from image_jobs import normalize_and_write
 from rtf_utils import extract_first_image_from_rtf
+from text_cache import content_key
 
-CACHE_DIR = ROOT / "cache_images" / "tmp"
-BAD_DIR = CACHE_DIR / "bad"
-FLAG_DIR = ROOT / "cache_images"
-LOG = FLAG_DIR / "temp_img_debug.log"
-
-CACHE_DIR.mkdir(parents=True, exist_ok=True)
-BAD_DIR.mkdir(parents=True, exist_ok=True)
+# same locations as main.py (IMAGE_CACHE_DIR / IMAGE_CACHE_INDEX)
+IMAGE_DIR = Path(os.getenv("IMAGE_CACHE_DIR", str(ROOT / "cache_images")))
+CACHE_DIR = IMAGE_DIR / "tmp"
+INDEX_PATH = Path(os.getenv("IMAGE_CACHE_INDEX", str(IMAGE_DIR / "cache_index.sqlite3")))
+LOG = IMAGE_DIR / "temp_img_debug.log"
 
-atendimento = sys.argv[1] if len(sys.argv) > 1 else "1110195"
-print(f"Re-extracting images for atendimento={atendimento}")
+# SQL Server accepts at most 2100 parameters per statement
+ID_BATCH = 500
 
-sql = """
-SELECT AI.TextoIteracao
-FROM AtendimentoIteracao AI WITH (NOLOCK)
-WHERE AI.NumAtendimento = ?
-  AND AI.Desdobramento = 0
-ORDER BY AI.NumIteracao DESC
+_SQL_ITERATIONS = """
+SELECT X.NumAtendimento, X.NumIteracao, X.Texto
+FROM (
+    SELECT AI.NumAtendimento, AI.NumIteracao, CONVERT(NVARCHAR(MAX), AI.TextoIteracao) AS Texto,
+           ROW_NUMBER() OVER (PARTITION BY AI.NumAtendimento ORDER BY AI.NumIteracao DESC) AS rn
+    FROM AtendimentoIteracao AI WITH (NOLOCK)
+    WHERE AI.Desdobramento = 0
+      AND {where}
+) X
+WHERE CHARINDEX(N'\\pict', X.Texto) > 0 {latest}
+ORDER BY X.NumAtendimento, X.NumIteracao DESC
 """
 
-found = []
-try:
+_WHERE_OPEN = """AI.NumAtendimento IN (
+        SELECT A.NumAtendimento
+        FROM CNSAtendimento A WITH (NOLOCK)
+        WHERE A.AssuntoAtendimento = N'Implantação'
+          AND A.Situacao = 0
+          AND A.Desdobramento = 0
+      )"""
+
+
+def build_queries(args):
+    """Return a list of (sql, params) covering the requested iterations."""
+    latest = "AND X.rn = 1" if args.latest else ""
+    if args.open:
+        return [(_SQL_ITERATIONS.format(where=_WHERE_OPEN, latest=latest), ())]
+    if args.date_from or args.date_to:
+        clauses, params = [], []
+        if args.date_from:
+            clauses.append("AI.RegInclusao >= ?")
+            params.append(args.date_from)
+        if args.date_to:
+            clauses.append("AI.RegInclusao < ?")
+            params.append(args.date_to)
+        return [(_SQL_ITERATIONS.format(where=" AND ".join(clauses), latest=latest), tuple(params))]
+    ids = list(dict.fromkeys(args.ids))
+    queries = []
+    for i in range(0, len(ids), ID_BATCH):
+        chunk = ids[i:i + ID_BATCH]
+        where = "AI.NumAtendimento IN (%s)" % ", ".join("?" for _ in chunk)
+        queries.append((_SQL_ITERATIONS.format(where=where, latest=latest), tuple(chunk)))
+    return queries
+
+
+def iter_rows(cur, queries, batch_size):
+    for sql, params in queries:
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+
+
+def move_to_bad(path: Path) -> Path:
+    """Move `path` to <dir>/bad, adding .1, .2... to the name if a backup already exists."""
+    bad = path.parent / "bad"
+    bad.mkdir(parents=True, exist_ok=True)
+    dest = bad / path.name
+    idx = 1
+    while dest.exists():
+        stem, _, rest = path.name.partition(".")
+        dest = bad / f"{stem}.{idx}.{rest}"
+        idx += 1
+    shutil.move(str(path), str(dest))
+    return dest
+
+
+def extract_and_write(directory: str, texto: str, overwrite: bool, variant_widths) -> dict:
+    """Worker: extract the first image of one RTF and write it (original + variants).
+
+    Returns rtf_key/image_key/ext/mime plus size and widths when files were
+    written (None when the image was already on disk), or None without image.
+    """
+    img_bytes, mime = extract_first_image_from_rtf(texto)
+    if not img_bytes or not mime:
+        return None
+    if isinstance(img_bytes, str):
+        img_bytes = img_bytes.encode("latin-1", errors="ignore")
+    key = image_key(img_bytes)
+    ext = ext_for_mime(mime)
+    out = {"rtf_key": content_key(texto), "key": key, "ext": ext, "mime": mime, "size": None, "widths": None}
+    dest = Path(directory) / f"{key}{ext}"
+    if dest.exists():
+        if not overwrite:
+            return out
+        # the old variants go with the original: they would otherwise be
+        # overwritten without a backup, or linger for widths no longer configured
+        for old in [dest, *Path(directory).glob(f"{key}.w*{VARIANT_EXT}")]:
+            move_to_bad(old)
+    out["size"], out["widths"] = normalize_and_write(directory, key, ext, img_bytes, variant_widths)
+    return out
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Re-extract iteration images into the temp image cache.")
+    parser.add_argument("ids", nargs="*", type=int, help="NumAtendimento values")
+    parser.add_argument("--from", dest="date_from", type=datetime.fromisoformat, help="iterations from this date (RegInclusao)")
+    parser.add_argument("--to", dest="date_to", type=datetime.fromisoformat, help="iterations before this date")
+    parser.add_argument("--open", action="store_true", help="all open implantações")
+    parser.add_argument("--latest", action="store_true", help="only the latest iteration of each atendimento")
+    parser.add_argument("--overwrite", action="store_true", help="rewrite images already in the cache")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="worker processes")
+    parser.add_argument("--batch", type=int, default=100, help="rows per fetchmany")
+    args = parser.parse_args(argv)
+    if not (args.ids or args.open or args.date_from or args.date_to):
+        parser.error("give NumAtendimento values, --from/--to or --open")
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    from authentication import get_db_connection
+
+    index = ImageCacheIndex(INDEX_PATH)
+    store = ImageStore(CACHE_DIR, index, IMAGE_VARIANT_WIDTHS)
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+    counts = {"rows": 0, "images": 0, "written": 0, "reused": 0, "errors": 0}
+    rtf_bytes = 0
+    written_bytes = 0
+    started = time.perf_counter()
+    last_report = started
+
+    def handle(fut):
+        nonlocal written_bytes
+        try:
+            r = fut.result()
+        except Exception as e:
+            counts["errors"] += 1
+            print(f"  error: {e}")
+            return
+        if r is None:
+            return
+        counts["images"] += 1
+        # index work per row: one failing row is reported and the run continues
+        try:
+            if r["size"] is not None:
+                store.register(r["key"], r["ext"], r["size"], r["widths"])
+                counts["written"] += 1
+                written_bytes += r["size"]
+            else:
+                counts["reused"] += 1
+                if index.get_temp_image(r["key"]) is None:
+                    # file on disk but not in the index (older cache): register it
+                    try:
+                        size = store.path_for(r["key"], r["ext"]).stat().st_size
+                        widths = [w for w in IMAGE_VARIANT_WIDTHS if store.variant_path(r["key"], w).exists()]
+                        store.register(r["key"], r["ext"], size, widths)
+                    except OSError:
+                        pass
+            store.link(r["rtf_key"], r["key"])
+            index.set_flag(r["rtf_key"], True)
+        except Exception as e:
+            counts["errors"] += 1
+            print(f"  index error for image {r['key']}: {e}")
+
+    def report(final=False):
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        print(
+            f"{'done' if final else '  ...'} rows={counts['rows']} images={counts['images']} "
+            f"written={counts['written']} reused={counts['reused']} errors={counts['errors']} "
+            f"| {counts['rows'] / elapsed:.1f} rows/s, {rtf_bytes / 1048576 / elapsed:.1f} MB/s RTF, "
+            f"{written_bytes / 1048576:.1f} MB written in {elapsed:.1f}s"
+        )
+
     conn = get_db_connection()
     cur = conn.cursor()
-    cur.execute(sql, (atendimento,))
-    rows = cur.fetchall()
-    for row in rows:
-        texto = row[0]
-        img_bytes, mime = extract_first_image_from_rtf(texto)
-        if img_bytes:
-            key = hashlib.sha256(img_bytes if isinstance(img_bytes, (bytes, bytearray)) else str(img_bytes).encode('utf-8')).hexdigest()
-            ext = '.png' if 'png' in (mime or '').lower() else ('.jpg' if 'jpeg' in (mime or '').lower() or 'jpg' in (mime or '').lower() else '.bin')
-            dest = CACHE_DIR / f"{key}{ext}"
-            # backup existing
-            if dest.exists():
-                b = BAD_DIR / dest.name
-                idx = 1
-                while b.exists():
-                    b = BAD_DIR / f"{dest.stem}.{idx}{dest.suffix}"
-                    idx += 1
-                shutil.move(str(dest), str(b))
-                print(f"Backed up existing {dest} -> {b}")
-            # write new bytes
-            with open(dest, 'wb') as f:
-                if isinstance(img_bytes, str):
-                    f.write(img_bytes.encode('latin-1'))
-                else:
-                    f.write(img_bytes)
-            # write flag
-            flag = FLAG_DIR / f"{key}.hasimg"
-            with open(flag, 'w', encoding='utf-8') as ff:
-                ff.write('1')
-            # log
-            try:
-                ts = datetime.utcnow().isoformat() + 'Z'
-                with open(LOG, 'a', encoding='utf-8') as lf:
-                    lf.write(f"{ts} [REEXTRACT] atendimento={atendimento} wrote path={dest} mime={mime} bytes={dest.stat().st_size}\n")
-            except Exception:
-                pass
-            found.append((dest.name, dest.stat().st_size, mime))
-    cur.close()
-    conn.close()
-except Exception as e:
-    print(f"DB error or other: {e}")
-
-print('done. found:', found)
+    max_pending = max(1, args.workers) * 4
+    try:
+        with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            pending = set()
+            for num, it, texto in iter_rows(cur, build_queries(args), max(1, args.batch)):
+                counts["rows"] += 1
+                rtf_bytes += len(texto or "")
+                pending.add(pool.submit(extract_and_write, str(CACHE_DIR), texto, args.overwrite, IMAGE_VARIANT_WIDTHS))
+                # bounded queue: do not hold every RTF of the result set in memory
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        handle(fut)
+                if time.perf_counter() - last_report >= 5:
+                    last_report = time.perf_counter()
+                    report()
+            for fut in pending:
+                handle(fut)
+    except Exception as e:
+        print(f"DB error or other: {e}")
+        counts["errors"] += 1
+    finally:
+        try:
+            cur.close()
+            conn.close()
+        except Exception:
+            pass
+
+    report(final=True)
+    try:
+        ts = datetime.utcnow().isoformat() + "Z"
+        with open(LOG, "a", encoding="utf-8") as lf:
+            lf.write(
+                f"{ts} [REEXTRACT] rows={counts['rows']} images={counts['images']} "
+                f"written={counts['written']} reused={counts['reused']} errors={counts['errors']}\n"
+            )
+    except Exception:
+        pass
+    return 1 if counts["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,123 +1,281 @@
-import sys
-from pathlib import Path
+"""Validate and repair the temp images in cache_images/tmp.
+
+Suspect originals (truncated, unreadable or fully transparent) are moved to
+cache_images/tmp/bad and their image is dropped from the cache index together
+with its variants and RTF links, so the index sizes and totals stay right.
+They are not rewritten in place behind the index's back; the app re-extracts
+and re-registers the image the next time it is opened (or run
+tools/reextract_atendimento.py).
+
+Downscaled variants (<key>.w<N>.webp) are legitimately tiny, so they are
+validated only by decoding them. A variant that does not decode is moved to
+bad/ and removed from its image's entry in the index; the original and the
+other variants are kept (the endpoint falls back to them).
+
+Files already validated are remembered in a manifest keyed by
+(name, size, mtime); later runs only re-check new or changed files, so the
+command is cheap to schedule over a large cache. The Pillow work is spread
+across a process pool.
+
+Usage:
+    python tools/repair_temp_images.py [--workers N] [--full] [--dir PATH]
+"""
+import argparse
+import importlib.util
+import json
+import os
 import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
+from pathlib import Path
 
 ROOT = Path(__file__).resolve().parents[1]
-CACHE = ROOT / "cache_images" / "tmp"
-BAD = CACHE / "bad"
-LOG = ROOT / "cache_images" / "temp_img_debug.log"
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
 
-try:
-    from PIL import Image, ImageFile
-    ImageFile.LOAD_TRUNCATED_IMAGES = True
-except Exception:
-    print("Pillow not available; aborting.")
-    sys.exit(2)
+from image_cache import IMAGE_VARIANT_WIDTHS, VARIANT_EXT, ImageCacheIndex, ImageStore  # noqa: E402
+
+# same locations as main.py (IMAGE_CACHE_DIR / IMAGE_CACHE_INDEX)
+IMAGE_DIR = Path(os.getenv("IMAGE_CACHE_DIR", str(ROOT / "cache_images")))
+CACHE = IMAGE_DIR / "tmp"
+INDEX_PATH = Path(os.getenv("IMAGE_CACHE_INDEX", str(IMAGE_DIR / "cache_index.sqlite3")))
+LOG = IMAGE_DIR / "temp_img_debug.log"
+MANIFEST = IMAGE_DIR / "repair_manifest.json"
 
-BAD.mkdir(parents=True, exist_ok=True)
+IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".gif", ".webp"}
+# originals smaller than this are treated as truncated (not applied to variants)
+MIN_SIZE = 512
 
-moved = []
-replaced = []
-errors = []
 
-for p in sorted(CACHE.glob("*.png")):
+def variant_width(name: str):
+    """Width N of a variant file name (<key>.w<N>.webp), or None for an original."""
+    parts = name.split(".")
+    if len(parts) != 3 or f".{parts[2]}" != VARIANT_EXT or not parts[1].startswith("w"):
+        return None
     try:
-        size = p.stat().st_size
-        action = None
-        # try to open tolerantly
-        try:
-            img = Image.open(p)
+        return int(parts[1][1:])
+    except ValueError:
+        return None
+
+
+def _backup_path(bad_dir: Path, p: Path) -> Path:
+    dest = bad_dir / p.name
+    idx = 1
+    while dest.exists():
+        dest = bad_dir / f"{p.stem}.{idx}{p.suffix}"
+        idx += 1
+    return dest
+
+
+def check_file(path: str) -> dict:
+    """Validate one file and move it to bad/ if it is suspect (runs in a worker process).
+
+    Returns a dict with name, size, mtime_ns, variant (width or None), action
+    ("ok" | "removed"), backup and error. Variants are only decoded; the size
+    and transparency rules apply to originals.
+    """
+    from PIL import Image, ImageFile
+
+    ImageFile.LOAD_TRUNCATED_IMAGES = True
+
+    p = Path(path)
+    bad_dir = p.parent / "bad"
+    st = p.stat()
+    width = variant_width(p.name)
+    result = {
+        "name": p.name,
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "variant": width,
+        "action": "ok",
+        "backup": None,
+        "error": None,
+    }
+    try:
+        with Image.open(p) as img:
             img.load()
-            bands = img.getbands()
-            alpha_present = 'A' in bands or img.mode in ('LA','RGBA') or ('transparency' in img.info)
+            if width is not None:
+                return result
+            alpha_present = "A" in img.getbands() or img.mode in ("LA", "RGBA") or ("transparency" in img.info)
             a_max = None
             if alpha_present:
-                a = img.convert('RGBA').split()[-1]
-                a_min, a_max = a.getextrema()
-            # decide if suspect: truncated (small) or fully transparent
-            suspect = (size < 512) or (alpha_present and a_max == 0)
-            if suspect:
-                # backup
-                dest = BAD / p.name
-                idx = 1
-                while dest.exists():
-                    dest = BAD / f"{p.stem}.{idx}{p.suffix}"
-                    idx += 1
-                shutil.move(str(p), str(dest))
-                moved.append((p.name, size, dest.name))
-                # create flattened replacement from the image (if loadable) or create blank
+                a_max = img.convert("RGBA").split()[-1].getextrema()[1]
+        # decide if suspect: truncated (small) or fully transparent
+        if not ((st.st_size < MIN_SIZE) or (alpha_present and a_max == 0)):
+            return result
+    except Exception:
+        # open failed -> treat as truncated
+        pass
+
+    try:
+        bad_dir.mkdir(parents=True, exist_ok=True)
+        dest = _backup_path(bad_dir, p)
+        shutil.move(str(p), str(dest))
+        result.update(action="removed", backup=dest.name)
+    except Exception as e:
+        result["error"] = f"move failed: {e}"
+    return result
+
+
+def drop_variant(store: ImageStore, name: str, size: int) -> str:
+    """Remove one variant from its image's index entry (original and other variants stay).
+
+    Returns the image key.
+    """
+    key = name.split(".", 1)[0]
+    width = variant_width(name)
+    meta = store.index.get_temp_image(key)
+    if meta is not None and width in meta["variants"]:
+        widths = [w for w in meta["variants"] if w != width]
+        store.index.put_temp_image(key, meta["ext"], max(0, meta["size"] - size), meta["mtime"], widths)
+    return key
+
+
+def drop_from_index(store: ImageStore, name: str) -> str:
+    """Remove the image behind `name` (original or variant) from the index and its remaining files.
+
+    Returns the image key. Deleting the index entry also drops the RTF links,
+    so the next request re-extracts the image instead of serving the bad copy.
+    """
+    key = name.split(".", 1)[0]
+    meta = store.index.get_temp_image(key)
+    ext = meta["ext"] if meta is not None else os.path.splitext(name)[1]
+    store.index.delete_temp_image(key)
+    store.remove_files([(key, ext)])
+    return key
+
+
+def load_manifest(path: Path) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+def save_manifest(path: Path, manifest: dict):
+    tmp = path.with_name(path.name + ".part")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def scan(cache_dir: Path, manifest: dict, full: bool):
+    """Return (files to check, unchanged count, current names)."""
+    todo = []
+    unchanged = 0
+    names = set()
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            # skip dot files (in-progress writes) and non-image files
+            if entry.name.startswith(".") or not entry.is_file():
+                continue
+            if os.path.splitext(entry.name)[1].lower() not in IMAGE_EXTS:
+                continue
+            names.add(entry.name)
+            st = entry.stat()
+            if not full and manifest.get(entry.name) == [st.st_size, st.st_mtime_ns]:
+                unchanged += 1
+                continue
+            todo.append((entry.path, st.st_size))
+    return todo, unchanged, names
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Validate and repair cached temp images.")
+    parser.add_argument("--dir", type=Path, default=CACHE, help="temp image directory (default: cache_images/tmp)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="worker processes")
+    parser.add_argument("--full", action="store_true", help="ignore the manifest and re-check every file")
+    args = parser.parse_args(argv)
+
+    if importlib.util.find_spec("PIL") is None:
+        print("Pillow not available; aborting.")
+        return 2
+
+    if not args.dir.is_dir():
+        print(f"{args.dir} does not exist; nothing to do.")
+        return 0
+
+    manifest_path = MANIFEST if args.dir == CACHE else args.dir.parent / MANIFEST.name
+    manifest = load_manifest(manifest_path)
+    started = time.perf_counter()
+    todo, unchanged, names = scan(args.dir, manifest, args.full)
+    # forget files that no longer exist
+    manifest = {name: v for name, v in manifest.items() if name in names}
+
+    removed, errors = [], []
+    checked_bytes = 0
+    if todo:
+        with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            futures = {pool.submit(check_file, path): (path, size) for path, size in todo}
+            for done, fut in enumerate(as_completed(futures), 1):
+                path, size = futures[fut]
+                checked_bytes += size
                 try:
-                    if 'img' in locals():
-                        bg = Image.new('RGB', img.size, (255,255,255))
-                        try:
-                            if img.mode in ('RGBA','LA'):
-                                bg.paste(img, mask=img.split()[-1])
-                            else:
-                                bg.paste(img)
-                        except Exception:
-                            bg.paste(img)
-                        bg.save(p, format='PNG')
-                        replaced.append((p.name, dest.name, p.stat().st_size))
-                    else:
-                        # cannot load image, write a 1x1 white placeholder
-                        ph = Image.new('RGB', (1,1), (255,255,255))
-                        ph.save(p, format='PNG')
-                        replaced.append((p.name, dest.name, p.stat().st_size))
+                    r = fut.result()
                 except Exception as e:
-                    errors.append((p.name, str(e)))
-                    # attempt to restore original if replacement failed
-                    try:
-                        shutil.move(str(dest), str(p))
-                    except Exception:
-                        pass
-            else:
-                # ok, keep
-                pass
-        except Exception as e:
-            # open failed -> treat as truncated
-            dest = BAD / p.name
-            idx = 1
-            while dest.exists():
-                dest = BAD / f"{p.stem}.{idx}{p.suffix}"
-                idx += 1
-            shutil.move(str(p), str(dest))
-            moved.append((p.name, size, dest.name))
-            try:
-                # create a placeholder flattened file (white background) or attempt to create from partial bytes
-                ph = Image.new('RGB', (1,1), (255,255,255))
-                ph.save(p, format='PNG')
-                replaced.append((p.name, dest.name, p.stat().st_size))
-            except Exception as e2:
-                errors.append((p.name, f"replace failed: {e2}"))
-    except Exception as e:
-        errors.append((p.name, str(e)))
-
-# append log
-try:
-    with open(LOG, 'a', encoding='utf-8') as f:
-        ts = datetime.utcnow().isoformat() + 'Z'
-        for m in moved:
-            f.write(f"{ts} [REPAIR] moved {m[0]} size={m[1]} backup={m[2]}\n")
-        for r in replaced:
-            f.write(f"{ts} [REPAIR] replaced {r[0]} backup={r[1]} new_size={r[2]}\n")
-        for e in errors:
-            f.write(f"{ts} [REPAIR] error {e[0]} {e[1]}\n")
-except Exception:
-    pass
-
-# summary to stdout
-print("moved:")
-for m in moved:
-    print(" -", m)
-print("replaced:")
-for r in replaced:
-    print(" -", r)
-print("errors:")
-for e in errors:
-    print(" -", e)
-
-# exit code
-if errors:
-    sys.exit(1)
-sys.exit(0)
+                    errors.append((Path(path).name, str(e)))
+                    continue
+                if r["error"]:
+                    errors.append((r["name"], r["error"]))
+                    continue
+                if r["action"] == "removed":
+                    removed.append((r["name"], r["backup"], r["size"], r["variant"]))
+                else:
+                    manifest[r["name"]] = [r["size"], r["mtime_ns"]]
+                if done % 500 == 0:
+                    print(f"  {done}/{len(todo)} checked")
+    if removed:
+        index_path = INDEX_PATH if args.dir == CACHE else args.dir.parent / INDEX_PATH.name
+        index = ImageCacheIndex(index_path)
+        store = ImageStore(args.dir, index, IMAGE_VARIANT_WIDTHS)
+        try:
+            dropped = set()
+            # originals first: a dropped image takes its variants with it
+            for name, _backup, size, width in sorted(removed, key=lambda r: r[3] is not None):
+                try:
+                    if width is None:
+                        dropped.add(drop_from_index(store, name))
+                    elif name.split(".", 1)[0] not in dropped:
+                        drop_variant(store, name, size)
+                except Exception as e:
+                    errors.append((name, f"index update failed: {e}"))
+        finally:
+            index.close()
+        # variants deleted with their original are no longer on disk
+        manifest = {name: v for name, v in manifest.items() if (args.dir / name).exists()}
+    save_manifest(manifest_path, manifest)
+    elapsed = time.perf_counter() - started
+
+    # append log
+    try:
+        log_path = LOG if args.dir == CACHE else args.dir.parent / LOG.name
+        with open(log_path, "a", encoding="utf-8") as f:
+            ts = datetime.utcnow().isoformat() + "Z"
+            for name, backup, size, _width in removed:
+                f.write(f"{ts} [REPAIR] removed {name} backup={backup} size={size}\n")
+            for name, err in errors:
+                f.write(f"{ts} [REPAIR] error {name} {err}\n")
+    except Exception:
+        pass
+
+    # summary to stdout
+    rate = len(todo) / elapsed if elapsed > 0 else 0.0
+    mb_rate = checked_bytes / (1024 * 1024) / elapsed if elapsed > 0 else 0.0
+    print(
+        f"checked {len(todo)} file(s), skipped {unchanged} unchanged, "
+        f"removed {len(removed)}, errors {len(errors)} "
+        f"in {elapsed:.2f}s ({rate:.1f} files/s, {mb_rate:.1f} MB/s, {args.workers} worker(s))"
+    )
+    for r in removed:
+        print(" - removed", r)
+    for e in errors:
+        print(" - error", e)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())